@@ -1,129 +1,268 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, send_file
 from flask_cors import CORS
 import pandas as pd
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
 import json
-import boto3
 import io
 import os
-import requests
-import tempfile
-import base64
-from matplotlib.backends.backend_pdf import PdfPages
+import hashlib
+import uuid
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from slack_sdk import WebClient
-from slack_sdk.errors import SlackApiError
 import datetime
+from typing import TYPE_CHECKING
+import numpy as np
+from sales_store import SalesStore, to_day_number
+from sales_cube import COUNT_COLUMN, build_daily_cube, row_counts
+from row_filter import RowFilter
+from data_refresh import DataSnapshot
+from shared_data import SharedSnapshot
+from plan_cache import PlanCache
+from result_cache import ResultCache
+from clients import aws_client, slack_client
+from rule_planner import RulePlanner
+from report_store import ReportStore, png_bytes
+from slack_delivery import SlackDelivery
+from transcription import InMemoryUploads, TranscriptionError, transcribe_upload
+from event_stream import event_stream, sse_event
+from metrics import instrument_app, request_timings, span
+from log import get_logger, lazy
+from warmup import WarmUp, serve_readiness
+
+# matplotlib is imported with the first chart drawn (or by the start-up warm-up), not with the app
+if TYPE_CHECKING:
+    from matplotlib.figure import Figure
 
 load_dotenv()
 
+logger = get_logger("app")
+
 app = Flask(__name__)
-CORS(app)
+# Audio uploads stay in memory on their way to the STT service
+app.request_class = InMemoryUploads
+CORS(app, expose_headers=["Server-Timing"])
 
 BEDROCK_MODEL_ID = "amazon.nova-pro-v1:0"
 SARVAM_API_KEY = os.getenv("SARVAM_API_KEY")
-SARVAM_STT_URL = "https://api.sarvam.ai/speech-to-text"
+SARVAM_STT_URL = os.getenv("SARVAM_STT_URL", "https://api.sarvam.ai/speech-to-text")
 SARVAM_TTS_URL = "https://api.sarvam.ai/text-to-speech"
 SARVAM_TRANSLATE_URL = "https://api.sarvam.ai/translate"
 
-anandhaas_data = None
-last_pdf_data = {"data": None, "title": "", "insights": "", "filename": ""}
+# Model plans for repeated questions are reused for PLAN_CACHE_TTL seconds (PLAN_CACHE_FILE keeps them across restarts)
+plan_cache = PlanCache(ttl=float(os.getenv("PLAN_CACHE_TTL", "86400")),
+                       max_entries=int(os.getenv("PLAN_CACHE_SIZE", "512")),
+                       path=os.getenv("PLAN_CACHE_FILE") or None)
+
+# Chart results per data snapshot, shared by questions that plan the same chart (RESULT_CACHE_BYTES bounds them)
+result_cache = ResultCache(fields={"chart_type": "bar", "x_axis": "Branch Name", "y_axis": "Total Amount",
+                                   "aggregation": "sum", "dual_metrics": False, "limit": None, "filters": []})
+
+# Stage timings of each request in its Server-Timing header, and every process metric at GET /metrics
+instrument_app(app, caches={"plan": plan_cache, "result": result_cache})
+
+# Templated questions ("top 10 items in VV", "revenue by branch") are planned locally without the model
+rule_planner = RulePlanner(
+    dimensions=[
+        {"axis": "Branch Name", "label": "Branch", "words": ["branch", "branches", "outlet", "outlets"],
+         "filter": "branch_filters", "values": "branches"},
+        {"axis": "Item Name", "label": "Item", "words": ["item", "items", "product", "products"]},
+    ],
+    measures={"revenue": "Total Amount", "quantity": "Quantity", "count": "count"},
+)
+
+# Keys of the pre-aggregated (dimensions x day) cube
+CUBE_DIMENSIONS = ["Branch Name", "Item Name"]
+
+DATA_FILE = os.getenv("DATA_FILE", "anandhaas_sweets.csv")
+# The CSV columns the store is built from; the rest of each line is skipped by the parser
+CSV_COLUMNS = ["Branch Name", "Date", "ItemName", "Net Value", "Quantity"]
+# Bytes at the start of the CSV fingerprinted to notice the file being rewritten rather than appended to
+CSV_HEAD_BYTES = 64 * 1024
+# Check the CSV for appended rows every N seconds (0 disables polling; POST /api/admin/refresh still works)
+DATA_REFRESH_SECONDS = float(os.getenv("DATA_REFRESH_SECONDS", "0"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+# Directory (e.g. /dev/shm/anandhaas) where the data is published once for every server process to map; empty gives each process its own copy
+SHARED_DATA_DIR = os.getenv("SHARED_DATA_DIR", "")
+
+# Cookie naming the caller's session, for /api/send-to-slack and /api/last-pdf-info without a report_id
+REPORT_SESSION_COOKIE = "report_session"
+
+DATA_UNAVAILABLE = "Data not available. Ensure anandhaas_sweets.xlsx exists."
 
 # Slack configuration - exact copy from restaurant dashboard
 SLACK_BOT_TOKEN = os.getenv("SLACK_BOT_TOKEN")
 SLACK_CHANNEL_ID = os.getenv("SLACK_CHANNEL_ID") or "C09UUJZ56QJ"
 
-print(f"DEBUG: SLACK_BOT_TOKEN loaded: {SLACK_BOT_TOKEN[:20] if SLACK_BOT_TOKEN else 'None'}...")
-print(f"DEBUG: SLACK_CHANNEL_ID loaded: {SLACK_CHANNEL_ID}")
-
-try:
-    test_client = WebClient(token=SLACK_BOT_TOKEN)
-    test_response = test_client.auth_test()
-    print(f"DEBUG: Slack auth test successful: {test_response.get('ok')}")
-except Exception as e:
-    print(f"DEBUG: Slack auth test failed: {e}")
-
+logger.debug("Slack bot token %s, channel %s", "set" if SLACK_BOT_TOKEN else "missing", SLACK_CHANNEL_ID)
 
+def build_sales_store(df: pd.DataFrame) -> SalesStore | None:
+    """Clean raw CSV rows and build a SalesStore with its daily cube"""
+    logger.debug("NaN values in Net Value: %s, in Date: %s",
+                 lazy(lambda: df["Net Value"].isna().sum()), lazy(lambda: df["Date"].isna().sum()))
 
-def load_anandhaas_data(file_path: str = "anandhaas_sweets.csv") -> pd.DataFrame | None:
-    try:
-        df = pd.read_csv(file_path, quotechar='"')
-        print(f"Available columns: {list(df.columns)}")
-        print(f"Total rows loaded: {len(df)}")
-        
-        # Check for NaN values in key columns before processing
-        print(f"NaN values in Net Value: {df['Net Value'].isna().sum()}")
-        print(f"NaN values in Date: {df['Date'].isna().sum()}")
-        
-        # Use actual columns from CSV - Net Value for revenue, not TotalBillAmt
-        required_cols = ["Branch Name", "Date", "ItemName", "Net Value"]
-        optional_cols = ["Quantity"]
-        column_mapping = {
-            "ItemName": "Item Name",
-            "Net Value": "Total Amount"
-        }
-        df = df.rename(columns=column_mapping)
-        required_cols = ["Branch Name", "Date", "Item Name", "Total Amount"]
-        
-        # Add Quantity if available
-        available_cols = required_cols.copy()
-        if "Quantity" in df.columns:
-            available_cols.append("Quantity")
-            df["Quantity"] = pd.to_numeric(df["Quantity"], errors="coerce").fillna(1)
-        
-        missing_cols = [c for c in required_cols if c not in df.columns]
-        if missing_cols:
-            print(f"Missing required columns: {missing_cols}")
-            return None
-            
-        df = df[available_cols].copy()
-        df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
+    # Use actual columns from CSV - Net Value for revenue, not TotalBillAmt
+    required_cols = ["Branch Name", "Date", "ItemName", "Net Value"]
+    optional_cols = ["Quantity"]
+    column_mapping = {
+        "ItemName": "Item Name",
+        "Net Value": "Total Amount"
+    }
+    df = df.rename(columns=column_mapping)
+    required_cols = ["Branch Name", "Date", "Item Name", "Total Amount"]
+    
+    # Add Quantity if available
+    available_cols = required_cols.copy()
+    if "Quantity" in df.columns:
+        available_cols.append("Quantity")
+        df["Quantity"] = pd.to_numeric(df["Quantity"], errors="coerce").fillna(1)
+    
+    missing_cols = [c for c in required_cols if c not in df.columns]
+    if missing_cols:
+        logger.error("Missing required columns: %s", missing_cols)
+        return None
         
-        # Clean the Total Amount column - remove commas and convert to numeric
+    df = df[available_cols].copy()
+    df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
+    
+    # Clean the Total Amount column - remove commas and convert to numeric (read_sales_csv already parsed it when it could)
+    if not pd.api.types.is_numeric_dtype(df["Total Amount"]):
         df["Total Amount"] = df["Total Amount"].astype(str).str.replace(',', '').str.replace('"', '')
         df["Total Amount"] = pd.to_numeric(df["Total Amount"], errors="coerce")
-        
-        print(f"After processing - NaN values in Total Amount: {df['Total Amount'].isna().sum()}")
-        print(f"After processing - NaN values in Date: {df['Date'].isna().sum()}")
-        print(f"Sample Total Amount values: {df['Total Amount'].head(10).tolist()}")
-        print(f"Final dataset: {len(df)} records with {df['Total Amount'].notna().sum()} valid amounts.")
-        return df
+    
+    logger.debug("After processing - NaN values in Total Amount: %s, in Date: %s, sample amounts: %s",
+                 lazy(lambda: df["Total Amount"].isna().sum()), lazy(lambda: df["Date"].isna().sum()),
+                 lazy(lambda: df["Total Amount"].head(10).tolist()))
+    logger.info("Final dataset: %d records", len(df))
+
+    logger.debug("DataFrame memory: %s MB", lazy(lambda: round(df.memory_usage(index=False, deep=True).sum() / 1e6, 1)))
+    store = SalesStore.from_frame(df, dimensions=["Branch Name", "Item Name"], measures=["Total Amount", "Quantity"],
+                                 index_columns=["Branch Name", "Item Name"])
+    logger.info("Sales store memory: %.1f MB", store.memory_usage() / 1e6)
+    store.cube = build_daily_cube(store, CUBE_DIMENSIONS)
+    logger.info("Daily cube: %d cells (%.1f MB)", len(store.cube), store.cube.memory_usage() / 1e6)
+    return store
+
+def read_sales_csv(raw: bytes, names: list | None = None) -> pd.DataFrame:
+    """Parse the CSV_COLUMNS of raw CSV bytes (a header line first unless names are given).
+
+    Names and dates come back as categoricals, so each distinct value is one
+    string, and amounts like "1,250.50" are parsed as numbers by the parser
+    itself. A column with values that are not numbers stays text for
+    build_sales_store to clean as before.
+    """
+    categories = {"Branch Name": "category", "ItemName": "category", "Date": "category"}
+    return pd.read_csv(io.BytesIO(raw), quotechar='"', header=None if names else "infer", names=names,
+                       usecols=lambda col: col in CSV_COLUMNS, dtype=categories, thousands=",")
+
+def csv_source(file_path: str, raw: bytes, columns: list) -> dict:
+    """What was read from the CSV, so a refresh can parse only the rows appended since"""
+    return {
+        "path": file_path,
+        "offset": len(raw),
+        "head": hashlib.sha1(raw[:CSV_HEAD_BYTES]).hexdigest(),
+        "complete": raw.endswith(b"\n"),
+        "columns": columns,
+    }
+
+@span("load")
+def load_anandhaas_data(file_path: str = DATA_FILE) -> SalesStore | None:
+    try:
+        with open(file_path, "rb") as f:
+            raw = f.read()
+        columns = list(pd.read_csv(io.BytesIO(raw), quotechar='"', nrows=0).columns)
+        df = read_sales_csv(raw)
+        logger.debug("Available columns: %s", columns)
+        logger.info("Total rows loaded: %d", len(df))
+
+        store = build_sales_store(df)
+        if store is not None:
+            store.sources = csv_source(file_path, raw, columns)
+        return store
     except Exception as e:
-        print(f"Cannot load {file_path}: {e}")
+        logger.error("❌ Cannot load %s: %s", file_path, e)
         return None
 
-def analyze_anandhaas_structure(data: pd.DataFrame) -> dict:
+@span("refresh")
+def refresh_anandhaas_data(store: SalesStore) -> SalesStore:
+    """Append the rows added to the CSV since store was loaded.
+
+    The file is treated as append-only: if it shrank or its beginning changed
+    it is loaded again from scratch.
+    """
+    source = store.sources
+    path, offset = source["path"], source["offset"]
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == offset:
+            return store
+        rewritten = (size < offset or not source["complete"]
+                     or hashlib.sha1(f.read(min(offset, CSV_HEAD_BYTES))).hexdigest() != source["head"])
+        if rewritten:
+            logger.info("🔄 %s was rewritten, reloading all data", path)
+            return load_anandhaas_data(path) or store
+        f.seek(offset)
+        tail = f.read()
+
+    # Leave a partially written last line for the next refresh
+    tail = tail[:tail.rfind(b"\n") + 1]
+    if not tail.strip():
+        return store
+
+    df = read_sales_csv(tail, names=source["columns"])
+    logger.info("🔄 Loading %d new rows from %s", len(df), path)
+    delta = build_sales_store(df)
+    if delta is None:
+        return store
+    delta.sources = {**source, "offset": offset + len(tail)}
+    return store.append(delta)
+
+if SHARED_DATA_DIR:
+    anandhaas_snapshot = SharedSnapshot(load_anandhaas_data, refresh_anandhaas_data, SHARED_DATA_DIR,
+                                        interval=DATA_REFRESH_SECONDS)
+else:
+    anandhaas_snapshot = DataSnapshot(load_anandhaas_data, refresh_anandhaas_data, interval=DATA_REFRESH_SECONDS)
+
+@span("analysis")
+def analyze_anandhaas_structure(data: SalesStore) -> dict:
     if data is None or data.empty:
         return {}
-    clean_branches = [b for b in data["Branch Name"].dropna().unique()]
-    clean_items = [i for i in data["Item Name"].dropna().unique()]
+    clean_branches = data.distinct("Branch Name")
+    clean_items = data.distinct("Item Name")
+    start, end = data.date_range()
     analysis = {
         "total_records": len(data),
         "branches": clean_branches,
         "items": clean_items[:20],
         "date_range": {
-            "start": data["Date"].min(),
-            "end": data["Date"].max(),
-        },
-        "revenue_stats": {
-            "total": float(data["Total Amount"].sum()),
-            "avg": float(data["Total Amount"].mean()),
-            "max": float(data["Total Amount"].max()),
-            "min": float(data["Total Amount"].min()),
+            "start": start,
+            "end": end,
         },
+        "revenue_stats": data.measure_stats("Total Amount"),
     }
     return analysis
 
-def get_ai_plan(query: str, data_analysis: dict) -> dict:
+def snapshot_analysis(data: SalesStore) -> dict:
+    """analyze_anandhaas_structure, computed once per data snapshot (treat as read-only)"""
+    return data.derived("analysis", lambda: analyze_anandhaas_structure(data))
+
+def dashboard_payload(data: SalesStore) -> tuple:
+    """JSON body and ETag of /api/dashboard-data for one data snapshot"""
+    analysis = dict(snapshot_analysis(data))
+    if analysis.get("date_range"):
+        analysis["date_range"] = {key: value.isoformat() for key, value in analysis["date_range"].items()}
+    body = app.json.dumps(analysis)
+    return body, hashlib.sha1(body.encode()).hexdigest()
+
+def plan_context(data_analysis: dict) -> dict:
+    """The data lists the model prompt is built from; with the query they make up the plan cache key"""
+    return {"branches": data_analysis.get("branches", []), "items": data_analysis.get("items", [])}
+
+def bedrock_request(query: str, data_analysis: dict) -> str:
+    """invoke_model body asking the model for a visualization plan of query"""
     branches = data_analysis.get("branches", [])
     items = data_analysis.get("items", [])
 
-    try:
-        bedrock = boto3.client("bedrock-runtime", region_name="us-east-1")
-
-        prompt = f"""
+    prompt = f"""
 Analyze this business query about sweets sales and create a visualization plan.
 
 Query: "{query}"
@@ -199,109 +338,139 @@ CRITICAL RULES:
 - Match user terms intelligently to available data
 - IMPORTANT: When no year is specified in dates, assume current year (2025)
 """
-        body = json.dumps({
-            "messages": [{"role": "user", "content": [{"text": prompt}]}],
-            "inferenceConfig": {"temperature": 0.1},
-        })
-        response = bedrock.invoke_model(modelId=BEDROCK_MODEL_ID, body=body)
-        raw = response["body"].read()
-        result = json.loads(raw)
-        ai_text = result["output"]["message"]["content"][0]["text"].strip()
-
-        if "{" in ai_text and "}" in ai_text:
-            start = ai_text.find("{")
-            end = ai_text.rfind("}") + 1
-            json_str = ai_text[start:end]
-            plan = json.loads(json_str)
+    return json.dumps({
+        "messages": [{"role": "user", "content": [{"text": prompt}]}],
+        "inferenceConfig": {"temperature": 0.1},
+    })
+
+def parse_model_plan(raw: bytes) -> dict:
+    """The plan JSON in an invoke_model response body"""
+    result = json.loads(raw)
+    ai_text = result["output"]["message"]["content"][0]["text"].strip()
+
+    if "{" in ai_text and "}" in ai_text:
+        start = ai_text.find("{")
+        end = ai_text.rfind("}") + 1
+        json_str = ai_text[start:end]
+        return json.loads(json_str)
+    raise ValueError("Model did not return JSON")
+
+def local_plan(query: str, data_analysis: dict, context: dict) -> tuple:
+    """(plan, planner) from the rule planner or the plan cache; plan is None when the model is needed"""
+    # Plainly templated questions are planned locally, repeated ones come from the cache
+    plan = rule_planner.plan(query, data_analysis)
+    if plan is not None:
+        return plan, "rules"
+    return plan_cache.get(query, context), "cache"
+
+def finish_plan(query: str, plan: dict, planner: str) -> dict:
+    """Fill in the plan defaults and compile its filters"""
+
+    plan.setdefault("chart_type", "bar")
+    plan.setdefault("x_axis", "Branch Name")
+    plan.setdefault("y_axis", "Total Amount")
+    plan.setdefault("aggregation", "sum")
+    plan.setdefault("title", "Anandhaas Revenue Analysis")
+    plan.setdefault("dual_metrics", False)
+
+    # CRITICAL FIX: Force exact item filtering when item_filters is used
+    if plan.get("item_filters"):
+        plan["x_axis"] = "Item Name"  # Show the specific item
+
+    # CRITICAL FIX: Force pie chart for distribution queries
+    if any(word in query.lower() for word in ["distribution", "breakdown", "share", "split", "proportion", "across all branches", "across branches"]):
+        plan["chart_type"] = "pie"
+
+    filters = []
+
+    if plan.get("item_filters"):
+        if len(plan["item_filters"]) == 1:
+            filters.append(("Item Name", plan["item_filters"][0]))
         else:
-            raise ValueError("Model did not return JSON")
-
-        plan.setdefault("chart_type", "bar")
-        plan.setdefault("x_axis", "Branch Name")
-        plan.setdefault("y_axis", "Total Amount")
-        plan.setdefault("aggregation", "sum")
-        plan.setdefault("title", "Anandhaas Revenue Analysis")
-        plan.setdefault("dual_metrics", False)
-
-        # CRITICAL FIX: Force exact item filtering when item_filters is used
-        if plan.get("item_filters"):
-            plan["x_axis"] = "Item Name"  # Show the specific item
-            
-        # CRITICAL FIX: Force pie chart for distribution queries
-        if any(word in query.lower() for word in ["distribution", "breakdown", "share", "split", "proportion", "across all branches", "across branches"]):
-            plan["chart_type"] = "pie"
-
-        filters = []
-
-        if plan.get("item_filters"):
-            if len(plan["item_filters"]) == 1:
-                filters.append(("Item Name", plan["item_filters"][0]))
-            else:
-                filters.append(("Item_in", plan["item_filters"]))
+            filters.append(("Item_in", plan["item_filters"]))
 
-        if plan.get("item_category_filter"):
-            filters.append(("Item_category", plan["item_category_filter"]))
+    if plan.get("item_category_filter"):
+        filters.append(("Item_category", plan["item_category_filter"]))
 
-        if plan.get("branch_filters"):
-            if len(plan["branch_filters"]) == 1:
-                filters.append(("Branch Name", plan["branch_filters"][0]))
-            else:
-                filters.append(("Branch_in", plan["branch_filters"]))
+    if plan.get("branch_filters"):
+        if len(plan["branch_filters"]) == 1:
+            filters.append(("Branch Name", plan["branch_filters"][0]))
+        else:
+            filters.append(("Branch_in", plan["branch_filters"]))
 
-        if plan.get("month_filter"):
-            month_val = plan["month_filter"]
-            if isinstance(month_val, list):
-                filters.append(("date_month_in", month_val))
-            else:
-                filters.append(("date_month", month_val))
+    if plan.get("month_filter"):
+        month_val = plan["month_filter"]
+        if isinstance(month_val, list):
+            filters.append(("date_month_in", month_val))
+        else:
+            filters.append(("date_month", month_val))
 
-        if plan.get("date_filter"):
-            date_val = plan["date_filter"]
-            if isinstance(date_val, list) and len(date_val) == 2:
-                filters.append(("date_range", date_val))
-            else:
-                filters.append(("date_specific", date_val))
+    if plan.get("date_filter"):
+        date_val = plan["date_filter"]
+        if isinstance(date_val, list) and len(date_val) == 2:
+            filters.append(("date_range", date_val))
+        else:
+            filters.append(("date_specific", date_val))
 
-        if plan.get("year_filter"):
-            year_val = plan["year_filter"]
-            if isinstance(year_val, list):
-                filters.append(("date_year_in", year_val))
-            else:
-                filters.append(("date_year", year_val))
+    if plan.get("year_filter"):
+        year_val = plan["year_filter"]
+        if isinstance(year_val, list):
+            filters.append(("date_year_in", year_val))
+        else:
+            filters.append(("date_year", year_val))
+
+    plan["filters"] = filters
+    plan["planner"] = planner
+    logger.debug("Plan from %s for %r: %s", planner, query, plan)
+    return plan
 
-        plan["filters"] = filters
-        print(f"\n=== AI PLAN DEBUG ===")
-        print(f"Original Query: {query}")
-        print(f"AI Plan: {plan}")
-        print(f"Filters to apply: {filters}")
-        print(f"===================\n")
-        return plan
+@span("plan")
+def get_ai_plan(query: str, data_analysis: dict, bedrock=None) -> dict:
+    context = plan_context(data_analysis)
+    try:
+        plan, planner = local_plan(query, data_analysis, context)
+        if plan is None:
+            planner = "bedrock"
+            if bedrock is None:
+                bedrock = aws_client("bedrock-runtime")
+            with span("bedrock"):
+                response = bedrock.invoke_model(modelId=BEDROCK_MODEL_ID, body=bedrock_request(query, data_analysis))
+            plan = parse_model_plan(response["body"].read())
+            plan_cache.put(query, context, plan)
+        return finish_plan(query, plan, planner)
 
     except Exception as e:
-        print(f"AI model failed to process query: {str(e)}")
+        logger.error("AI model failed to process query: %s", e)
         raise
 
-def create_anandhaas_visualization(data: pd.DataFrame, ai_plan: dict):
-    dual_metrics = ai_plan.get("dual_metrics", False) or ai_plan.get("y_axis") == "dual"
-    
-    if dual_metrics:
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(24, 10))
-    else:
-        fig, ax = plt.subplots(figsize=(20, 12))
-    
-    filtered_data = data.copy()
-    filters = ai_plan.get("filters", [])
+async def get_ai_plan_async(query: str, data_analysis: dict, bedrock) -> dict:
+    """get_ai_plan for the ASGI server, calling the model on a non-blocking AsyncBedrock client"""
+    context = plan_context(data_analysis)
+    try:
+        with span("plan"):
+            plan, planner = local_plan(query, data_analysis, context)
+            if plan is None:
+                planner = "bedrock"
+                with span("bedrock"):
+                    raw = await bedrock.invoke_model(BEDROCK_MODEL_ID, bedrock_request(query, data_analysis))
+                plan = parse_model_plan(raw)
+                plan_cache.put(query, context, plan)
+            return finish_plan(query, plan, planner)
+
+    except Exception as e:
+        logger.error("AI model failed to process query: %s", e)
+        raise
+
+@span("filter")
+def apply_filters(data: SalesStore, filters: list) -> np.ndarray:
+    """Compile the plan filters into one row mask and return the matching row positions"""
+    selection = RowFilter(data)
 
     for filter_type, filter_value in filters:
         if filter_type == "date_month":
-            filtered_data = filtered_data[
-                filtered_data["Date"].dt.month == int(filter_value)
-            ]
+            selection.keep_months([int(filter_value)])
         elif filter_type == "date_month_in":
-            month_list = [int(m) for m in filter_value]
-            filtered_data = filtered_data[
-                filtered_data["Date"].dt.month.isin(month_list)
-            ]
+            selection.keep_months([int(m) for m in filter_value])
         elif filter_type == "date_specific":
             try:
                 # Handle various date formats and add current year if missing
@@ -309,91 +478,72 @@ def create_anandhaas_visualization(data: pd.DataFrame, ai_plan: dict):
                     current_year = pd.Timestamp.now().year
                     filter_value = f"{current_year}-{filter_value}"
                 target_date = pd.to_datetime(filter_value).date()
-                filtered_data = filtered_data[
-                    filtered_data["Date"].dt.date == target_date
-                ]
-                print(f"DEBUG: Date filter '{target_date}' resulted in {len(filtered_data)} records")
+                selection.keep_day_range(to_day_number(target_date), to_day_number(target_date))
+                logger.debug("Date filter '%s'", target_date)
             except Exception as e:
-                print(f"DEBUG: Date parsing error for '{filter_value}': {e}")
+                logger.debug("Date parsing error for '%s': %s", filter_value, e)
                 continue
         elif filter_type == "date_range":
-            start_date = pd.to_datetime(filter_value[0])
-            end_date = pd.to_datetime(filter_value[1])
-            filtered_data = filtered_data[
-                (filtered_data["Date"] >= start_date) & 
-                (filtered_data["Date"] <= end_date)
-            ]
+            start_day = to_day_number(pd.to_datetime(filter_value[0]).ceil("D"))
+            end_day = to_day_number(pd.to_datetime(filter_value[1]).floor("D"))
+            selection.keep_day_range(start_day, end_day)
         elif filter_type == "date_year":
-            filtered_data = filtered_data[
-                filtered_data["Date"].dt.year == int(filter_value)
-            ]
+            selection.keep_years([int(filter_value)])
         elif filter_type == "date_year_in":
-            year_list = [int(y) for y in filter_value]
-            filtered_data = filtered_data[
-                filtered_data["Date"].dt.year.isin(year_list)
-            ]
+            selection.keep_years([int(y) for y in filter_value])
         elif filter_type in ["Item Name", "Branch Name"]:
-            clean_data = filtered_data.dropna(subset=[filter_type])
-            print(f"Filtering {filter_type} for: '{filter_value}'")
-            print(f"Records before filtering: {len(clean_data)}")
-            
-            # CRITICAL FIX: Try exact match first (case-insensitive)
-            exact_match = clean_data[clean_data[filter_type].astype(str).str.lower() == str(filter_value).lower()]
-            
-            if not exact_match.empty:
-                filtered_data = exact_match
-                print(f"Exact match found: {len(exact_match)} records")
-            else:
-                # If no exact match, try partial match with ALL words present
-                search_words = str(filter_value).lower().split()
-                mask = clean_data[filter_type].astype(str).str.lower()
-                
-                # Start with all records
-                temp_data = clean_data.copy()
-                
-                # Each word must be present in the item name (AND logic)
-                for word in search_words:
-                    word_mask = temp_data[filter_type].astype(str).str.lower().str.contains(word, case=False, na=False)
-                    temp_data = temp_data[word_mask]
-                
-                if not temp_data.empty:
-                    filtered_data = temp_data
-                    print(f"Partial match (ALL words) found: {len(temp_data)} records")
-                    print(f"Matched items: {temp_data[filter_type].unique()[:5]}")
-                else:
-                    # No matches found - return empty to avoid wrong results
-                    filtered_data = pd.DataFrame(columns=filtered_data.columns)
-                    print(f"No matches found for '{filter_value}'")
-            
-            print(f"Records after filtering: {len(filtered_data)}")
-            if not filtered_data.empty:
-                print(f"Total Amount sum: {filtered_data['Total Amount'].sum()}")
-                print(f"Sample filtered records:")
-                print(filtered_data[['Branch Name', 'Item Name', 'Total Amount']].head(3))
-                print(f"Unique items found: {filtered_data['Item Name'].unique()}")
+            # CRITICAL FIX: Try exact match first (case-insensitive), else
+            # partial match with ALL words present (AND logic)
+            search_words = str(filter_value).lower().split()
+            partial_codes = data.contains_codes(filter_type, search_words)
+            selection.keep_codes_or(filter_type, data.equal_codes(filter_type, str(filter_value)), partial_codes)
+            logger.debug("Filtering %s for '%s', partial match candidates: %s", filter_type, filter_value,
+                         lazy(lambda: list(data.frame[filter_type].cat.categories[partial_codes][:5])))
         elif filter_type == "Item_category":
             # Filter for all items containing the category keyword
-            clean_data = filtered_data.dropna(subset=["Item Name"])
-            category_mask = clean_data["Item Name"].astype(str).str.contains(str(filter_value), case=False, na=False)
-            filtered_data = clean_data[category_mask]
-            print(f"Category filter '{filter_value}' resulted in {len(filtered_data)} records")
-            if not filtered_data.empty:
-                print(f"Items found: {filtered_data['Item Name'].unique()[:10]}")
+            codes = data.contains_codes("Item Name", [str(filter_value)])
+            selection.keep_codes("Item Name", codes)
+            logger.debug("Category filter '%s' items: %s", filter_value,
+                         lazy(lambda: list(data.frame["Item Name"].cat.categories[codes][:10])))
         elif filter_type in ["Item_in", "Branch_in"]:
             col_map = {
                 "Item_in": "Item Name",
                 "Branch_in": "Branch Name",
             }
             col = col_map[filter_type]
-            values = [str(v) for v in filter_value]
-            clean_data = filtered_data.dropna(subset=[col])
-            tmp = clean_data[clean_data[col].astype(str).isin(values)]
-            filtered_data = tmp
+            selection.keep_codes(col, data.isin_codes(col, filter_value))
 
-    if filtered_data.empty:
-        raise ValueError("No data found after applying filters.")
+    rows = selection.rows()
+    logger.debug("Filters %s matched %d of %d records", filters, len(rows), len(data))
+    return rows
+
+def cube_answers(ai_plan: dict) -> bool:
+    """True when a plan only needs the daily cube's sums and row counts"""
+    if ai_plan.get("x_axis", "Branch Name") not in CUBE_DIMENSIONS + ["Month", "Date", "Item-Branch"]:
+        return False
+    if ai_plan.get("dual_metrics", False) or ai_plan.get("y_axis") in ["dual", "count"]:
+        return True
+    return ai_plan.get("aggregation", "sum") == "sum" and ai_plan.get("y_axis", "Total Amount") in ["Total Amount", "Quantity"]
 
+@span("aggregate")
+def chart_series(data: SalesStore, ai_plan: dict) -> dict:
+    """Compute what a plan's chart shows: the chart_data JSON and the series draw_chart plots"""
+    dual_metrics = ai_plan.get("dual_metrics", False) or ai_plan.get("y_axis") == "dual"
+    
+    # Answer from the pre-aggregated cube when possible, else from raw rows
+    use_cube = data.cube is not None and cube_answers(ai_plan)
+    source = data.cube if use_cube else data
+    logger.debug("Answering from %s", "daily cube" if use_cube else "raw rows")
+    rows = apply_filters(source, ai_plan.get("filters", []))
     x_col = ai_plan.get("x_axis", "Branch Name")
+
+    # Cube cells grouped by a dimension are summed straight from category codes;
+    # everything else materializes only the matching rows
+    direct = use_cube and x_col in CUBE_DIMENSIONS
+    filtered_data = None if direct else source.take(rows)
+
+    if len(rows) == 0:
+        raise ValueError("No data found after applying filters.")
     
     # Handle month-wise grouping
     if x_col == "Month":
@@ -403,6 +553,8 @@ def create_anandhaas_visualization(data: pd.DataFrame, ai_plan: dict):
     elif x_col == "Item-Branch":
         filtered_data = filtered_data.copy()
         filtered_data["Item-Branch"] = filtered_data["Item Name"].astype(str) + " @ " + filtered_data["Branch Name"].astype(str)
+
+    spec = {"x_col": x_col, "dual_metrics": dual_metrics, "title": ai_plan.get("title", "Anandhaas Analysis")}
     
     if dual_metrics:
         if x_col == "Month":
@@ -412,42 +564,25 @@ def create_anandhaas_visualization(data: pd.DataFrame, ai_plan: dict):
                 count_data = filtered_data.groupby(["MonthSort", "Month"])["Quantity"].sum().reset_index()
                 count_data = count_data.set_index("Month")["Quantity"].sort_index()
             else:
-                count_data = filtered_data.groupby(["MonthSort", "Month"]).size().reset_index(name="count")
+                count_data = row_counts(filtered_data, ["MonthSort", "Month"]).reset_index(name="count")
                 count_data = count_data.set_index("Month")["count"].sort_index()
+        elif direct:
+            revenue_data = source.group_sum(rows, x_col, "Total Amount").sort_values(ascending=False)
+            count_measure = "Quantity" if "Quantity" in source.measures else COUNT_COLUMN
+            count_data = source.group_sum(rows, x_col, count_measure).sort_values(ascending=False)
         else:
-            revenue_data = filtered_data.groupby(x_col)["Total Amount"].sum().sort_values(ascending=False)
+            revenue_data = filtered_data.groupby(x_col, observed=True)["Total Amount"].sum().sort_values(ascending=False)
             if "Quantity" in filtered_data.columns:
-                count_data = filtered_data.groupby(x_col)["Quantity"].sum().sort_values(ascending=False)
+                count_data = filtered_data.groupby(x_col, observed=True)["Quantity"].sum().sort_values(ascending=False)
             else:
-                count_data = filtered_data[x_col].value_counts().sort_values(ascending=False)
-        
-        bars1 = ax1.bar(range(len(revenue_data)), revenue_data.values, color='#1e40af', alpha=0.95, edgecolor='white', linewidth=1.5)
-        ax1.set_xticks(range(len(revenue_data)))
-        ax1.set_xticklabels(revenue_data.index, rotation=0 if len(revenue_data) <= 5 else 45, ha='center' if len(revenue_data) <= 5 else 'right', fontsize=11)
-        ax1.set_xlabel(x_col, fontsize=12, fontweight="bold")
-        ax1.set_ylabel("Revenue in Lakhs", fontsize=12, fontweight="bold")
-        ax1.set_title("Revenue Analysis", fontsize=14, fontweight="bold")
-        
-        ax1.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{x/100000:.0f}'))
-        
-        for i, bar in enumerate(bars1):
-            height = bar.get_height()
-            ax1.text(bar.get_x() + bar.get_width()/2., height + height*0.01, f'₹{height:,.0f}',
-                    ha='center', va='bottom', fontweight='bold', fontsize=9)
-        
-        bars2 = ax2.bar(range(len(count_data)), count_data.values, color='#059669', alpha=0.95, edgecolor='white', linewidth=1.5)
-        ax2.set_xticks(range(len(count_data)))
-        ax2.set_xticklabels(count_data.index, rotation=0 if len(count_data) <= 5 else 45, ha='center' if len(count_data) <= 5 else 'right', fontsize=11)
-        ax2.set_xlabel(x_col, fontsize=12, fontweight="bold")
-        ax2.set_ylabel("Count", fontsize=12, fontweight="bold")
-        ax2.set_title("Transaction Count", fontsize=14, fontweight="bold")
-        
-        ax2.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{x/1000:.0f}k' if x >= 1000 else f'{x:.0f}'))
-        
-        for i, bar in enumerate(bars2):
-            height = bar.get_height()
-            ax2.text(bar.get_x() + bar.get_width()/2., height + height*0.01, f'{int(height)}',
-                    ha='center', va='bottom', fontweight='bold', fontsize=9)
+                count_data = row_counts(filtered_data, x_col).sort_values(ascending=False)
+
+        limit = ai_plan.get("limit")
+        if limit and isinstance(limit, int) and limit > 0:
+            revenue_data = revenue_data.head(limit)
+            count_data = count_data.reindex(revenue_data.index, fill_value=0)
+
+        spec.update(revenue=revenue_data, count=count_data)
         
         all_branches = set(revenue_data.index) | set(count_data.index)
         chart_data = []
@@ -464,109 +599,173 @@ def create_anandhaas_visualization(data: pd.DataFrame, ai_plan: dict):
         y_col = ai_plan.get("y_axis", "Total Amount")
         agg_method = ai_plan.get("aggregation", "sum")
 
-        if y_col == "count":
+        if direct:
+            measure = COUNT_COLUMN if y_col == "count" else y_col
+            grouped_data = source.group_sum(rows, x_col, measure).sort_values(ascending=False)
+        elif y_col == "count":
             if x_col == "Month":
-                grouped_data = filtered_data.groupby(["MonthSort", "Month"]).size().reset_index(name="count")
+                grouped_data = row_counts(filtered_data, ["MonthSort", "Month"]).reset_index(name="count")
                 grouped_data = grouped_data.set_index("Month")["count"].sort_index()
             else:
-                grouped_data = filtered_data[x_col].value_counts().sort_values(ascending=False)
+                grouped_data = row_counts(filtered_data, x_col).sort_values(ascending=False)
         elif y_col == "Quantity" and "Quantity" in filtered_data.columns:
             if x_col == "Month":
                 grouped_data = filtered_data.groupby(["MonthSort", "Month"])["Quantity"].agg(agg_method).reset_index()
                 grouped_data = grouped_data.set_index("Month")["Quantity"].sort_index()
             else:
-                grouped_data = filtered_data.groupby(x_col)["Quantity"].agg(agg_method).sort_values(ascending=False)
+                grouped_data = filtered_data.groupby(x_col, observed=True)["Quantity"].agg(agg_method).sort_values(ascending=False)
         else:
             if x_col == "Month":
                 grouped_data = filtered_data.groupby(["MonthSort", "Month"])[y_col].agg(agg_method).reset_index()
                 grouped_data = grouped_data.set_index("Month")[y_col].sort_index()
             else:
-                grouped_data = filtered_data.groupby(x_col)[y_col].agg(agg_method).sort_values(ascending=False)
+                grouped_data = filtered_data.groupby(x_col, observed=True)[y_col].agg(agg_method).sort_values(ascending=False)
 
-        chart_type = ai_plan.get("chart_type", "bar")
+        # Apply limit if specified
+        limit = ai_plan.get("limit")
+        logger.debug("%d groups, limit %s", len(grouped_data), limit)
+        if limit and isinstance(limit, int) and limit > 0:
+            grouped_data = grouped_data.head(limit)
 
+        chart_type = ai_plan.get("chart_type", "bar")
         if chart_type == "pie":
             grouped_data = grouped_data.sort_values(ascending=False)
-            professional_colors = ['#1e40af', '#059669', '#d97706', '#dc2626', '#7c3aed', '#0891b2', '#65a30d', '#ea580c']
-            colors = [professional_colors[i % len(professional_colors)] for i in range(len(grouped_data))]
-            
-            wedges, texts, autotexts = ax.pie(
-                grouped_data.values,
-                labels=None,
-                autopct=lambda pct: f'{pct:.1f}%' if pct > 3 else '',
-                colors=colors,
-                startangle=90,
-                pctdistance=0.85,
-                explode=[0.05 if i == 0 else 0 for i in range(len(grouped_data))]
-            )
-            
-            for autotext in autotexts:
-                autotext.set_color("white")
-                autotext.set_fontweight("bold")
-                autotext.set_fontsize(10)
-            
-            ax.legend(wedges, [f'{name}: ₹{value:,.0f} ({value/grouped_data.sum()*100:.1f}%)' if y_col == 'Total Amount' else f'{name}: {value:.0f} ({value/grouped_data.sum()*100:.1f}%)' 
-                              for name, value in grouped_data.items()], 
-                     title=x_col, loc="center left", bbox_to_anchor=(1, 0, 0.5, 1), fontsize=10)
-        elif chart_type == "line":
-            ax.plot(
-                range(len(grouped_data)),
-                grouped_data.values,
-                marker="o",
-                linewidth=3,
-                markersize=8,
-            )
-            ax.set_xticks(range(len(grouped_data)))
-            ax.set_xticklabels(grouped_data.index, rotation=0 if len(grouped_data) <= 5 else 45, ha='center' if len(grouped_data) <= 5 else 'right', fontsize=11)
-            ax.set_xlabel(x_col, fontsize=12, fontweight="bold")
-            ax.set_ylabel(f"{y_col} {'(Lakhs)' if y_col == 'Total Amount' else ''}", fontsize=12, fontweight="bold")
-            if y_col == "Total Amount":
-                ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{x/100000:.0f}'))
-            ax.grid(True, alpha=0.3)
-        else:
-            professional_colors = ['#1e40af', '#059669', '#d97706', '#dc2626', '#7c3aed', '#0891b2', '#65a30d', '#ea580c']
-            bar_colors = [professional_colors[i % len(professional_colors)] for i in range(len(grouped_data))]
-            bars = ax.bar(
-                range(len(grouped_data)),
-                grouped_data.values,
-                color=bar_colors,
-                alpha=0.95,
-                edgecolor='white',
-                linewidth=1.5
-            )
-            ax.set_xticks(range(len(grouped_data)))
-            ax.set_xticklabels(grouped_data.index, rotation=0 if len(grouped_data) <= 5 else 45, ha='center' if len(grouped_data) <= 5 else 'right', fontsize=11)
-            ax.set_xlabel(x_col, fontsize=12, fontweight="bold")
-            ax.set_ylabel(f"{y_col} {'(Lakhs)' if y_col == 'Total Amount' else ''}", fontsize=12, fontweight="bold")
-            if y_col == "Total Amount":
-                ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{x/100000:.0f}'))
-            for i, bar in enumerate(bars):
-                height = bar.get_height()
-                if y_col == "Total Amount":
-                    label = f"₹{height:,.0f}"
-                else:
-                    label = f"{height:.0f}"
-                ax.text(
-                    bar.get_x() + bar.get_width() / 2.0,
-                    height + height*0.01,
-                    label,
-                    ha="center",
-                    va="bottom",
-                    fontweight="bold",
-                    fontsize=9
-                )
+
+        spec.update(chart_type=chart_type, y_col=y_col, series=grouped_data)
         
         chart_data = [{"name": str(k), "value": float(v)} for k, v in grouped_data.items()]
-    
-    if not dual_metrics:
-        ax.set_title(ai_plan.get("title", "Anandhaas Analysis"), fontsize=16, fontweight="bold", pad=20)
+
+    spec["chart_data"] = chart_data
+    return spec
+
+def cached_chart_series(data: SalesStore, ai_plan: dict, endpoint: str) -> dict:
+    """chart_series from the result cache, titled for this plan (the title is not part of the cache key)"""
+    spec = result_cache.get(data, ai_plan, lambda: chart_series(data, ai_plan), endpoint)
+    return dict(spec, title=ai_plan.get("title", "Anandhaas Analysis"))
+
+@span("render")
+def draw_chart(spec: dict) -> "Figure":
+    """Draw a chart_series spec on a new Figure (no pyplot state, so safe off the request thread)"""
+    from matplotlib.figure import Figure
+    from matplotlib.ticker import FuncFormatter
+    x_col = spec["x_col"]
+
+    if spec["dual_metrics"]:
+        fig = Figure(figsize=(24, 10))
+        ax1, ax2 = fig.subplots(1, 2)
+
+        revenue_data, count_data = spec["revenue"], spec["count"]
+        
+        bars1 = ax1.bar(range(len(revenue_data)), revenue_data.values, color='#1e40af', alpha=0.95, edgecolor='white', linewidth=1.5)
+        ax1.set_xticks(range(len(revenue_data)))
+        ax1.set_xticklabels(revenue_data.index, rotation=0 if len(revenue_data) <= 5 else 45, ha='center' if len(revenue_data) <= 5 else 'right', fontsize=11)
+        ax1.set_xlabel(x_col, fontsize=12, fontweight="bold")
+        ax1.set_ylabel("Revenue in Lakhs", fontsize=12, fontweight="bold")
+        ax1.set_title("Revenue Analysis", fontsize=14, fontweight="bold")
+        
+        ax1.yaxis.set_major_formatter(FuncFormatter(lambda x, p: f'{x/100000:.0f}'))
+        
+        for i, bar in enumerate(bars1):
+            height = bar.get_height()
+            ax1.text(bar.get_x() + bar.get_width()/2., height + height*0.01, f'₹{height:,.0f}',
+                    ha='center', va='bottom', fontweight='bold', fontsize=9)
+        
+        bars2 = ax2.bar(range(len(count_data)), count_data.values, color='#059669', alpha=0.95, edgecolor='white', linewidth=1.5)
+        ax2.set_xticks(range(len(count_data)))
+        ax2.set_xticklabels(count_data.index, rotation=0 if len(count_data) <= 5 else 45, ha='center' if len(count_data) <= 5 else 'right', fontsize=11)
+        ax2.set_xlabel(x_col, fontsize=12, fontweight="bold")
+        ax2.set_ylabel("Count", fontsize=12, fontweight="bold")
+        ax2.set_title("Transaction Count", fontsize=14, fontweight="bold")
+        
+        ax2.yaxis.set_major_formatter(FuncFormatter(lambda x, p: f'{x/1000:.0f}k' if x >= 1000 else f'{x:.0f}'))
+        
+        for i, bar in enumerate(bars2):
+            height = bar.get_height()
+            ax2.text(bar.get_x() + bar.get_width()/2., height + height*0.01, f'{int(height)}',
+                    ha='center', va='bottom', fontweight='bold', fontsize=9)
+
+        fig.suptitle(spec["title"], fontsize=16, fontweight="bold")
+        fig.tight_layout()
+        fig.subplots_adjust(top=0.9)
+        return fig
+
+    fig = Figure(figsize=(20, 12))
+    ax = fig.subplots()
+    chart_type, y_col, grouped_data = spec["chart_type"], spec["y_col"], spec["series"]
+
+    if chart_type == "pie":
+        professional_colors = ['#1e40af', '#059669', '#d97706', '#dc2626', '#7c3aed', '#0891b2', '#65a30d', '#ea580c']
+        colors = [professional_colors[i % len(professional_colors)] for i in range(len(grouped_data))]
+        
+        wedges, texts, autotexts = ax.pie(
+            grouped_data.values,
+            labels=None,
+            autopct=lambda pct: f'{pct:.1f}%' if pct > 3 else '',
+            colors=colors,
+            startangle=90,
+            pctdistance=0.85,
+            explode=[0.05 if i == 0 else 0 for i in range(len(grouped_data))]
+        )
+        
+        for autotext in autotexts:
+            autotext.set_color("white")
+            autotext.set_fontweight("bold")
+            autotext.set_fontsize(10)
+        
+        ax.legend(wedges, [f'{name}: ₹{value:,.0f} ({value/grouped_data.sum()*100:.1f}%)' if y_col == 'Total Amount' else f'{name}: {value:.0f} ({value/grouped_data.sum()*100:.1f}%)' 
+                          for name, value in grouped_data.items()], 
+                 title=x_col, loc="center left", bbox_to_anchor=(1, 0, 0.5, 1), fontsize=10)
+    elif chart_type == "line":
+        ax.plot(
+            range(len(grouped_data)),
+            grouped_data.values,
+            marker="o",
+            linewidth=3,
+            markersize=8,
+        )
+        ax.set_xticks(range(len(grouped_data)))
+        ax.set_xticklabels(grouped_data.index, rotation=0 if len(grouped_data) <= 5 else 45, ha='center' if len(grouped_data) <= 5 else 'right', fontsize=11)
+        ax.set_xlabel(x_col, fontsize=12, fontweight="bold")
+        ax.set_ylabel(f"{y_col} {'(Lakhs)' if y_col == 'Total Amount' else ''}", fontsize=12, fontweight="bold")
+        if y_col == "Total Amount":
+            ax.yaxis.set_major_formatter(FuncFormatter(lambda x, p: f'{x/100000:.0f}'))
+        ax.grid(True, alpha=0.3)
     else:
-        fig.suptitle(ai_plan.get("title", "Anandhaas Analysis"), fontsize=16, fontweight="bold")
+        professional_colors = ['#1e40af', '#059669', '#d97706', '#dc2626', '#7c3aed', '#0891b2', '#65a30d', '#ea580c']
+        bar_colors = [professional_colors[i % len(professional_colors)] for i in range(len(grouped_data))]
+        bars = ax.bar(
+            range(len(grouped_data)),
+            grouped_data.values,
+            color=bar_colors,
+            alpha=0.95,
+            edgecolor='white',
+            linewidth=1.5
+        )
+        ax.set_xticks(range(len(grouped_data)))
+        ax.set_xticklabels(grouped_data.index, rotation=0 if len(grouped_data) <= 5 else 45, ha='center' if len(grouped_data) <= 5 else 'right', fontsize=11)
+        ax.set_xlabel(x_col, fontsize=12, fontweight="bold")
+        ax.set_ylabel(f"{y_col} {'(Lakhs)' if y_col == 'Total Amount' else ''}", fontsize=12, fontweight="bold")
+        if y_col == "Total Amount":
+            ax.yaxis.set_major_formatter(FuncFormatter(lambda x, p: f'{x/100000:.0f}'))
+        for i, bar in enumerate(bars):
+            height = bar.get_height()
+            if y_col == "Total Amount":
+                label = f"₹{height:,.0f}"
+            else:
+                label = f"{height:.0f}"
+            ax.text(
+                bar.get_x() + bar.get_width() / 2.0,
+                height + height*0.01,
+                label,
+                ha="center",
+                va="bottom",
+                fontweight="bold",
+                fontsize=9
+            )
     
-    plt.tight_layout()
-    if dual_metrics:
-        plt.subplots_adjust(top=0.9)
-    return chart_data, fig
+    ax.set_title(spec["title"], fontsize=16, fontweight="bold", pad=20)
+    fig.tight_layout()
+    return fig
 
 def generate_simple_response(ai_plan: dict, chart_data: list = None) -> str:
     chart_desc_map = {"bar": "comparison chart", "pie": "distribution chart", "line": "trend chart"}
@@ -606,79 +805,94 @@ def generate_simple_response(ai_plan: dict, chart_data: list = None) -> str:
 
 @app.route("/api/dashboard-data", methods=["GET"])
 def get_dashboard_data():
-    global anandhaas_data
-    if anandhaas_data is None:
-        anandhaas_data = load_anandhaas_data()
-
-    if anandhaas_data is None:
+    data = anandhaas_snapshot.get()
+    if data is None:
         return jsonify({"error": "Data not available"}), 404
 
-    analysis = analyze_anandhaas_structure(anandhaas_data)
-    if analysis.get("date_range"):
-        analysis["date_range"]["start"] = analysis["date_range"]["start"].isoformat()
-        analysis["date_range"]["end"] = analysis["date_range"]["end"].isoformat()
-    return jsonify(analysis)
+    # Built once per data snapshot; a client holding the same ETag gets a bodyless 304
+    body, etag = data.derived("dashboard-data", lambda: dashboard_payload(data))
+    response = app.response_class(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
+
+def query_payload(query: str, ai_plan: dict, spec: dict) -> dict:
+    """Body of /api/query for a planned query's chart series, less the report id"""
+    chart_data = spec["chart_data"]
+    response_text = generate_simple_response(ai_plan, chart_data)
+    return {
+        "original_query": query,
+        "chart_type": ai_plan.get("chart_type", "bar"),
+        "title": ai_plan.get("title", "Analysis"),
+        "data": chart_data,
+        "x_axis": ai_plan.get("x_axis", "Branch Name"),
+        "y_axis": ai_plan.get("y_axis", "Total Amount"),
+        "insights": response_text,
+        "pdf_filename": f"{ai_plan.get('title','report').replace(' ', '_')}.pdf",
+        "dual_metrics": ai_plan.get("dual_metrics", False),
+        "planner": ai_plan.get("planner"),
+    }
+
+def add_report(ai_plan: dict, spec: dict, insights: str, session: str) -> str:
+    """Keep the query's report for export under the caller's session; the figure is only drawn if it is exported"""
+    chart_title = ai_plan.get("title", "Anandhaas Revenue Analysis")
+    pdf_filename = f"{chart_title.replace(' ', '_')}_report.pdf"
+    return report_store.add(spec, session=session, title=chart_title, insights=insights, filename=pdf_filename)
 
 @app.route("/api/query", methods=["POST"])
 def process_query():
-    global anandhaas_data
     try:
         payload = request.get_json(silent=True) or {}
         query = payload.get("query", "").strip()
         if not query:
             return jsonify({"error": "Query is required"}), 400
 
-        if anandhaas_data is None:
-            anandhaas_data = load_anandhaas_data()
-        if anandhaas_data is None:
-            return jsonify({"error": "Data not available. Ensure anandhaas_sweets.xlsx exists."}), 404
+        # One snapshot for the whole request, even if a refresh lands meanwhile
+        data = anandhaas_snapshot.get()
+        if data is None:
+            return jsonify({"error": DATA_UNAVAILABLE}), 404
 
-        data_analysis = analyze_anandhaas_structure(anandhaas_data)
+        data_analysis = snapshot_analysis(data)
         ai_plan = get_ai_plan(query, data_analysis)
-        chart_data, fig = create_anandhaas_visualization(anandhaas_data, ai_plan)
-        response_text = generate_simple_response(ai_plan, chart_data)
+        spec = cached_chart_series(data, ai_plan, "query")
 
-        try:
-            chart_title = ai_plan.get("title", "Anandhaas Revenue Analysis")
-            pdf_bytes = generate_pdf_report(fig, chart_title, response_text)
-            pdf_b64 = base64.b64encode(pdf_bytes).decode("utf-8")
-            
-            # Store last PDF data like Streamlit session_state
-            global last_pdf_data
-            last_pdf_data = {
-                'data': pdf_bytes,
-                'title': chart_title,
-                'insights': response_text,
-                'filename': f"{chart_title.replace(' ', '_')}_report.pdf"
-            }
-            print(f"PDF stored: {chart_title}, size: {len(pdf_bytes)} bytes")
-        except Exception as e:
-            print(f"PDF generation error: {e}")
-            pdf_b64 = None
-
-        plt.close(fig)
+        # The frontend draws chart_data itself
+        answer = query_payload(query, ai_plan, spec)
+        session = report_session()
+        new_session = session is None
+        if new_session:
+            session = uuid.uuid4().hex
+        answer["report_id"] = add_report(ai_plan, spec, answer["insights"], session)
 
-        return jsonify({
-            "original_query": query,
-            "chart_type": ai_plan.get("chart_type", "bar"),
-            "title": ai_plan.get("title", "Analysis"),
-            "data": chart_data,
-            "x_axis": ai_plan.get("x_axis", "Branch Name"),
-            "y_axis": ai_plan.get("y_axis", "Total Amount"),
-            "insights": response_text,
-            "pdf_base64": pdf_b64,
-            "pdf_filename": f"{ai_plan.get('title','report').replace(' ', '_')}.pdf",
-            "dual_metrics": ai_plan.get("dual_metrics", False),
-        })
+        response = jsonify(answer)
+        if new_session:
+            response.set_cookie(REPORT_SESSION_COOKIE, session, httponly=True, samesite="Lax")
+        return response
 
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Query failed")
         return jsonify({"error": f"Server error: {str(e)}"}), 500
 
+@app.route("/api/admin/refresh", methods=["POST"])
+def refresh_data():
+    """Load rows appended to the CSV into the running server without a restart"""
+    if ADMIN_TOKEN and request.headers.get("X-Admin-Token") != ADMIN_TOKEN:
+        return jsonify({"error": "Unauthorized"}), 401
+    try:
+        return jsonify(anandhaas_snapshot.refresh())
+    except Exception as e:
+        return jsonify({"error": f"Refresh failed: {str(e)}"}), 500
+
+@app.route("/api/plan-cache", methods=["GET"])
+def get_plan_cache_stats():
+    return jsonify(plan_cache.stats())
+
+@app.route("/api/result-cache", methods=["GET"])
+def get_result_cache_stats():
+    return jsonify(result_cache.stats())
+
 @app.route("/api/transcribe", methods=["POST"])
 def transcribe():
-    temp_file_path = None
     try:
         if "audio" not in request.files:
             return jsonify({"error": "No audio file"}), 400
@@ -688,41 +902,106 @@ def transcribe():
         if not SARVAM_API_KEY:
             return jsonify({"transcript": "Please configure SARVAM_API_KEY in .env file"})
         
-        temp_file = tempfile.NamedTemporaryFile(suffix=".wav", delete=False)
-        temp_file_path = temp_file.name
-        temp_file.close()
-        
-        audio_file.save(temp_file_path)
-        
-        headers = {"api-subscription-key": SARVAM_API_KEY}
-        with open(temp_file_path, "rb") as f:
-            files = {"file": ("audio.wav", f, "audio/wav")}
-            response = requests.post(SARVAM_STT_URL, headers=headers, files=files, timeout=45)
-        
-        if response.status_code == 200:
-            transcript = response.json().get("transcript", "")
-            return jsonify({"transcript": transcript})
-        else:
-            return jsonify({"transcript": f"Transcription failed: {response.status_code}"})
+        # Streamed from memory to Sarvam; long WAV recordings are split at pauses and sent concurrently
+        with span("transcribe"):
+            return jsonify(transcribe_upload(audio_file, SARVAM_STT_URL, SARVAM_API_KEY))
         
+    except TranscriptionError as e:
+        return jsonify({"transcript": f"Transcription failed: {e.status_code}"})
     except Exception as e:
         return jsonify({"transcript": f"Error: {str(e)}"})
-    finally:
-        if temp_file_path and os.path.exists(temp_file_path):
-            try:
-                os.unlink(temp_file_path)
-            except:
-                pass
+
+# Gets the query path ready while a voice query's audio is being transcribed
+prefetch_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="voice-prefetch")
+
+def prefetch_query_path() -> SalesStore | None:
+    """Load the data snapshot, its analysis (the plan cache and rule planner key) and the Bedrock client"""
+    data = anandhaas_snapshot.get()
+    if data is not None:
+        snapshot_analysis(data)
+    try:
+        aws_client("bedrock-runtime")
+    except Exception as e:
+        logger.warning("⚠️ Bedrock client not ready: %s", e)
+    return data
+
+@app.route("/api/voice-query", methods=["POST"])
+def voice_query():
+    """Transcribe a recording and answer it like /api/query, streaming each step as a server-sent event.
+
+    Events: transcript, plan, chart (the /api/query body), report (its id
+    and download link), then done; error ends the stream early.
+    """
+    if "audio" not in request.files:
+        return jsonify({"error": "No audio file"}), 400
+    if not SARVAM_API_KEY:
+        return jsonify({"error": "Please configure SARVAM_API_KEY in .env file"}), 503
+
+    audio_file = request.files["audio"]
+    # Data and clients load while Sarvam transcribes, so planning starts as soon as the transcript is in
+    # (in this request's context, so the load's stage timings count towards its breakdown)
+    prefetched = prefetch_pool.submit(contextvars.copy_context().run, prefetch_query_path)
+    session = report_session()
+    new_session = session is None
+    if new_session:
+        session = uuid.uuid4().hex
+
+    # Transcribed before the stream starts: uploaded files are closed with the request, not the stream
+    try:
+        with span("transcribe"):
+            heard, failure = transcribe_upload(audio_file, SARVAM_STT_URL, SARVAM_API_KEY), None
+    except TranscriptionError as e:
+        heard, failure = None, f"Transcription failed: {e.status_code}"
+    except Exception as e:
+        heard, failure = None, f"Error: {str(e)}"
+
+    def events():
+        if failure:
+            yield sse_event("error", {"error": failure})
+            return
+        try:
+            yield sse_event("transcript", heard)
+            query = heard["transcript"].strip()
+            if not query:
+                yield sse_event("error", {"error": "No speech recognized"})
+                return
+
+            data = prefetched.result()
+            if data is None:
+                yield sse_event("error", {"error": DATA_UNAVAILABLE})
+                return
+            ai_plan = get_ai_plan(query, snapshot_analysis(data))
+            yield sse_event("plan", ai_plan)
+
+            spec = cached_chart_series(data, ai_plan, "voice-query")
+            answer = query_payload(query, ai_plan, spec)
+            yield sse_event("chart", answer)
+
+            report_id = add_report(ai_plan, spec, answer["insights"], session)
+            yield sse_event("report", {"report_id": report_id, "pdf_url": f"/api/report/{report_id}.pdf"})
+            yield sse_event("done", {"timings": request_timings()})
+        except Exception as e:
+            logger.exception("Voice query failed")
+            yield sse_event("error", {"error": f"Server error: {str(e)}"})
+
+    response = event_stream(events())
+    if new_session:
+        response.set_cookie(REPORT_SESSION_COOKIE, session, httponly=True, samesite="Lax")
+    return response
 
 @app.route("/api/tts", methods=["POST"])
 def tts_api():
     return jsonify({"error": "TTS not available"}), 500
 
+@span("pdf")
 def generate_pdf_report(fig, title, insights):
+    from matplotlib.backends.backend_pdf import PdfPages
+    from matplotlib.figure import Figure
     with io.BytesIO() as pdf_buffer:
         with PdfPages(pdf_buffer) as pdf:
             pdf.savefig(fig, bbox_inches="tight", dpi=150)
-            fig_text, ax_text = plt.subplots(figsize=(6, 4))
+            fig_text = Figure(figsize=(6, 4))
+            ax_text = fig_text.subplots()
             ax_text.text(0.05, 0.95, title, fontsize=12, fontweight="bold", transform=ax_text.transAxes)
             ax_text.text(0.05, 0.85, "Key Insights:", fontsize=10, fontweight="bold", transform=ax_text.transAxes)
             insight_lines = insights.replace(". ", ".\n").split("\n")
@@ -733,78 +1012,124 @@ def generate_pdf_report(fig, title, insights):
                     y_pos -= 0.08
             ax_text.axis("off")
             pdf.savefig(fig_text, bbox_inches="tight", dpi=150)
-            plt.close(fig_text)
         pdf_buffer.seek(0)
         return pdf_buffer.read()
 
-def send_pdf_to_slack(pdf_bytes, filename, title, initial_comment):
-    """Send PDF to Slack - exact copy from working Streamlit version"""
-    token = SLACK_BOT_TOKEN
-    channel = SLACK_CHANNEL_ID
-    if not token or not channel:
-        return {"success": False, "message": "Slack not configured"}
+def pdf_bytes(fig, info: dict) -> bytes:
+    return generate_pdf_report(fig, info["title"], info["insights"])
+
+report_store = ReportStore(draw=draw_chart, exporters={"png": png_bytes, "pdf": pdf_bytes})
+
+REPORT_MIMETYPES = {"png": "image/png", "pdf": "application/pdf"}
+
+def report_session() -> str | None:
+    """The caller's session: an X-Session-Id header, else the cookie /api/query sets"""
+    return request.headers.get("X-Session-Id") or request.cookies.get(REPORT_SESSION_COOKIE)
+
+def requested_report_id() -> str | None:
+    """Report named in the request body or query string, else the caller's latest report"""
+    body = request.get_json(silent=True) or {}
+    return body.get("report_id") or request.args.get("report_id") or report_store.latest(report_session())
+
+@app.route("/api/report/<report_id>.<fmt>", methods=["GET"])
+def get_report(report_id, fmt):
+    """The report of an earlier /api/query as PDF (or its chart as PNG), generated on first request"""
+    if fmt not in REPORT_MIMETYPES:
+        return jsonify({"error": f"Unsupported format: {fmt}"}), 400
     try:
-        client = WebClient(token=token)
-        pdf_file = io.BytesIO(pdf_bytes)
-        pdf_file.seek(0)
-        response = client.files_upload_v2(
-            channel=channel,
-            file=pdf_file,
-            filename=filename,
-            title=title,
-            initial_comment=initial_comment
-        )
-        if response and response.get("ok"):
-            return {"success": True, "message": "Successfully sent to Slack"}
-        else:
-            error_msg = response.get("error", "Unknown error") if response else "Unknown error"
-            return {"success": False, "message": f"Failed to send to Slack: {error_msg}"}
-    except SlackApiError as e:
-        error_msg = str(e.response.get("error", str(e))) if hasattr(e, 'response') else str(e)
-        return {"success": False, "message": f"Slack API error: {error_msg}"}
+        with span(f"export_{fmt}"):
+            content = report_store.export(report_id, fmt)
     except Exception as e:
-        return {"success": False, "message": f"Error sending to Slack: {str(e)}"}
+        logger.error("Report generation error: %s", e)
+        return jsonify({"error": f"Report generation failed: {str(e)}"}), 500
+    if content is None:
+        return jsonify({"error": "Report not found or expired. Run the query again."}), 404
+    info = report_store.info(report_id) or {}
+    return send_file(io.BytesIO(content), mimetype=REPORT_MIMETYPES[fmt],
+                     download_name=info.get("filename", "report.pdf") if fmt == "pdf" else f"{report_id}.png")
+
+slack_delivery = SlackDelivery(SLACK_BOT_TOKEN)
 
 @app.route("/api/send-to-slack", methods=["POST", "GET"])
 def send_to_slack_api():
-    print("=== SLACK ENDPOINT CALLED ===")
+    """Queue the report for Slack and answer 202 at once; GET /api/slack-jobs/<job_id> follows the upload"""
     try:
-        global last_pdf_data
-        print(f"PDF available: {bool(last_pdf_data.get('data'))}")
-        print(f"PDF size: {len(last_pdf_data.get('data', b''))} bytes")
+        report_id = requested_report_id()
+        report = report_store.info(report_id) if report_id else None
         
-        if not last_pdf_data.get('data'):
+        if not report:
             return jsonify({"success": False, "message": "No PDF available. Generate a chart first."}), 400
+        if not SLACK_BOT_TOKEN or not SLACK_CHANNEL_ID:
+            return jsonify({"success": False, "message": "Slack not configured"}), 400
         
-        print("Calling send_pdf_to_slack...")
-        result = send_pdf_to_slack(
-            pdf_bytes=last_pdf_data['data'],
-            filename=last_pdf_data['filename'],
-            title=last_pdf_data['title'],
-            initial_comment=last_pdf_data['insights']
+        job_id = slack_delivery.submit(
+            {"default": SLACK_CHANNEL_ID},
+            lambda: report_store.export(report_id, "pdf"),
+            filename=report['filename'],
+            title=report['title'],
+            initial_comment=report['insights'],
         )
-        print(f"Slack result: {result}")
+        logger.info("Slack job %s queued", job_id)
         
-        return jsonify(result)
+        return jsonify({
+            "success": True,
+            "message": "Queued for Slack",
+            "job_id": job_id,
+            "status_url": f"/api/slack-jobs/{job_id}",
+        }), 202
         
     except Exception as e:
-        print(f"Slack endpoint error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Slack endpoint error")
         return jsonify({"success": False, "message": str(e)}), 500
 
+@app.route("/api/slack-jobs/<job_id>", methods=["GET"])
+def get_slack_job(job_id):
+    job = slack_delivery.status(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown Slack job"}), 404
+    return jsonify(job)
+
 @app.route("/api/last-pdf-info", methods=["GET"])
 def get_last_pdf_info():
-    """Get info about the last generated PDF like Streamlit session_state"""
-    global last_pdf_data
-    if last_pdf_data.get('data'):
+    """Get info about the caller's last generated PDF, or the one named by report_id"""
+    report_id = requested_report_id()
+    report = report_store.info(report_id) if report_id else None
+    if report:
         return jsonify({
             "available": True,
-            "filename": last_pdf_data['filename'],
-            "title": last_pdf_data['title']
+            "report_id": report_id,
+            "filename": report['filename'],
+            "title": report['title']
         })
     else:
         return jsonify({"available": False})
 
+def check_slack():
+    response = slack_client(SLACK_BOT_TOKEN).auth_test()
+    logger.info("Slack auth test successful: %s", response.get("ok"))
+
+def warm_data():
+    """Load the data and analyze it, so the first query finds both ready"""
+    data = anandhaas_snapshot.get()
+    if data is None:
+        raise RuntimeError(DATA_UNAVAILABLE)
+    snapshot_analysis(data)
+
+def warm_reports():
+    """Import what drawing and exporting a report needs, which the first export would otherwise wait for"""
+    from matplotlib.backends.backend_pdf import PdfPages
+    from matplotlib.figure import Figure
+
+# Start-up work, run in the background once the server is up; GET /api/ready reports it
+warmup_tasks = {"data": warm_data, "bedrock": lambda: aws_client("bedrock-runtime"), "reports": warm_reports}
+if SLACK_BOT_TOKEN:
+    # Without a token there is nothing to check, and the task would fail and be retried forever
+    warmup_tasks["slack"] = check_slack
+warmup = WarmUp(warmup_tasks, required=["data", "bedrock", "reports"])
+serve_readiness(app, warmup)
+
 if __name__ == "__main__":
+    # The reloader's serving process warms up at once; the process watching for changes never serves
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        warmup.start()
     app.run(debug=True, port=5000)
\ No newline at end of file
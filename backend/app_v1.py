@@ -1,42 +1,124 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, send_file
 from flask_cors import CORS
 import pandas as pd
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
 import json
-import boto3
 import io
 import os
-import requests
-import tempfile
-import base64
-from matplotlib.backends.backend_pdf import PdfPages
+import hashlib
+import uuid
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from slack_sdk import WebClient
-from slack_sdk.errors import SlackApiError
 import datetime
+from typing import TYPE_CHECKING
+import numpy as np
+from sales_store import SalesStore, to_day_number
+from sales_cube import COUNT_COLUMN, build_daily_cube, row_counts
+from row_filter import RowFilter
+from s3_loader import current_etags, list_parquet_keys, load_parquet_parts
+from data_refresh import DataSnapshot
+from shared_data import SharedSnapshot
+from plan_cache import PlanCache
+from result_cache import ResultCache
+from clients import aws_client, slack_client
+from rule_planner import RulePlanner
+from report_store import ReportStore, png_bytes
+from slack_delivery import SlackDelivery
+from transcription import InMemoryUploads, TranscriptionError, transcribe_upload
+from event_stream import event_stream, sse_event
+from metrics import instrument_app, request_timings, span
+from log import get_logger, lazy
+from warmup import WarmUp, serve_readiness
+
+# matplotlib is imported with the first chart drawn (or by the start-up warm-up), not with the app
+if TYPE_CHECKING:
+    from matplotlib.figure import Figure
 
 load_dotenv()
 
+logger = get_logger("app_v1")
+
 app = Flask(__name__)
-CORS(app)
+# Audio uploads stay in memory on their way to the STT service
+app.request_class = InMemoryUploads
+CORS(app, expose_headers=["Server-Timing"])
 
 BEDROCK_MODEL_ID = "amazon.nova-pro-v1:0"
 SARVAM_API_KEY = os.getenv("SARVAM_API_KEY")
-SARVAM_STT_URL = "https://api.sarvam.ai/speech-to-text"
+SARVAM_STT_URL = os.getenv("SARVAM_STT_URL", "https://api.sarvam.ai/speech-to-text")
 SARVAM_TTS_URL = "https://api.sarvam.ai/text-to-speech"
 SARVAM_TRANSLATE_URL = "https://api.sarvam.ai/translate"
 
+# Model plans for repeated questions are reused for PLAN_CACHE_TTL seconds (PLAN_CACHE_FILE keeps them across restarts)
+plan_cache = PlanCache(ttl=float(os.getenv("PLAN_CACHE_TTL", "86400")),
+                       max_entries=int(os.getenv("PLAN_CACHE_SIZE", "512")),
+                       path=os.getenv("PLAN_CACHE_FILE") or None)
+
+# Chart results per data snapshot, shared by questions that plan the same chart (RESULT_CACHE_BYTES bounds them)
+result_cache = ResultCache(fields={"chart_type": "bar", "x_axis": "Branch_Name", "y_axis": "Row_Total",
+                                   "y_axis_secondary": "Quantity_Inventory_UoM", "aggregation": "sum",
+                                   "aggregation_secondary": "sum", "dual_metrics": False, "comparison_type": "metric",
+                                   "month_filter": None, "limit": None, "filters": []})
+
+# Stage timings of each request in its Server-Timing header, and every process metric at GET /metrics
+instrument_app(app, caches={"plan": plan_cache, "result": result_cache})
+
+# Templated questions ("top 10 items in VV", "ecom vs online") are planned locally without the model
+rule_planner = RulePlanner(
+    dimensions=[
+        {"axis": "Branch_Name", "label": "Branch", "words": ["branch", "branches", "outlet", "outlets"],
+         "filter": "branch_filters", "values": "branches"},
+        {"axis": "SK_Section", "label": "Section", "words": ["section", "sections"],
+         "filter": "section_filters", "values": "sections"},
+        {"axis": "Item Group Name", "label": "Item Group", "words": ["item group", "item groups", "category", "categories"],
+         "filter": "item_group_filters", "values": "item_groups"},
+        {"axis": "Sales Group Name", "label": "Sales Group", "words": ["sales group", "sales groups", "channel", "channels"],
+         "filter": "sales_group_filters", "values": "sales_groups"},
+        {"axis": "Item_Service_Description", "label": "Item", "words": ["item", "items", "product", "products"]},
+    ],
+    measures={"revenue": "Row_Total", "quantity": "Quantity_Inventory_UoM", "count": "count"},
+    dual_comparisons=True,
+)
+
 # S3 Configuration - Multiple parquet files
 S3_BUCKET = "anandhaas-sweets"
 S3_KEYS = [
     "output/parquet/part-00000-38030c4c-a09f-4086-a3bf-eaf678a355a0-c000.snappy.parquet",  # July
     "output/parquet/part-00001-38030c4c-a09f-4086-a3bf-eaf678a355a0-c000.snappy.parquet"   # August
 ]
+# Local snapshot of the parquet parts, revalidated by ETag on every load (relative to this directory; empty disables it)
+S3_CACHE_DIR = os.getenv("S3_CACHE_DIR", "s3_cache")
+if S3_CACHE_DIR:
+    S3_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), S3_CACHE_DIR)
+S3_MAX_WORKERS = int(os.getenv("S3_MAX_WORKERS", "8"))
+# When set, every parquet part under this prefix is loaded instead of S3_KEYS, so new parts are picked up on refresh
+S3_PREFIX = os.getenv("S3_PREFIX", "")
+# Poll S3 for new parts every N seconds (0 disables polling; POST /api/admin/refresh still works)
+DATA_REFRESH_SECONDS = float(os.getenv("DATA_REFRESH_SECONDS", "0"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+# Directory (e.g. /dev/shm/anandhaas) where the data is published once for every server process to map; empty gives each process its own copy
+SHARED_DATA_DIR = os.getenv("SHARED_DATA_DIR", "")
 
-anandhaas_data = None
-last_pdf_data = {"data": None, "title": "", "insights": "", "filename": ""}
+# Columns held as categorical codes / float32 arrays in the sales store
+DIMENSION_COLUMNS = ["Branch_Name", "SK_Section", "Item_Service_Description", "Item Group Name", "Sales Group Name", "Inventory_UoM"]
+MEASURE_COLUMNS = ["Row_Total", "Quantity_Inventory_UoM"]
+# Text filter columns with an inverted index built at load time
+INDEX_COLUMNS = ["Branch_Name", "SK_Section", "Item_Service_Description", "Item Group Name", "Sales Group Name"]
+# Keys of the pre-aggregated (dimensions x day) cube
+CUBE_DIMENSIONS = ["Branch_Name", "SK_Section", "Item Group Name", "Sales Group Name", "Item_Service_Description"]
+# Only these columns are read from the parquet parts, the dimensions dictionary-encoded
+PARQUET_READ = {"columns": ["Date"] + DIMENSION_COLUMNS + MEASURE_COLUMNS, "dictionary_columns": DIMENSION_COLUMNS,
+                "date_column": "Date"}
+# Only load sales from DATA_START_DATE up to and including DATA_END_DATE (empty: no bound); row groups outside are not read
+if os.getenv("DATA_START_DATE"):
+    PARQUET_READ["start"] = pd.Timestamp(os.getenv("DATA_START_DATE"))
+if os.getenv("DATA_END_DATE"):
+    PARQUET_READ["end"] = pd.Timestamp(os.getenv("DATA_END_DATE")) + pd.Timedelta(days=1)
+
+# Cookie naming the caller's session, for /api/send-to-slack and /api/last-pdf-info without a report_id
+REPORT_SESSION_COOKIE = "report_session"
+
+DATA_UNAVAILABLE = "Data not available from S3"
 
 # Slack configuration
 SLACK_BOT_TOKEN = os.getenv("SLACK_BOT_TOKEN")
@@ -45,116 +127,173 @@ SLACK_CHANNELS = {
     "test_channel_2": "C0A6JK35E20"
 }
 
-print(f"DEBUG: SLACK_BOT_TOKEN loaded: {SLACK_BOT_TOKEN[:20] if SLACK_BOT_TOKEN else 'None'}...")
-print(f"DEBUG: SLACK_CHANNELS loaded: {SLACK_CHANNELS}")
+logger.debug("Slack bot token %s, channels %s", "set" if SLACK_BOT_TOKEN else "missing", SLACK_CHANNELS)
+
+def build_sales_store(combined_df: pd.DataFrame) -> SalesStore:
+    """Convert parquet rows into a SalesStore with its daily cube"""
+    # Use exact column names from S3 data - NO MAPPING, NO DROPPING of rows
+    # Only convert data types for processing
+    combined_df["Date"] = pd.to_datetime(combined_df["Date"], errors="coerce")
+    combined_df["Row_Total"] = pd.to_numeric(combined_df["Row_Total"], errors="coerce")
+    combined_df["Quantity_Inventory_UoM"] = pd.to_numeric(combined_df["Quantity_Inventory_UoM"], errors="coerce").fillna(1)
 
-try:
-    test_client = WebClient(token=SLACK_BOT_TOKEN)
-    test_response = test_client.auth_test()
-    print(f"DEBUG: Slack auth test successful: {test_response.get('ok')}")
-except Exception as e:
-    print(f"DEBUG: Slack auth test failed: {e}")
+    logger.info("Final combined dataset: %d records (no rows dropped)", len(combined_df))
+    logger.debug("Date range: %s to %s, branches: %s, sample items: %s",
+                 lazy(combined_df["Date"].min), lazy(combined_df["Date"].max),
+                 lazy(lambda: combined_df["Branch_Name"].unique()[:5]),
+                 lazy(lambda: combined_df["Item_Service_Description"].unique()[:5]))
 
-def load_anandhaas_data() -> pd.DataFrame | None:
+    logger.debug("DataFrame memory: %s MB", lazy(lambda: round(combined_df.memory_usage(index=False, deep=True).sum() / 1e6, 1)))
+    store = SalesStore.from_frame(combined_df, dimensions=DIMENSION_COLUMNS, measures=MEASURE_COLUMNS,
+                                  index_columns=INDEX_COLUMNS)
+    logger.info("Sales store memory: %.1f MB", store.memory_usage() / 1e6)
+    store.cube = build_daily_cube(store, CUBE_DIMENSIONS)
+    logger.info("Daily cube: %d cells (%.1f MB)", len(store.cube), store.cube.memory_usage() / 1e6)
+    return store
+
+def s3_part_keys(s3_client) -> list:
+    """Parquet parts to load: everything under S3_PREFIX when set, else the fixed S3_KEYS"""
+    if S3_PREFIX:
+        return list_parquet_keys(s3_client, S3_BUCKET, S3_PREFIX)
+    return S3_KEYS
+
+@span("load")
+def load_anandhaas_data() -> SalesStore | None:
     """Load data from S3 parquet files - combine July and August"""
     try:
-        s3_client = boto3.client('s3', region_name='us-east-1')
-        
-        combined_df = None
+        s3_client = aws_client("s3")
         
-        # Load each parquet file and combine
-        for i, s3_key in enumerate(S3_KEYS):
-            try:
-                print(f"📊 Loading file {i+1}/{len(S3_KEYS)}: {s3_key}")
-                response = s3_client.get_object(Bucket=S3_BUCKET, Key=s3_key)
-                parquet_data = response['Body'].read()
-                
-                # Read parquet data
-                df = pd.read_parquet(io.BytesIO(parquet_data))
-                print(f"   Loaded {len(df)} records")
-                
-                # Combine with previous data
-                if combined_df is None:
-                    combined_df = df
-                else:
-                    combined_df = pd.concat([combined_df, df], ignore_index=True)
-                    
-            except Exception as e:
-                print(f"⚠️ Failed to load {s3_key}: {e}")
-                continue
+        # Parts are fetched concurrently; unchanged parts come from the local snapshot
+        combined_df, etags = load_parquet_parts(s3_client, S3_BUCKET, s3_part_keys(s3_client),
+                                                cache_dir=S3_CACHE_DIR, max_workers=S3_MAX_WORKERS,
+                                                read_options=PARQUET_READ)
         
         if combined_df is None or combined_df.empty:
-            print(f"❌ No data loaded from any S3 files")
+            logger.error("❌ No data loaded from any S3 files")
             return None
             
-        print(f"📊 Combined S3 data loaded: {len(combined_df)} records")
-        print(f"Available columns: {list(combined_df.columns)}")
-        
-        # Use exact column names from S3 data - NO MAPPING, NO DROPPING
-        # Only convert data types for processing
-        combined_df["Date"] = pd.to_datetime(combined_df["Date"], errors="coerce")
-        combined_df["Row_Total"] = pd.to_numeric(combined_df["Row_Total"], errors="coerce")
-        combined_df["Quantity_Inventory_UoM"] = pd.to_numeric(combined_df["Quantity_Inventory_UoM"], errors="coerce").fillna(1)
-        
-        print(f"Final combined dataset: {len(combined_df)} records (no rows dropped)")
-        print(f"Date range: {combined_df['Date'].min()} to {combined_df['Date'].max()}")
-        print(f"Branches: {combined_df['Branch_Name'].unique()[:5]}")
-        print(f"Sample items: {combined_df['Item_Service_Description'].unique()[:5]}")
-        
-        return combined_df
+        logger.info("📊 Combined S3 data loaded: %d records", len(combined_df))
+        logger.debug("Available columns: %s", list(combined_df.columns))
+
+        store = build_sales_store(combined_df)
+        store.sources = etags
+        return store
         
     except Exception as e:
-        print(f"❌ Cannot load data from S3: {e}")
+        logger.error("❌ Cannot load data from S3: %s", e)
         return None
 
+@span("refresh")
+def refresh_anandhaas_data(store: SalesStore) -> SalesStore:
+    """Bring store up to date with S3.
+
+    New parts are loaded on their own and appended to the current store. A
+    part that changed or disappeared forces a full reload, since its old rows
+    cannot be told apart from the rest. When the parts cannot be checked, or
+    the reload misses any of them, the current store is kept.
+    """
+    s3_client = aws_client("s3")
+    keys = s3_part_keys(s3_client)
+    try:
+        etags = current_etags(s3_client, S3_BUCKET, keys, max_workers=S3_MAX_WORKERS)
+    except Exception as e:
+        logger.warning("⚠️ Cannot check S3 parts (%s), keeping current data", e)
+        return store
+    if not etags:
+        logger.warning("⚠️ No S3 parts found, keeping current data")
+        return store
+
+    changed = [key for key, etag in store.sources.items() if etags.get(key) != etag]
+    if changed:
+        logger.info("🔄 %d S3 part(s) changed, reloading all data", len(changed))
+        reloaded = load_anandhaas_data()
+        missing = [key for key in etags if reloaded is None or key not in reloaded.sources]
+        if missing:
+            logger.warning("⚠️ Reload missed %d S3 part(s) (%s), keeping current data",
+                           len(missing), ", ".join(missing[:3]))
+            return store
+        return reloaded
 
+    new_keys = [key for key in keys if key in etags and key not in store.sources]
+    if not new_keys:
+        return store
 
+    logger.info("🔄 Loading %d new S3 part(s)", len(new_keys))
+    delta_df, delta_etags = load_parquet_parts(s3_client, S3_BUCKET, new_keys,
+                                               cache_dir=S3_CACHE_DIR, max_workers=S3_MAX_WORKERS,
+                                               read_options=PARQUET_READ)
+    if delta_df is None or delta_df.empty:
+        return store
+    delta = build_sales_store(delta_df)
+    delta.sources = delta_etags
+    return store.append(delta)
 
+if SHARED_DATA_DIR:
+    anandhaas_snapshot = SharedSnapshot(load_anandhaas_data, refresh_anandhaas_data, SHARED_DATA_DIR,
+                                        interval=DATA_REFRESH_SECONDS)
+else:
+    anandhaas_snapshot = DataSnapshot(load_anandhaas_data, refresh_anandhaas_data, interval=DATA_REFRESH_SECONDS)
 
-def analyze_anandhaas_structure(data: pd.DataFrame) -> dict:
+
+
+
+@span("analysis")
+def analyze_anandhaas_structure(data: SalesStore) -> dict:
     if data is None or data.empty:
         return {}
     
-    clean_branches = [b for b in data["Branch_Name"].dropna().unique()]
-    clean_items = [i for i in data["Item_Service_Description"].dropna().unique()]
+    clean_branches = data.distinct("Branch_Name")
+    clean_items = data.distinct("Item_Service_Description")
+    start, end = data.date_range()
     
     analysis = {
         "total_records": len(data),
         "branches": clean_branches,
         "items": clean_items[:50],
         "date_range": {
-            "start": data["Date"].min(),
-            "end": data["Date"].max(),
-        },
-        "revenue_stats": {
-            "total": float(data["Row_Total"].sum()),
-            "avg": float(data["Row_Total"].mean()),
-            "max": float(data["Row_Total"].max()),
-            "min": float(data["Row_Total"].min()),
+            "start": start,
+            "end": end,
         },
+        "revenue_stats": data.measure_stats("Row_Total"),
     }
     
     # Add section and item group info
     if "SK_Section" in data.columns:
-        analysis["sections"] = list(data["SK_Section"].unique())
+        analysis["sections"] = data.distinct("SK_Section")
     if "Item Group Name" in data.columns:
-        analysis["item_groups"] = list(data["Item Group Name"].unique())
+        analysis["item_groups"] = data.distinct("Item Group Name")
     if "Sales Group Name" in data.columns:
-        analysis["sales_groups"] = list(data["Sales Group Name"].unique())
+        analysis["sales_groups"] = data.distinct("Sales Group Name")
     
     return analysis
 
-def get_ai_plan(query: str, data_analysis: dict) -> dict:
+def snapshot_analysis(data: SalesStore) -> dict:
+    """analyze_anandhaas_structure, computed once per data snapshot (treat as read-only)"""
+    return data.derived("analysis", lambda: analyze_anandhaas_structure(data))
+
+def dashboard_payload(data: SalesStore) -> tuple:
+    """JSON body and ETag of /api/dashboard-data for one data snapshot"""
+    analysis = dict(snapshot_analysis(data))
+    if analysis.get("date_range"):
+        analysis["date_range"] = {key: value.isoformat() for key, value in analysis["date_range"].items()}
+    body = app.json.dumps(analysis)
+    return body, hashlib.sha1(body.encode()).hexdigest()
+
+def plan_context(data_analysis: dict) -> dict:
+    """The data lists the model prompt is built from; with the query they make up the plan cache key"""
+    return {"branches": data_analysis.get("branches", [])[:20], "sections": data_analysis.get("sections", [])[:20],
+            "sales_groups": data_analysis.get("sales_groups", []),
+            "item_groups": data_analysis.get("item_groups", [])[:20], "items": data_analysis.get("items", [])[:30]}
+
+def bedrock_request(query: str, data_analysis: dict) -> str:
+    """invoke_model body asking the model for a visualization plan of query"""
     branches = data_analysis.get("branches", [])
     items = data_analysis.get("items", [])
     sections = data_analysis.get("sections", [])
     item_groups = data_analysis.get("item_groups", [])
     sales_groups = data_analysis.get("sales_groups", [])
 
-    try:
-        bedrock = boto3.client("bedrock-runtime", region_name="us-east-1")
-
-        prompt = f"""
+    prompt = f"""
 Analyze this business query about sweets sales and create a visualization plan.
 
 Query: "{query}"
@@ -261,163 +400,183 @@ CRITICAL RULES:
 - Match user terms intelligently to available data
 - IMPORTANT: When no year is specified in dates, assume 2024
 """
+    return json.dumps({
+        "messages": [{"role": "user", "content": [{"text": prompt}]}],
+        "inferenceConfig": {"temperature": 0.1},
+    })
 
-        body = json.dumps({
-            "messages": [{"role": "user", "content": [{"text": prompt}]}],
-            "inferenceConfig": {"temperature": 0.1},
-        })
-        response = bedrock.invoke_model(modelId=BEDROCK_MODEL_ID, body=body)
-        raw = response["body"].read()
-        result = json.loads(raw)
-        ai_text = result["output"]["message"]["content"][0]["text"].strip()
-
-        # Debug: Show what AI returned
-        print(f"DEBUG: AI Response: {ai_text}")
-
-        if "{" in ai_text and "}" in ai_text:
-            start = ai_text.find("{")
-            end = ai_text.rfind("}") + 1
-            json_str = ai_text[start:end]
-            plan = json.loads(json_str)
+def parse_model_plan(raw: bytes) -> dict:
+    """The plan JSON in an invoke_model response body"""
+    result = json.loads(raw)
+    ai_text = result["output"]["message"]["content"][0]["text"].strip()
+    logger.debug("AI response: %s", ai_text)
+
+    if "{" in ai_text and "}" in ai_text:
+        start = ai_text.find("{")
+        end = ai_text.rfind("}") + 1
+        json_str = ai_text[start:end]
+        return json.loads(json_str)
+    raise ValueError("Model did not return JSON")
+
+def local_plan(query: str, data_analysis: dict, context: dict) -> tuple:
+    """(plan, planner) from the rule planner or the plan cache; plan is None when the model is needed"""
+    # Plainly templated questions are planned locally, repeated ones come from the cache
+    plan = rule_planner.plan(query, data_analysis)
+    if plan is not None:
+        return plan, "rules"
+    return plan_cache.get(query, context), "cache"
+
+def finish_plan(query: str, plan: dict, planner: str) -> dict:
+    """Fill in the plan defaults and compile its filters"""
+
+    # Set minimal defaults
+    plan.setdefault("chart_type", "bar")
+    plan.setdefault("x_axis", "Branch_Name")
+    plan.setdefault("y_axis", "Row_Total")
+    plan.setdefault("aggregation", "sum")
+    plan.setdefault("title", "Sweets Sales Analysis")
+    plan.setdefault("dual_metrics", False)
+    plan.setdefault("limit", None)
+
+    # Build filters dynamically like restaurant dashboard
+    filters = []
+
+    if plan.get("branch_filters"):
+        if len(plan["branch_filters"]) == 1:
+            filters.append(("Branch_Name", plan["branch_filters"][0]))
         else:
-            raise ValueError("Model did not return JSON")
-
-        # Set minimal defaults
-        plan.setdefault("chart_type", "bar")
-        plan.setdefault("x_axis", "Branch_Name")
-        plan.setdefault("y_axis", "Row_Total")
-        plan.setdefault("aggregation", "sum")
-        plan.setdefault("title", "Sweets Sales Analysis")
-        plan.setdefault("dual_metrics", False)
-        plan.setdefault("limit", None)
-
-        # Build filters dynamically like restaurant dashboard
-        filters = []
-
-        if plan.get("branch_filters"):
-            if len(plan["branch_filters"]) == 1:
-                filters.append(("Branch_Name", plan["branch_filters"][0]))
-            else:
-                filters.append(("Branch_in", plan["branch_filters"]))
+            filters.append(("Branch_in", plan["branch_filters"]))
 
-        if plan.get("section_filters"):
-            if len(plan["section_filters"]) == 1:
-                filters.append(("SK_Section", plan["section_filters"][0]))
-            else:
-                filters.append(("Section_in", plan["section_filters"]))
+    if plan.get("section_filters"):
+        if len(plan["section_filters"]) == 1:
+            filters.append(("SK_Section", plan["section_filters"][0]))
+        else:
+            filters.append(("Section_in", plan["section_filters"]))
 
-        if plan.get("item_filters"):
-            if len(plan["item_filters"]) == 1:
-                filters.append(("Item_Service_Description", plan["item_filters"][0]))
-            else:
-                filters.append(("Item_in", plan["item_filters"]))
+    if plan.get("item_filters"):
+        if len(plan["item_filters"]) == 1:
+            filters.append(("Item_Service_Description", plan["item_filters"][0]))
+        else:
+            filters.append(("Item_in", plan["item_filters"]))
 
-        if plan.get("item_group_filters"):
-            if len(plan["item_group_filters"]) == 1:
-                filters.append(("Item Group Name", plan["item_group_filters"][0]))
-            else:
-                filters.append(("Item_Group_in", plan["item_group_filters"]))
+    if plan.get("item_group_filters"):
+        if len(plan["item_group_filters"]) == 1:
+            filters.append(("Item Group Name", plan["item_group_filters"][0]))
+        else:
+            filters.append(("Item_Group_in", plan["item_group_filters"]))
 
-        if plan.get("sales_group_filters"):
-            if len(plan["sales_group_filters"]) == 1:
-                filters.append(("Sales Group Name", plan["sales_group_filters"][0]))
-            else:
-                filters.append(("Sales_Group_in", plan["sales_group_filters"]))
+    if plan.get("sales_group_filters"):
+        if len(plan["sales_group_filters"]) == 1:
+            filters.append(("Sales Group Name", plan["sales_group_filters"][0]))
+        else:
+            filters.append(("Sales_Group_in", plan["sales_group_filters"]))
 
-        if plan.get("month_filter"):
-            month_val = plan["month_filter"]
-            if isinstance(month_val, list):
-                filters.append(("date_month_in", month_val))
-            else:
-                filters.append(("date_month", month_val))
+    if plan.get("month_filter"):
+        month_val = plan["month_filter"]
+        if isinstance(month_val, list):
+            filters.append(("date_month_in", month_val))
+        else:
+            filters.append(("date_month", month_val))
 
-        if plan.get("date_filter"):
-            date_val = plan["date_filter"]
-            if isinstance(date_val, list) and len(date_val) == 2:
-                filters.append(("date_range", date_val))
-            else:
-                filters.append(("date_specific", date_val))
+    if plan.get("date_filter"):
+        date_val = plan["date_filter"]
+        if isinstance(date_val, list) and len(date_val) == 2:
+            filters.append(("date_range", date_val))
+        else:
+            filters.append(("date_specific", date_val))
 
-        if plan.get("year_filter"):
-            year_val = plan["year_filter"]
-            if isinstance(year_val, list):
-                filters.append(("date_year_in", year_val))
-            else:
-                filters.append(("date_year", year_val))
+    if plan.get("year_filter"):
+        year_val = plan["year_filter"]
+        if isinstance(year_val, list):
+            filters.append(("date_year_in", year_val))
+        else:
+            filters.append(("date_year", year_val))
 
-        plan["filters"] = filters
-        
-        print(f"\n=== DYNAMIC AI PLAN ===")
-        print(f"Query: {query}")
-        print(f"AI Generated Plan: {plan}")
-        print(f"Extracted Filters: {plan.get('filters', [])}")
-        print(f"LIMIT EXTRACTED: {plan.get('limit')}")
-        print(f"========================\n")
-        return plan
+    plan["filters"] = filters
+    plan["planner"] = planner
+
+    logger.debug("Plan from %s for %r: %s", planner, query, plan)
+    return plan
+
+@span("plan")
+def get_ai_plan(query: str, data_analysis: dict, bedrock=None) -> dict:
+    context = plan_context(data_analysis)
+    try:
+        plan, planner = local_plan(query, data_analysis, context)
+        if plan is None:
+            planner = "bedrock"
+            if bedrock is None:
+                bedrock = aws_client("bedrock-runtime")
+            with span("bedrock"):
+                response = bedrock.invoke_model(modelId=BEDROCK_MODEL_ID, body=bedrock_request(query, data_analysis))
+            plan = parse_model_plan(response["body"].read())
+            plan_cache.put(query, context, plan)
+        return finish_plan(query, plan, planner)
 
     except Exception as e:
-        print(f"AI model failed to process query: {str(e)}")
+        logger.error("AI model failed to process query: %s", e)
         raise
 
-def apply_dynamic_filters(data: pd.DataFrame, filters: list) -> pd.DataFrame:
-    """Apply filters dynamically like restaurant dashboard"""
-    filtered_data = data.copy()
-    
+async def get_ai_plan_async(query: str, data_analysis: dict, bedrock) -> dict:
+    """get_ai_plan for the ASGI server, calling the model on a non-blocking AsyncBedrock client"""
+    context = plan_context(data_analysis)
+    try:
+        with span("plan"):
+            plan, planner = local_plan(query, data_analysis, context)
+            if plan is None:
+                planner = "bedrock"
+                with span("bedrock"):
+                    raw = await bedrock.invoke_model(BEDROCK_MODEL_ID, bedrock_request(query, data_analysis))
+                plan = parse_model_plan(raw)
+                plan_cache.put(query, context, plan)
+            return finish_plan(query, plan, planner)
+
+    except Exception as e:
+        logger.error("AI model failed to process query: %s", e)
+        raise
+
+@span("filter")
+def apply_dynamic_filters(data: SalesStore, filters: list) -> np.ndarray:
+    """Compile the plan filters into one row mask and return the matching row positions"""
+    selection = RowFilter(data)
+
     for filter_type, filter_value in filters:
         if filter_type == "date_month":
-            filtered_data = filtered_data[filtered_data["Date"].dt.month == int(filter_value)]
+            selection.keep_months([int(filter_value)])
         elif filter_type == "date_month_in":
-            month_list = [int(m) for m in filter_value]
-            filtered_data = filtered_data[filtered_data["Date"].dt.month.isin(month_list)]
+            selection.keep_months([int(m) for m in filter_value])
         elif filter_type == "date_specific":
             try:
                 if len(filter_value.split('-')) == 2:
                     current_year = 2024  # Assume 2024 for sweets data
                     filter_value = f"{current_year}-{filter_value}"
                 target_date = pd.to_datetime(filter_value).date()
-                filtered_data = filtered_data[filtered_data["Date"].dt.date == target_date]
-                print(f"DEBUG: Date filter '{target_date}' resulted in {len(filtered_data)} records")
+                selection.keep_day_range(to_day_number(target_date), to_day_number(target_date))
+                logger.debug("Date filter '%s'", target_date)
             except Exception as e:
-                print(f"DEBUG: Date parsing error for '{filter_value}': {e}")
+                logger.debug("Date parsing error for '%s': %s", filter_value, e)
                 continue
         elif filter_type == "date_range":
-            start_date = pd.to_datetime(filter_value[0])
-            end_date = pd.to_datetime(filter_value[1])
-            filtered_data = filtered_data[(filtered_data["Date"] >= start_date) & (filtered_data["Date"] <= end_date)]
+            start_day = to_day_number(pd.to_datetime(filter_value[0]).ceil("D"))
+            end_day = to_day_number(pd.to_datetime(filter_value[1]).floor("D"))
+            selection.keep_day_range(start_day, end_day)
         elif filter_type == "date_year":
-            filtered_data = filtered_data[filtered_data["Date"].dt.year == int(filter_value)]
+            selection.keep_years([int(filter_value)])
         elif filter_type == "date_year_in":
-            year_list = [int(y) for y in filter_value]
-            filtered_data = filtered_data[filtered_data["Date"].dt.year.isin(year_list)]
+            selection.keep_years([int(y) for y in filter_value])
         elif filter_type in ["Branch_Name", "SK_Section", "Item_Service_Description", "Item Group Name", "Sales Group Name"]:
             filter_value_str = str(filter_value).lower().strip()
             
             # For Item_Service_Description, always use contains matching to find variations
             if filter_type == "Item_Service_Description":
-                # Use contains matching for group searches
-                mask = filtered_data[filter_type].astype(str).str.contains(filter_value_str, case=False, na=False)
-                filtered_data = filtered_data[mask]
-                
-                # Debug: Show what items were matched
-                if not filtered_data.empty:
-                    matched_items = filtered_data[filter_type].astype(str).unique()
-                    print(f"DEBUG: Items matched for '{filter_value_str}': {sorted(matched_items)}")
-                    total_revenue = filtered_data['Row_Total'].sum()
-                    print(f"DEBUG: Total revenue: ₹{total_revenue:,.2f}")
-                
-                print(f"DEBUG: Filter '{filter_type}={filter_value}' resulted in {len(filtered_data)} records")
+                codes = data.contains_codes(filter_type, [filter_value_str])
+                selection.keep_codes(filter_type, codes)
+                logger.debug("Items matched for '%s': %s", filter_value_str,
+                             lazy(lambda: sorted(data.frame[filter_type].cat.categories[codes])))
             else:
-                # For other columns, try exact match first
-                exact_match = filtered_data[filtered_data[filter_type].astype(str).str.lower().str.strip() == filter_value_str]
-                
-                if not exact_match.empty:
-                    filtered_data = exact_match
-                    print(f"DEBUG: Found exact match for '{filter_value_str}': {len(exact_match)} records")
-                else:
-                    # Use contains matching for partial searches
-                    mask = filtered_data[filter_type].astype(str).str.contains(filter_value_str, case=False, na=False)
-                    filtered_data = filtered_data[mask]
-                    print(f"DEBUG: Filter '{filter_type}={filter_value}' resulted in {len(filtered_data)} records")
+                # For other columns, exact match first, else contains matching for partial searches
+                selection.keep_codes_or(filter_type, data.equal_codes(filter_type, filter_value_str, strip=True),
+                                        data.contains_codes(filter_type, [filter_value_str]))
         elif filter_type in ["Branch_in", "Section_in", "Item_in", "Item_Group_in", "Sales_Group_in"]:
             col_map = {
                 "Branch_in": "Branch_Name",
@@ -427,57 +586,75 @@ def apply_dynamic_filters(data: pd.DataFrame, filters: list) -> pd.DataFrame:
                 "Sales_Group_in": "Sales Group Name",
             }
             col = col_map[filter_type]
-            if col in filtered_data.columns:
+            if col in data.columns:
                 # For Item_in, use contains matching to find all variations
                 if filter_type == "Item_in":
-                    all_matches = pd.DataFrame()
-                    for search_term in filter_value:
-                        search_term_lower = str(search_term).lower().strip()
-                        # Use contains matching to find all variations
-                        mask = filtered_data[col].astype(str).str.contains(search_term_lower, case=False, na=False)
-                        matches = filtered_data[mask]
-                        all_matches = pd.concat([all_matches, matches], ignore_index=True)
-                        
-                        if not matches.empty:
-                            matched_items = matches[col].astype(str).unique()
-                            print(f"DEBUG: Found items for '{search_term}': {sorted(matched_items)}")
-                    
-                    filtered_data = all_matches.drop_duplicates()
-                    print(f"DEBUG: Total items after Item_in filter: {len(filtered_data)} records")
+                    # All terms matched in one pass over the distinct item names
+                    codes = data.contains_any_codes(col, [str(term).lower().strip() for term in filter_value])
+                    selection.keep_codes(col, codes)
+                    logger.debug("Found items for %s: %s", filter_value,
+                                 lazy(lambda: sorted(data.frame[col].cat.categories[codes])))
                 else:
                     # For other filters, use exact match
-                    values = [str(v) for v in filter_value]
-                    clean_data = filtered_data.dropna(subset=[col])
-                    filtered_data = clean_data[clean_data[col].astype(str).isin(values)]
+                    selection.keep_codes(col, data.isin_codes(col, filter_value))
     
-    if filtered_data.empty:
-        print(f"DEBUG: Applied filters: {filters}")
-        print(f"DEBUG: Original data shape: {data.shape}")
-        raise ValueError(f"No data found after applying filters. Check filter values against available data.")
+    rows = selection.rows()
+    logger.debug("Filters %s matched %d of %d records", filters, len(rows), len(data))
+    if len(rows) == 0:
+        raise ValueError("No data found after applying filters. Check filter values against available data.")
     
-    return filtered_data
+    return rows
 
-def create_anandhaas_visualization(data: pd.DataFrame, ai_plan: dict):
+def cube_answers(ai_plan: dict) -> bool:
+    """True when a plan only needs the daily cube's sums and row counts"""
+    if ai_plan.get("dual_metrics", False) or ai_plan.get("y_axis") == "dual":
+        return False
+    if ai_plan.get("x_axis", "Branch_Name") not in CUBE_DIMENSIONS + ["Month", "Date"]:
+        return False
+    y_col = ai_plan.get("y_axis", "Row_Total")
+    if y_col == "count":
+        return True
+    if ai_plan.get("aggregation", "sum") != "sum":
+        return False
+    # Quantity bar labels need the most common Inventory_UoM, which the cube does not keep
+    return y_col == "Row_Total" or (y_col == "Quantity_Inventory_UoM" and ai_plan.get("chart_type") in ["pie", "line"])
+
+def most_common_uom(frame: pd.DataFrame | None) -> str:
+    """Most frequent Inventory_UoM among the rows, for quantity labels"""
+    if frame is None or frame.empty or "Inventory_UoM" not in frame.columns:
+        return "Units"
+    mode = frame["Inventory_UoM"].mode()
+    return mode.iloc[0] if not mode.empty else "Units"
+
+@span("aggregate")
+def chart_series(data: SalesStore, ai_plan: dict) -> dict:
+    """Compute what a plan's chart shows: the chart_data JSON and the series draw_chart plots"""
     dual_metrics = ai_plan.get("dual_metrics", False) or ai_plan.get("y_axis") == "dual"
     comparison_type = ai_plan.get("comparison_type", "metric")
-    
-    if dual_metrics:
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(24, 10))
-    else:
-        fig, ax = plt.subplots(figsize=(20, 12))
-    
-    # Apply AI-driven dynamic filters
-    filtered_data = apply_dynamic_filters(data, ai_plan.get("filters", []))
 
-    if filtered_data is None or filtered_data.empty:
-        raise ValueError("No data found after applying filters.")
+    # Answer from the pre-aggregated cube when possible, else from raw rows
+    use_cube = data.cube is not None and cube_answers(ai_plan)
+    source = data.cube if use_cube else data
+    logger.debug("Answering from %s", "daily cube" if use_cube else "raw rows")
 
+    # Apply AI-driven dynamic filters
+    rows = apply_dynamic_filters(source, ai_plan.get("filters", []))
     x_col = ai_plan.get("x_axis", "Branch_Name")
+
+    # Cube cells grouped by a dimension are summed straight from category codes;
+    # everything else materializes only the matching rows
+    direct = use_cube and x_col in CUBE_DIMENSIONS
+    filtered_data = None if direct else source.take(rows)
+
+    if len(rows) == 0:
+        raise ValueError("No data found after applying filters.")
     
     if x_col == "Month":
         filtered_data = filtered_data.copy()
         filtered_data["Month"] = filtered_data["Date"].dt.strftime("%B %Y")
         filtered_data["MonthSort"] = filtered_data["Date"].dt.to_period("M")
+
+    spec = {"x_col": x_col, "dual_metrics": dual_metrics, "title": ai_plan.get("title", "Anandhaas Analysis")}
     
     if dual_metrics:
         x_col = ai_plan.get("x_axis", "Branch_Name")
@@ -495,9 +672,9 @@ def create_anandhaas_visualization(data: pd.DataFrame, ai_plan: dict):
             
             # Get top items first
             if y_col_1 == "count":
-                top_items = filtered_data.groupby(x_col).size().sort_values(ascending=False)
+                top_items = filtered_data.groupby(x_col, observed=True).size().sort_values(ascending=False)
             else:
-                top_items = filtered_data.groupby(x_col)[y_col_1].agg(agg_1).sort_values(ascending=False)
+                top_items = filtered_data.groupby(x_col, observed=True)[y_col_1].agg(agg_1).sort_values(ascending=False)
             
             if limit and isinstance(limit, int) and limit > 0:
                 top_items = top_items.head(limit)
@@ -509,57 +686,23 @@ def create_anandhaas_visualization(data: pd.DataFrame, ai_plan: dict):
             for month in month_list:
                 month_data = filtered_data[filtered_data["Date"].dt.month == month]
                 if y_col_1 == "count":
-                    month_metric = month_data.groupby(x_col).size()
+                    month_metric = month_data.groupby(x_col, observed=True).size()
                 else:
-                    month_metric = month_data.groupby(x_col)[y_col_1].agg(agg_1)
+                    month_metric = month_data.groupby(x_col, observed=True)[y_col_1].agg(agg_1)
                 metric1_data[month_names.get(month, f"Month {month}")] = month_metric.reindex(top_items.index, fill_value=0)
             
-            # Create side-by-side bars
             items = list(top_items.index)
-            x_pos = range(len(items))
-            width = 0.35
             months = list(metric1_data.keys())
-            colors = ['#1e40af', '#059669', '#d97706', '#dc2626']
-            
-            for i, month in enumerate(months):
-                values = [metric1_data[month].get(item, 0) for item in items]
-                bars = ax1.bar([x + width*i for x in x_pos], values, width, 
-                              label=month, color=colors[i % len(colors)], alpha=0.95, edgecolor='white', linewidth=1.5)
-                
-                for bar in bars:
-                    height = bar.get_height()
-                    label = f'₹{height:,.0f}' if y_col_1 == 'Row_Total' else f'{height:.0f}'
-                    ax1.text(bar.get_x() + bar.get_width()/2., height + height*0.01, 
-                            label, ha='center', va='bottom', fontweight='bold', fontsize=8)
-            
-            ax1.set_xticks([x + width/2 for x in x_pos])
-            ax1.set_xticklabels(items, rotation=45, ha='right', fontsize=10)
-            ax1.set_xlabel(x_col, fontsize=12, fontweight="bold")
-            ax1.set_ylabel(f"{y_col_1} ({agg_1})", fontsize=12, fontweight="bold")
-            ax1.set_title(f"{' vs '.join(months)} {y_col_1} Comparison", fontsize=14, fontweight="bold")
-            ax1.legend()
-            
+            values = {month: [metric1_data[month].get(item, 0) for item in items] for month in months}
+
             # Second chart shows percentage comparison
             total_by_item = {item: sum(metric1_data[month].get(item, 0) for month in months) for item in items}
             percentages = {}
             for month in months:
                 percentages[month] = [(metric1_data[month].get(item, 0) / total_by_item[item] * 100) if total_by_item[item] > 0 else 0 for item in items]
-            
-            for i, month in enumerate(months):
-                bars = ax2.bar([x + width*i for x in x_pos], percentages[month], width, 
-                              label=month, color=colors[i % len(colors)], alpha=0.95)
-                
-                for j, bar in enumerate(bars):
-                    height = bar.get_height()
-                    ax2.text(bar.get_x() + bar.get_width()/2., height + 1, f'{height:.1f}%',
-                            ha='center', va='bottom', fontweight='bold', fontsize=8)
-            
-            ax2.set_xticks([x + width/2 for x in x_pos])
-            ax2.set_xticklabels(items, rotation=45, ha='right', fontsize=10)
-            ax2.set_xlabel(x_col, fontsize=12, fontweight="bold")
-            ax2.set_ylabel("Percentage Share", fontsize=12, fontweight="bold")
-            ax2.set_title("Percentage Share Comparison", fontsize=14, fontweight="bold")
-            ax2.legend()
+
+            spec.update(layout="monthly", y_col=y_col_1, agg=agg_1, items=items, months=months,
+                        values=values, percentages=percentages)
             
             chart_data = []
             for item in items:
@@ -571,57 +714,20 @@ def create_anandhaas_visualization(data: pd.DataFrame, ai_plan: dict):
         else:
             # Regular dual metrics (two different metrics)
             if y_col_1 == "count":
-                metric1_data = filtered_data.groupby(x_col).size().sort_values(ascending=False)
+                metric1_data = filtered_data.groupby(x_col, observed=True).size().sort_values(ascending=False)
             else:
-                metric1_data = filtered_data.groupby(x_col)[y_col_1].agg(agg_1).sort_values(ascending=False)
+                metric1_data = filtered_data.groupby(x_col, observed=True)[y_col_1].agg(agg_1).sort_values(ascending=False)
             
             if limit and isinstance(limit, int) and limit > 0:
                 metric1_data = metric1_data.head(limit)
             
             if y_col_2 == "count":
-                metric2_data = filtered_data.groupby(x_col).size().reindex(metric1_data.index, fill_value=0)
+                metric2_data = filtered_data.groupby(x_col, observed=True).size().reindex(metric1_data.index, fill_value=0)
             else:
-                metric2_data = filtered_data.groupby(x_col)[y_col_2].agg(agg_2).reindex(metric1_data.index, fill_value=0)
-            
-            # First metric chart
-            bars1 = ax1.bar(range(len(metric1_data)), metric1_data.values, color='#1e40af', alpha=0.95, edgecolor='white', linewidth=1.5)
-            ax1.set_xticks(range(len(metric1_data)))
-            ax1.set_xticklabels(metric1_data.index, rotation=0 if len(metric1_data) <= 5 else 45, ha='center' if len(metric1_data) <= 5 else 'right', fontsize=11)
-            ax1.set_xlabel(x_col, fontsize=12, fontweight="bold")
-            ax1.set_ylabel(f"{y_col_1} ({agg_1})", fontsize=12, fontweight="bold")
-            ax1.set_title(f"{y_col_1} Analysis", fontsize=14, fontweight="bold")
-            
-            for i, bar in enumerate(bars1):
-                height = bar.get_height()
-                if y_col_1 == 'Row_Total':
-                    label = f'₹{height:,.0f}'
-                elif y_col_1 == 'Quantity_Inventory_UoM':
-                    common_uom = filtered_data["Inventory_UoM"].mode().iloc[0] if not filtered_data["Inventory_UoM"].mode().empty else "Units"
-                    label = f'{height:.1f} {common_uom}'  # Show 1 decimal place
-                else:
-                    label = f'{height:.0f}'
-                ax1.text(bar.get_x() + bar.get_width()/2., height + height*0.01, label,
-                        ha='center', va='bottom', fontweight='bold', fontsize=9)
-            
-            # Second metric chart
-            bars2 = ax2.bar(range(len(metric2_data)), metric2_data.values, color='#059669', alpha=0.95, edgecolor='white', linewidth=1.5)
-            ax2.set_xticks(range(len(metric2_data)))
-            ax2.set_xticklabels(metric2_data.index, rotation=0 if len(metric2_data) <= 5 else 45, ha='center' if len(metric2_data) <= 5 else 'right', fontsize=11)
-            ax2.set_xlabel(x_col, fontsize=12, fontweight="bold")
-            ax2.set_ylabel(f"{y_col_2} ({agg_2})", fontsize=12, fontweight="bold")
-            ax2.set_title(f"{y_col_2} Analysis", fontsize=14, fontweight="bold")
-            
-            for i, bar in enumerate(bars2):
-                height = bar.get_height()
-                if y_col_2 == 'Row_Total':
-                    label = f'₹{height:,.0f}'
-                elif y_col_2 == 'Quantity_Inventory_UoM':
-                    common_uom = filtered_data["Inventory_UoM"].mode().iloc[0] if not filtered_data["Inventory_UoM"].mode().empty else "Units"
-                    label = f'{height:.1f} {common_uom}'  # Show 1 decimal place
-                else:
-                    label = f'{height:.0f}'
-                ax2.text(bar.get_x() + bar.get_width()/2., height + height*0.01, label,
-                        ha='center', va='bottom', fontweight='bold', fontsize=9)
+                metric2_data = filtered_data.groupby(x_col, observed=True)[y_col_2].agg(agg_2).reindex(metric1_data.index, fill_value=0)
+
+            uom = most_common_uom(filtered_data) if "Quantity_Inventory_UoM" in (y_col_1, y_col_2) else None
+            spec.update(layout="dual", metrics=[(metric1_data, y_col_1, agg_1), (metric2_data, y_col_2, agg_2)], uom=uom)
             
             chart_data = []
             for item in metric1_data.index:
@@ -636,34 +742,123 @@ def create_anandhaas_visualization(data: pd.DataFrame, ai_plan: dict):
         y_col = ai_plan.get("y_axis", "Row_Total")
         agg_method = ai_plan.get("aggregation", "sum")
 
-        if y_col == "count":
+        if direct:
+            grouped_data = source.group_sum(rows, x_col, COUNT_COLUMN if y_col == "count" else y_col).sort_values(ascending=False)
+        elif y_col == "count":
             if x_col == "Month":
-                grouped_data = filtered_data.groupby(["MonthSort", "Month"]).size().reset_index(name="count")
+                grouped_data = row_counts(filtered_data, ["MonthSort", "Month"]).reset_index(name="count")
                 grouped_data = grouped_data.set_index("Month")["count"].sort_index()
             else:
-                grouped_data = filtered_data[x_col].value_counts().sort_values(ascending=False)
+                grouped_data = row_counts(filtered_data, x_col).sort_values(ascending=False)
         else:
             if x_col == "Month":
                 grouped_data = filtered_data.groupby(["MonthSort", "Month"])[y_col].agg(agg_method).reset_index()
                 grouped_data = grouped_data.set_index("Month")[y_col].sort_index()
             else:
-                grouped_data = filtered_data.groupby(x_col)[y_col].agg(agg_method).sort_values(ascending=False)
+                grouped_data = filtered_data.groupby(x_col, observed=True)[y_col].agg(agg_method).sort_values(ascending=False)
 
         # Apply limit if specified
         limit = ai_plan.get("limit")
-        print(f"DEBUG: Single metric path - limit value: {limit}")
-        print(f"DEBUG: Grouped data length before limit: {len(grouped_data)}")
+        logger.debug("%d groups, limit %s", len(grouped_data), limit)
         if limit and isinstance(limit, int) and limit > 0:
             grouped_data = grouped_data.head(limit)
-            print(f"Applied limit: showing top {limit} results")
-            print(f"DEBUG: Grouped data length after limit: {len(grouped_data)}")
-        else:
-            print(f"DEBUG: No limit applied - showing all {len(grouped_data)} results")
 
         chart_type = ai_plan.get("chart_type", "bar")
-
         if chart_type == "pie":
             grouped_data = grouped_data.sort_values(ascending=False)
+
+        uom = most_common_uom(filtered_data) if y_col == "Quantity_Inventory_UoM" and chart_type not in ["pie", "line"] else None
+        spec.update(layout="single", chart_type=chart_type, y_col=y_col, series=grouped_data, uom=uom)
+        
+        chart_data = [{"name": str(k), "value": float(v)} for k, v in grouped_data.items()]
+
+    spec["chart_data"] = chart_data
+    return spec
+
+def cached_chart_series(data: SalesStore, ai_plan: dict, endpoint: str) -> dict:
+    """chart_series from the result cache, titled for this plan (the title is not part of the cache key)"""
+    spec = result_cache.get(data, ai_plan, lambda: chart_series(data, ai_plan), endpoint)
+    return dict(spec, title=ai_plan.get("title", "Anandhaas Analysis"))
+
+@span("render")
+def draw_chart(spec: dict) -> "Figure":
+    """Draw a chart_series spec on a new Figure (no pyplot state, so safe off the request thread)"""
+    from matplotlib.figure import Figure
+    x_col = spec["x_col"]
+
+    if spec["dual_metrics"]:
+        fig = Figure(figsize=(24, 10))
+        ax1, ax2 = fig.subplots(1, 2)
+    else:
+        fig = Figure(figsize=(20, 12))
+        ax = fig.subplots()
+
+    if spec["layout"] == "monthly":
+        y_col_1, items, months = spec["y_col"], spec["items"], spec["months"]
+
+        # Create side-by-side bars
+        x_pos = range(len(items))
+        width = 0.35
+        colors = ['#1e40af', '#059669', '#d97706', '#dc2626']
+        
+        for i, month in enumerate(months):
+            bars = ax1.bar([x + width*i for x in x_pos], spec["values"][month], width, 
+                          label=month, color=colors[i % len(colors)], alpha=0.95, edgecolor='white', linewidth=1.5)
+            
+            for bar in bars:
+                height = bar.get_height()
+                label = f'₹{height:,.0f}' if y_col_1 == 'Row_Total' else f'{height:.0f}'
+                ax1.text(bar.get_x() + bar.get_width()/2., height + height*0.01, 
+                        label, ha='center', va='bottom', fontweight='bold', fontsize=8)
+        
+        ax1.set_xticks([x + width/2 for x in x_pos])
+        ax1.set_xticklabels(items, rotation=45, ha='right', fontsize=10)
+        ax1.set_xlabel(x_col, fontsize=12, fontweight="bold")
+        ax1.set_ylabel(f"{y_col_1} ({spec['agg']})", fontsize=12, fontweight="bold")
+        ax1.set_title(f"{' vs '.join(months)} {y_col_1} Comparison", fontsize=14, fontweight="bold")
+        ax1.legend()
+        
+        for i, month in enumerate(months):
+            bars = ax2.bar([x + width*i for x in x_pos], spec["percentages"][month], width, 
+                          label=month, color=colors[i % len(colors)], alpha=0.95)
+            
+            for j, bar in enumerate(bars):
+                height = bar.get_height()
+                ax2.text(bar.get_x() + bar.get_width()/2., height + 1, f'{height:.1f}%',
+                        ha='center', va='bottom', fontweight='bold', fontsize=8)
+        
+        ax2.set_xticks([x + width/2 for x in x_pos])
+        ax2.set_xticklabels(items, rotation=45, ha='right', fontsize=10)
+        ax2.set_xlabel(x_col, fontsize=12, fontweight="bold")
+        ax2.set_ylabel("Percentage Share", fontsize=12, fontweight="bold")
+        ax2.set_title("Percentage Share Comparison", fontsize=14, fontweight="bold")
+        ax2.legend()
+
+    elif spec["layout"] == "dual":
+        # One bar chart per metric
+        for axis, (metric_data, y_col, agg), color in zip((ax1, ax2), spec["metrics"], ('#1e40af', '#059669')):
+            bars = axis.bar(range(len(metric_data)), metric_data.values, color=color, alpha=0.95, edgecolor='white', linewidth=1.5)
+            axis.set_xticks(range(len(metric_data)))
+            axis.set_xticklabels(metric_data.index, rotation=0 if len(metric_data) <= 5 else 45, ha='center' if len(metric_data) <= 5 else 'right', fontsize=11)
+            axis.set_xlabel(x_col, fontsize=12, fontweight="bold")
+            axis.set_ylabel(f"{y_col} ({agg})", fontsize=12, fontweight="bold")
+            axis.set_title(f"{y_col} Analysis", fontsize=14, fontweight="bold")
+            
+            for i, bar in enumerate(bars):
+                height = bar.get_height()
+                if y_col == 'Row_Total':
+                    label = f'₹{height:,.0f}'
+                elif y_col == 'Quantity_Inventory_UoM':
+                    label = f'{height:.1f} {spec["uom"]}'  # Show 1 decimal place
+                else:
+                    label = f'{height:.0f}'
+                axis.text(bar.get_x() + bar.get_width()/2., height + height*0.01, label,
+                        ha='center', va='bottom', fontweight='bold', fontsize=9)
+
+    else:
+        chart_type, y_col, grouped_data = spec["chart_type"], spec["y_col"], spec["series"]
+
+        if chart_type == "pie":
             colors = ['#1e40af', '#059669', '#d97706', '#dc2626', '#7c3aed', '#0891b2', '#65a30d', '#ea580c']
             colors = [colors[i % len(colors)] for i in range(len(grouped_data))]
             
@@ -705,29 +900,22 @@ def create_anandhaas_visualization(data: pd.DataFrame, ai_plan: dict):
                 if y_col == "Row_Total":
                     label = f"₹{height:,.0f}"
                 elif y_col == "Quantity_Inventory_UoM":
-                    # Get the most common UoM for this data
-                    if not filtered_data.empty and "Inventory_UoM" in filtered_data.columns:
-                        common_uom = filtered_data["Inventory_UoM"].mode().iloc[0] if not filtered_data["Inventory_UoM"].mode().empty else "Units"
-                        label = f"{height:,.1f} {common_uom}"  # Show 1 decimal place for precision
-                    else:
-                        label = f"{height:,.1f} Units"  # Show 1 decimal place for precision
+                    label = f"{height:,.1f} {spec['uom']}"  # Show 1 decimal place for precision
                 else:
                     label = f"{height:.0f}"
                 ax.text(bar.get_x() + bar.get_width() / 2.0, height + height*0.01, label,
                        ha="center", va="bottom", fontweight="bold", fontsize=9)
-        
-        chart_data = [{"name": str(k), "value": float(v)} for k, v in grouped_data.items()]
     
-    if not dual_metrics:
-        ax.set_title(ai_plan.get("title", "Anandhaas Analysis"), fontsize=16, fontweight="bold", pad=20)
+    if not spec["dual_metrics"]:
+        ax.set_title(spec["title"], fontsize=16, fontweight="bold", pad=20)
     else:
-        fig.suptitle(ai_plan.get("title", "Anandhaas Analysis"), fontsize=16, fontweight="bold")
+        fig.suptitle(spec["title"], fontsize=16, fontweight="bold")
     
-    plt.tight_layout()
-    if dual_metrics:
-        plt.subplots_adjust(top=0.9)
+    fig.tight_layout()
+    if spec["dual_metrics"]:
+        fig.subplots_adjust(top=0.9)
     
-    return chart_data, fig
+    return fig
 
 def generate_simple_response(ai_plan: dict, chart_data: list = None) -> str:
     chart_desc_map = {"bar": "comparison chart", "pie": "distribution chart", "line": "trend chart"}
@@ -737,79 +925,96 @@ def generate_simple_response(ai_plan: dict, chart_data: list = None) -> str:
 
 @app.route("/api/dashboard-data", methods=["GET"])
 def get_dashboard_data():
-    global anandhaas_data
-    if anandhaas_data is None:
-        anandhaas_data = load_anandhaas_data()
-
-    if anandhaas_data is None:
+    data = anandhaas_snapshot.get()
+    if data is None:
         return jsonify({"error": "Data not available"}), 404
 
-    analysis = analyze_anandhaas_structure(anandhaas_data)
-    if analysis.get("date_range"):
-        analysis["date_range"]["start"] = analysis["date_range"]["start"].isoformat()
-        analysis["date_range"]["end"] = analysis["date_range"]["end"].isoformat()
-    return jsonify(analysis)
+    # Built once per data snapshot; a client holding the same ETag gets a bodyless 304
+    body, etag = data.derived("dashboard-data", lambda: dashboard_payload(data))
+    response = app.response_class(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
+
+def query_payload(query: str, ai_plan: dict, spec: dict) -> dict:
+    """Body of /api/query for a planned query's chart series, less the report id"""
+    chart_data = spec["chart_data"]
+    response_text = generate_simple_response(ai_plan, chart_data)
+    return {
+        "original_query": query,
+        "chart_type": ai_plan.get("chart_type", "bar"),
+        "title": ai_plan.get("title", "Analysis"),
+        "data": chart_data,
+        "x_axis": ai_plan.get("x_axis", "Branch_Name"),
+        "y_axis": ai_plan.get("y_axis", "Row_Total"),
+        "insights": response_text,
+        "pdf_filename": f"{ai_plan.get('title','report').replace(' ', '_')}.pdf",
+        "dual_metrics": ai_plan.get("dual_metrics", False),
+        "planner": ai_plan.get("planner"),
+        "chart1_title": "Ecom Revenue" if ai_plan.get("dual_metrics") else None,
+        "chart2_title": "Online Revenue" if ai_plan.get("dual_metrics") else None,
+    }
+
+def add_report(ai_plan: dict, spec: dict, insights: str, session: str) -> str:
+    """Keep the query's report for export under the caller's session; the figure is only drawn if it is exported"""
+    chart_title = ai_plan.get("title", "Anandhaas Sales Analysis")
+    pdf_filename = f"{chart_title.replace(' ', '_')}_report.pdf"
+    return report_store.add(spec, session=session, title=chart_title, insights=insights, filename=pdf_filename)
 
 @app.route("/api/query", methods=["POST"])
 def process_query():
-    global anandhaas_data
     try:
         payload = request.get_json(silent=True) or {}
         query = payload.get("query", "").strip()
         if not query:
             return jsonify({"error": "Query is required"}), 400
 
-        if anandhaas_data is None:
-            anandhaas_data = load_anandhaas_data()
-        if anandhaas_data is None:
-            return jsonify({"error": "Data not available from S3"}), 404
+        # One snapshot for the whole request, even if a refresh lands meanwhile
+        data = anandhaas_snapshot.get()
+        if data is None:
+            return jsonify({"error": DATA_UNAVAILABLE}), 404
 
-        data_analysis = analyze_anandhaas_structure(anandhaas_data)
+        data_analysis = snapshot_analysis(data)
         ai_plan = get_ai_plan(query, data_analysis)
-        chart_data, fig = create_anandhaas_visualization(anandhaas_data, ai_plan)
-        response_text = generate_simple_response(ai_plan, chart_data)
+        spec = cached_chart_series(data, ai_plan, "query")
 
-        try:
-            chart_title = ai_plan.get("title", "Anandhaas Sales Analysis")
-            pdf_bytes = generate_pdf_report(fig, chart_title, response_text)
-            pdf_b64 = base64.b64encode(pdf_bytes).decode("utf-8")
-            
-            global last_pdf_data
-            last_pdf_data = {
-                'data': pdf_bytes,
-                'title': chart_title,
-                'insights': response_text,
-                'filename': f"{chart_title.replace(' ', '_')}_report.pdf"
-            }
-        except Exception as e:
-            print(f"PDF generation error: {e}")
-            pdf_b64 = None
-
-        plt.close(fig)
+        # The frontend draws chart_data itself
+        answer = query_payload(query, ai_plan, spec)
+        session = report_session()
+        new_session = session is None
+        if new_session:
+            session = uuid.uuid4().hex
+        answer["report_id"] = add_report(ai_plan, spec, answer["insights"], session)
 
-        return jsonify({
-            "original_query": query,
-            "chart_type": ai_plan.get("chart_type", "bar"),
-            "title": ai_plan.get("title", "Analysis"),
-            "data": chart_data,
-            "x_axis": ai_plan.get("x_axis", "Branch_Name"),
-            "y_axis": ai_plan.get("y_axis", "Row_Total"),
-            "insights": response_text,
-            "pdf_base64": pdf_b64,
-            "pdf_filename": f"{ai_plan.get('title','report').replace(' ', '_')}.pdf",
-            "dual_metrics": ai_plan.get("dual_metrics", False),
-            "chart1_title": "Ecom Revenue" if ai_plan.get("dual_metrics") else None,
-            "chart2_title": "Online Revenue" if ai_plan.get("dual_metrics") else None,
-        })
+        response = jsonify(answer)
+        if new_session:
+            response.set_cookie(REPORT_SESSION_COOKIE, session, httponly=True, samesite="Lax")
+        return response
 
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Query failed")
         return jsonify({"error": f"Server error: {str(e)}"}), 500
 
+@app.route("/api/admin/refresh", methods=["POST"])
+def refresh_data():
+    """Load new S3 parts into the running server without a restart"""
+    if ADMIN_TOKEN and request.headers.get("X-Admin-Token") != ADMIN_TOKEN:
+        return jsonify({"error": "Unauthorized"}), 401
+    try:
+        return jsonify(anandhaas_snapshot.refresh())
+    except Exception as e:
+        return jsonify({"error": f"Refresh failed: {str(e)}"}), 500
+
+@app.route("/api/plan-cache", methods=["GET"])
+def get_plan_cache_stats():
+    return jsonify(plan_cache.stats())
+
+@app.route("/api/result-cache", methods=["GET"])
+def get_result_cache_stats():
+    return jsonify(result_cache.stats())
+
 @app.route("/api/transcribe", methods=["POST"])
 def transcribe():
-    temp_file_path = None
     try:
         if "audio" not in request.files:
             return jsonify({"error": "No audio file"}), 400
@@ -819,33 +1024,96 @@ def transcribe():
         if not SARVAM_API_KEY:
             return jsonify({"transcript": "Please configure SARVAM_API_KEY in .env file"})
         
-        temp_file = tempfile.NamedTemporaryFile(suffix=".wav", delete=False)
-        temp_file_path = temp_file.name
-        temp_file.close()
-        
-        audio_file.save(temp_file_path)
-        
-        headers = {"api-subscription-key": SARVAM_API_KEY}
-        with open(temp_file_path, "rb") as f:
-            files = {"file": ("audio.wav", f, "audio/wav")}
-            response = requests.post(SARVAM_STT_URL, headers=headers, files=files, timeout=45)
-        
-        if response.status_code == 200:
-            transcript = response.json().get("transcript", "")
-            return jsonify({"transcript": transcript})
-        else:
-            return jsonify({"transcript": f"Transcription failed: {response.status_code}"})
+        # Streamed from memory to Sarvam; long WAV recordings are split at pauses and sent concurrently
+        with span("transcribe"):
+            return jsonify(transcribe_upload(audio_file, SARVAM_STT_URL, SARVAM_API_KEY))
         
+    except TranscriptionError as e:
+        return jsonify({"transcript": f"Transcription failed: {e.status_code}"})
     except Exception as e:
         return jsonify({"transcript": f"Error: {str(e)}"})
-    finally:
-        if temp_file_path and os.path.exists(temp_file_path):
-            try:
-                os.unlink(temp_file_path)
-            except:
-                pass
 
+# Gets the query path ready while a voice query's audio is being transcribed
+prefetch_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="voice-prefetch")
+
+def prefetch_query_path() -> SalesStore | None:
+    """Load the data snapshot, its analysis (the plan cache and rule planner key) and the Bedrock client"""
+    data = anandhaas_snapshot.get()
+    if data is not None:
+        snapshot_analysis(data)
+    try:
+        aws_client("bedrock-runtime")
+    except Exception as e:
+        logger.warning("⚠️ Bedrock client not ready: %s", e)
+    return data
+
+@app.route("/api/voice-query", methods=["POST"])
+def voice_query():
+    """Transcribe a recording and answer it like /api/query, streaming each step as a server-sent event.
+
+    Events: transcript, plan, chart (the /api/query body), report (its id
+    and download link), then done; error ends the stream early.
+    """
+    if "audio" not in request.files:
+        return jsonify({"error": "No audio file"}), 400
+    if not SARVAM_API_KEY:
+        return jsonify({"error": "Please configure SARVAM_API_KEY in .env file"}), 503
+
+    audio_file = request.files["audio"]
+    # Data and clients load while Sarvam transcribes, so planning starts as soon as the transcript is in
+    # (in this request's context, so the load's stage timings count towards its breakdown)
+    prefetched = prefetch_pool.submit(contextvars.copy_context().run, prefetch_query_path)
+    session = report_session()
+    new_session = session is None
+    if new_session:
+        session = uuid.uuid4().hex
+
+    # Transcribed before the stream starts: uploaded files are closed with the request, not the stream
+    try:
+        with span("transcribe"):
+            heard, failure = transcribe_upload(audio_file, SARVAM_STT_URL, SARVAM_API_KEY), None
+    except TranscriptionError as e:
+        heard, failure = None, f"Transcription failed: {e.status_code}"
+    except Exception as e:
+        heard, failure = None, f"Error: {str(e)}"
+
+    def events():
+        if failure:
+            yield sse_event("error", {"error": failure})
+            return
+        try:
+            yield sse_event("transcript", heard)
+            query = heard["transcript"].strip()
+            if not query:
+                yield sse_event("error", {"error": "No speech recognized"})
+                return
+
+            data = prefetched.result()
+            if data is None:
+                yield sse_event("error", {"error": DATA_UNAVAILABLE})
+                return
+            ai_plan = get_ai_plan(query, snapshot_analysis(data))
+            yield sse_event("plan", ai_plan)
+
+            spec = cached_chart_series(data, ai_plan, "voice-query")
+            answer = query_payload(query, ai_plan, spec)
+            yield sse_event("chart", answer)
+
+            report_id = add_report(ai_plan, spec, answer["insights"], session)
+            yield sse_event("report", {"report_id": report_id, "pdf_url": f"/api/report/{report_id}.pdf"})
+            yield sse_event("done", {"timings": request_timings()})
+        except Exception as e:
+            logger.exception("Voice query failed")
+            yield sse_event("error", {"error": f"Server error: {str(e)}"})
+
+    response = event_stream(events())
+    if new_session:
+        response.set_cookie(REPORT_SESSION_COOKIE, session, httponly=True, samesite="Lax")
+    return response
+
+@span("pdf")
 def generate_pdf_report(fig, title, insights):
+    from matplotlib.backends.backend_pdf import PdfPages
     with io.BytesIO() as pdf_buffer:
         with PdfPages(pdf_buffer) as pdf:
             # Save only the chart - no separate insights page
@@ -853,58 +1121,87 @@ def generate_pdf_report(fig, title, insights):
         pdf_buffer.seek(0)
         return pdf_buffer.read()
 
-def send_pdf_to_slack(pdf_bytes, filename, title, initial_comment, channel_key="test_channel_1"):
-    token = SLACK_BOT_TOKEN
-    channel = SLACK_CHANNELS.get(channel_key)
-    if not token or not channel:
-        return {"success": False, "message": "Slack not configured or invalid channel"}
+def pdf_bytes(fig, info: dict) -> bytes:
+    return generate_pdf_report(fig, info["title"], info["insights"])
+
+report_store = ReportStore(draw=draw_chart, exporters={"png": png_bytes, "pdf": pdf_bytes})
+
+REPORT_MIMETYPES = {"png": "image/png", "pdf": "application/pdf"}
+
+def report_session() -> str | None:
+    """The caller's session: an X-Session-Id header, else the cookie /api/query sets"""
+    return request.headers.get("X-Session-Id") or request.cookies.get(REPORT_SESSION_COOKIE)
+
+def requested_report_id() -> str | None:
+    """Report named in the request body or query string, else the caller's latest report"""
+    body = request.get_json(silent=True) or {}
+    return body.get("report_id") or request.args.get("report_id") or report_store.latest(report_session())
+
+@app.route("/api/report/<report_id>.<fmt>", methods=["GET"])
+def get_report(report_id, fmt):
+    """The report of an earlier /api/query as PDF (or its chart as PNG), generated on first request"""
+    if fmt not in REPORT_MIMETYPES:
+        return jsonify({"error": f"Unsupported format: {fmt}"}), 400
     try:
-        client = WebClient(token=token)
-        pdf_file = io.BytesIO(pdf_bytes)
-        pdf_file.seek(0)
-        response = client.files_upload_v2(
-            channel=channel,
-            file=pdf_file,
-            filename=filename,
-            title=title,
-            initial_comment=initial_comment
-        )
-        if response and response.get("ok"):
-            return {"success": True, "message": f"Successfully sent to {channel_key}"}
-        else:
-            error_msg = response.get("error", "Unknown error") if response else "Unknown error"
-            return {"success": False, "message": f"Failed to send to {channel_key}: {error_msg}"}
-    except SlackApiError as e:
-        error_msg = str(e.response.get("error", str(e))) if hasattr(e, 'response') else str(e)
-        return {"success": False, "message": f"Slack API error: {error_msg}"}
+        with span(f"export_{fmt}"):
+            content = report_store.export(report_id, fmt)
     except Exception as e:
-        return {"success": False, "message": f"Error sending to Slack: {str(e)}"}
+        logger.error("Report generation error: %s", e)
+        return jsonify({"error": f"Report generation failed: {str(e)}"}), 500
+    if content is None:
+        return jsonify({"error": "Report not found or expired. Run the query again."}), 404
+    info = report_store.info(report_id) or {}
+    return send_file(io.BytesIO(content), mimetype=REPORT_MIMETYPES[fmt],
+                     download_name=info.get("filename", "report.pdf") if fmt == "pdf" else f"{report_id}.png")
+
+slack_delivery = SlackDelivery(SLACK_BOT_TOKEN)
 
 @app.route("/api/send-to-slack", methods=["POST", "GET"])
 def send_to_slack_api():
+    """Queue the report for Slack and answer 202 at once; GET /api/slack-jobs/<job_id> follows the upload"""
     try:
-        global last_pdf_data
-        if not last_pdf_data.get('data'):
+        report_id = requested_report_id()
+        report = report_store.info(report_id) if report_id else None
+        if not report:
             return jsonify({"success": False, "message": "No PDF available. Generate a chart first."}), 400
         
-        # Get channel selection from request
-        channel_key = "test_channel_1"  # default
+        # Get channel selection from request: one "channel", a list of "channels", or "all"
+        channel_keys = ["test_channel_1"]  # default
         if request.method == "POST":
             data = request.get_json(silent=True) or {}
-            channel_key = data.get("channel", "test_channel_1")
+            channel_keys = data.get("channels") or data.get("channel", "test_channel_1")
+            if channel_keys == "all":
+                channel_keys = list(SLACK_CHANNELS)
+            elif isinstance(channel_keys, str):
+                channel_keys = [channel_keys]
+        channels = {key: SLACK_CHANNELS[key] for key in channel_keys if SLACK_CHANNELS.get(key)}
+        if not SLACK_BOT_TOKEN or not channels or len(channels) != len(set(channel_keys)):
+            return jsonify({"success": False, "message": "Slack not configured or invalid channel"}), 400
         
-        result = send_pdf_to_slack(
-            pdf_bytes=last_pdf_data['data'],
-            filename=last_pdf_data['filename'],
-            title=last_pdf_data['title'],
-            initial_comment=last_pdf_data['insights'],
-            channel_key=channel_key
+        job_id = slack_delivery.submit(
+            channels,
+            lambda: report_store.export(report_id, "pdf"),
+            filename=report['filename'],
+            title=report['title'],
+            initial_comment=report['insights'],
         )
-        return jsonify(result)
+        return jsonify({
+            "success": True,
+            "message": f"Queued for {', '.join(channels)}",
+            "job_id": job_id,
+            "status_url": f"/api/slack-jobs/{job_id}",
+        }), 202
         
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
 
+@app.route("/api/slack-jobs/<job_id>", methods=["GET"])
+def get_slack_job(job_id):
+    job = slack_delivery.status(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown Slack job"}), 404
+    return jsonify(job)
+
 @app.route("/api/slack-channels", methods=["GET"])
 def get_slack_channels():
     """Get available Slack channels"""
@@ -917,15 +1214,44 @@ def get_slack_channels():
 
 @app.route("/api/last-pdf-info", methods=["GET"])
 def get_last_pdf_info():
-    global last_pdf_data
-    if last_pdf_data.get('data'):
+    report_id = requested_report_id()
+    report = report_store.info(report_id) if report_id else None
+    if report:
         return jsonify({
             "available": True,
-            "filename": last_pdf_data['filename'],
-            "title": last_pdf_data['title']
+            "report_id": report_id,
+            "filename": report['filename'],
+            "title": report['title']
         })
     else:
         return jsonify({"available": False})
 
+def check_slack():
+    response = slack_client(SLACK_BOT_TOKEN).auth_test()
+    logger.info("Slack auth test successful: %s", response.get("ok"))
+
+def warm_data():
+    """Load the data and analyze it, so the first query finds both ready"""
+    data = anandhaas_snapshot.get()
+    if data is None:
+        raise RuntimeError(DATA_UNAVAILABLE)
+    snapshot_analysis(data)
+
+def warm_reports():
+    """Import what drawing and exporting a report needs, which the first export would otherwise wait for"""
+    from matplotlib.backends.backend_pdf import PdfPages
+    from matplotlib.figure import Figure
+
+# Start-up work, run in the background once the server is up; GET /api/ready reports it
+warmup_tasks = {"data": warm_data, "bedrock": lambda: aws_client("bedrock-runtime"), "reports": warm_reports}
+if SLACK_BOT_TOKEN:
+    # Without a token there is nothing to check, and the task would fail and be retried forever
+    warmup_tasks["slack"] = check_slack
+warmup = WarmUp(warmup_tasks, required=["data", "bedrock", "reports"])
+serve_readiness(app, warmup)
+
 if __name__ == "__main__":
+    # The reloader's serving process warms up at once; the process watching for changes never serves
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        warmup.start()
     app.run(debug=True, port=5001)
\ No newline at end of file
@@ -0,0 +1,234 @@
+"""ASGI server mode, for many concurrent voice users per process.
+
+    APP_MODULE=app_v1 uvicorn asgi:app --port 5001
+
+/api/query, /api/transcribe and /api/voice-query run on the event loop:
+Bedrock and Sarvam are called on non-blocking clients, so a request waiting
+on them holds no thread. Aggregation (a few milliseconds of mostly numpy
+work on the columnar store) and data loads run on threads; report figures
+are drawn in worker processes. Every other endpoint is the Flask app's own,
+served on a thread pool through a WSGI adapter.
+"""
+import asyncio
+import contextlib
+import importlib
+import io
+import os
+import time
+import uuid
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.exceptions import HTTPException
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+
+from async_clients import AsyncBedrock, async_http
+from event_stream import sse_event
+from log import get_logger
+from metrics import finish_request, request_timings, server_timing, span, start_request
+from report_store import render_process_pool
+from transcription import STT_MAX_UPLOAD_BYTES, InMemoryUploads, TranscriptionError, transcribe_upload_async
+
+# Flask app (app_v1: S3 parquet data, app: CSV data) whose data, planner and reports are served
+APP_MODULE = os.getenv("APP_MODULE", "app_v1")
+# Threads serving the Flask endpoints
+WSGI_THREADS = int(os.getenv("WSGI_THREADS", "16"))
+
+flask_app = importlib.import_module(APP_MODULE)
+logger = get_logger("asgi")
+
+
+def json_response(payload, status_code: int = 200) -> Response:
+    # Flask's encoder, so both server modes answer with the same JSON
+    return Response(flask_app.app.json.dumps(payload), status_code=status_code, media_type="application/json")
+
+
+def session_of(request) -> tuple:
+    """(session, is_new) as report_session() finds it, with a new session when there is none"""
+    session = request.headers.get("X-Session-Id") or request.cookies.get(flask_app.REPORT_SESSION_COOKIE)
+    return (session, False) if session else (uuid.uuid4().hex, True)
+
+
+def with_session(response: Response, session: str, is_new: bool) -> Response:
+    if is_new:
+        response.set_cookie(flask_app.REPORT_SESSION_COOKIE, session, httponly=True, samesite="lax")
+    return response
+
+
+async def uploaded_file(request, field: str):
+    """The uploaded file field of a multipart request, parsed in memory as Flask does; None when missing"""
+    body = bytearray()
+    async for block in request.stream():
+        body += block
+        if len(body) > STT_MAX_UPLOAD_BYTES:
+            raise HTTPException(413)
+    environ = {"REQUEST_METHOD": "POST", "CONTENT_TYPE": request.headers.get("content-type", ""),
+               "CONTENT_LENGTH": str(len(body)), "wsgi.input": io.BytesIO(body)}
+    files = await asyncio.to_thread(lambda: InMemoryUploads(environ).files)
+    return files.get(field)
+
+
+async def current_data() -> tuple:
+    """(data snapshot, its analysis), loaded on a thread the first time; (None, None) without data"""
+    data = await asyncio.to_thread(flask_app.anandhaas_snapshot.get)
+    if data is None:
+        return None, None
+    return data, await asyncio.to_thread(flask_app.snapshot_analysis, data)
+
+
+async def process_query(request):
+    try:
+        try:
+            payload = await request.json()
+        except ValueError:
+            payload = {}
+        query = (payload or {}).get("query", "").strip()
+        if not query:
+            return json_response({"error": "Query is required"}, 400)
+
+        data, data_analysis = await current_data()
+        if data is None:
+            return json_response({"error": flask_app.DATA_UNAVAILABLE}, 404)
+        ai_plan = await flask_app.get_ai_plan_async(query, data_analysis, request.app.state.bedrock)
+        spec = await asyncio.to_thread(flask_app.cached_chart_series, data, ai_plan, "query")
+
+        answer = flask_app.query_payload(query, ai_plan, spec)
+        session, is_new = session_of(request)
+        # Keeping a report encodes its spec and may write it to REPORT_DIR
+        answer["report_id"] = await asyncio.to_thread(flask_app.add_report, ai_plan, spec, answer["insights"], session)
+        return with_session(json_response(answer), session, is_new)
+
+    except Exception as e:
+        logger.exception("Query failed")
+        return json_response({"error": f"Server error: {str(e)}"}, 500)
+
+
+async def transcribe(request):
+    audio_file = await uploaded_file(request, "audio")
+    if audio_file is None:
+        return json_response({"error": "No audio file"}, 400)
+    if not flask_app.SARVAM_API_KEY:
+        return json_response({"transcript": "Please configure SARVAM_API_KEY in .env file"})
+    try:
+        with span("transcribe"):
+            heard = await transcribe_upload_async(audio_file, flask_app.SARVAM_STT_URL, flask_app.SARVAM_API_KEY,
+                                                  request.app.state.http)
+        return json_response(heard)
+    except TranscriptionError as e:
+        return json_response({"transcript": f"Transcription failed: {e.status_code}"})
+    except Exception as e:
+        return json_response({"transcript": f"Error: {str(e)}"})
+
+
+async def voice_query(request):
+    """/api/voice-query of the Flask app, with the same events"""
+    audio_file = await uploaded_file(request, "audio")
+    if audio_file is None:
+        return json_response({"error": "No audio file"}, 400)
+    if not flask_app.SARVAM_API_KEY:
+        return json_response({"error": "Please configure SARVAM_API_KEY in .env file"}, 503)
+
+    # Data loads while Sarvam transcribes, so planning starts as soon as the transcript is in
+    prefetched = asyncio.ensure_future(current_data())
+    session, is_new = session_of(request)
+
+    async def events():
+        try:
+            with span("transcribe"):
+                heard = await transcribe_upload_async(audio_file, flask_app.SARVAM_STT_URL, flask_app.SARVAM_API_KEY,
+                                                      request.app.state.http)
+        except TranscriptionError as e:
+            yield sse_event("error", {"error": f"Transcription failed: {e.status_code}"})
+            return
+        except Exception as e:
+            yield sse_event("error", {"error": f"Error: {str(e)}"})
+            return
+        try:
+            yield sse_event("transcript", heard)
+            query = heard["transcript"].strip()
+            if not query:
+                yield sse_event("error", {"error": "No speech recognized"})
+                return
+
+            data, data_analysis = await prefetched
+            if data is None:
+                yield sse_event("error", {"error": flask_app.DATA_UNAVAILABLE})
+                return
+            ai_plan = await flask_app.get_ai_plan_async(query, data_analysis, request.app.state.bedrock)
+            yield sse_event("plan", ai_plan)
+
+            spec = await asyncio.to_thread(flask_app.cached_chart_series, data, ai_plan, "voice-query")
+            answer = flask_app.query_payload(query, ai_plan, spec)
+            yield sse_event("chart", answer)
+
+            report_id = await asyncio.to_thread(flask_app.add_report, ai_plan, spec, answer["insights"], session)
+            yield sse_event("report", {"report_id": report_id, "pdf_url": f"/api/report/{report_id}.pdf"})
+            yield sse_event("done", {"timings": request_timings()})
+        except Exception as e:
+            logger.exception("Voice query failed")
+            yield sse_event("error", {"error": f"Server error: {str(e)}"})
+
+    response = StreamingResponse(events(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    return with_session(response, session, is_new)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(native):
+    # Forked before the server has started any threads
+    processes = flask_app.report_store.processes = render_process_pool()
+    native.state.http = async_http()
+    native.state.bedrock = AsyncBedrock(native.state.http)
+    # Data load and client checks in the background, after the fork; GET /api/ready reports them
+    flask_app.warmup.start()
+    try:
+        yield
+    finally:
+        await native.state.http.close()
+        if processes is not None:
+            processes.shutdown(cancel_futures=True)
+
+
+native = Starlette(
+    routes=[
+        Route("/api/query", process_query, methods=["POST"]),
+        Route("/api/transcribe", transcribe, methods=["POST"]),
+        Route("/api/voice-query", voice_query, methods=["POST"]),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"],
+                           expose_headers=["Server-Timing"])],
+    lifespan=lifespan,
+)
+wsgi = WSGIMiddleware(flask_app.app, workers=WSGI_THREADS)
+NATIVE_PATHS = {route.path for route in native.routes}
+
+
+async def timed(scope, receive, send):
+    """The async routes, timed like the Flask app times its requests (Server-Timing header, request metrics)"""
+    start_request()
+    started = time.perf_counter()
+    status = 500
+
+    async def send_timed(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            seconds = time.perf_counter() - started
+            message["headers"] = [*message.get("headers", []), (b"server-timing", server_timing(seconds).encode())]
+            finish_request(scope["path"], status, seconds)
+        await send(message)
+
+    await native(scope, receive, send_timed)
+
+
+async def app(scope, receive, send):
+    # Lifespan events and the I/O-bound endpoints go to the async routes, the rest to Flask (which has its own CORS)
+    if scope["type"] == "lifespan":
+        await native(scope, receive, send)
+    elif scope.get("path") in NATIVE_PATHS:
+        await timed(scope, receive, send)
+    else:
+        await wsgi(scope, receive, send)
@@ -0,0 +1,65 @@
+import asyncio
+import os
+import random
+from urllib.parse import quote
+
+import aiohttp
+from botocore.auth import SigV4Auth
+from botocore.awsrequest import AWSRequest
+from botocore.exceptions import NoCredentialsError
+
+from clients import AWS_REGION, CLIENT_CONNECT_TIMEOUT, CLIENT_READ_TIMEOUT, aws_session
+
+# Connections the ASGI server keeps open to Bedrock, Sarvam, ... across all requests
+ASYNC_MAX_CONNECTIONS = int(os.getenv("ASYNC_MAX_CONNECTIONS", "256"))
+BEDROCK_MAX_ATTEMPTS = 3
+
+
+def async_http() -> aiohttp.ClientSession:
+    """Keep-alive session for the running event loop; create it at startup and close it at shutdown"""
+    return aiohttp.ClientSession(
+        timeout=aiohttp.ClientTimeout(sock_connect=CLIENT_CONNECT_TIMEOUT, sock_read=CLIENT_READ_TIMEOUT),
+        connector=aiohttp.TCPConnector(limit=ASYNC_MAX_CONNECTIONS),
+    )
+
+
+class BedrockError(Exception):
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"Bedrock invoke_model failed ({status_code}): {message}")
+        self.status_code = status_code
+
+
+class AsyncBedrock:
+    """Bedrock runtime invoke_model on an aiohttp session.
+
+    Requests are signed with the shared boto3 session's credentials, so they
+    are resolved the same way as for aws_client(). Throttling and server
+    errors are retried with jittered backoff, like boto3's standard mode.
+    AWS_ENDPOINT_URL_BEDROCK_RUNTIME overrides the endpoint as it does for boto3.
+    """
+
+    def __init__(self, client: aiohttp.ClientSession, region: str = AWS_REGION):
+        self.client = client
+        self.region = region
+        self.endpoint = (os.getenv("AWS_ENDPOINT_URL_BEDROCK_RUNTIME") or os.getenv("AWS_ENDPOINT_URL")
+                         or f"https://bedrock-runtime.{region}.amazonaws.com").rstrip("/")
+
+    async def invoke_model(self, model_id: str, body: str) -> bytes:
+        """The raw response body of invoke_model"""
+        url = f"{self.endpoint}/model/{quote(model_id, safe='')}/invoke"
+        # Resolving credentials may call IMDS or STS, and refreshing them blocks, so both run off the event loop
+        credentials = await asyncio.to_thread(lambda: aws_session().get_credentials())
+        if credentials is None:
+            raise NoCredentialsError()
+        for attempt in range(1, BEDROCK_MAX_ATTEMPTS + 1):
+            request = AWSRequest(method="POST", url=url, data=body.encode(),
+                                 headers={"Content-Type": "application/json", "Accept": "application/json"})
+            frozen = await asyncio.to_thread(credentials.get_frozen_credentials)
+            SigV4Auth(frozen, "bedrock", self.region).add_auth(request)
+            async with self.client.post(url, data=request.body, headers=dict(request.headers.items())) as response:
+                content = await response.read()
+            if response.status == 200:
+                return content
+            if response.status not in (429, 500, 502, 503, 504) or attempt == BEDROCK_MAX_ATTEMPTS:
+                raise BedrockError(response.status, content[:200].decode(errors="replace"))
+            await asyncio.sleep(min(20.0, 2 ** attempt * random.uniform(0.5, 1.0)))
@@ -0,0 +1,98 @@
+"""Benchmark per-request client construction vs the shared client registry.
+
+Calls go to a local keep-alive HTTP stub, so no AWS, Sarvam or Slack access
+is needed. Over the internet the pooled paths also skip a TLS handshake per
+request, which this local (plain HTTP) stub does not show.
+
+Run from the backend directory:
+    python -m benchmarks.bench_clients --requests 200
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import boto3
+import requests
+from botocore.config import Config
+from slack_sdk import WebClient
+
+import clients
+
+MODEL_REPLY = json.dumps({"output": {"message": {"content": [{"text": "{}"}]}}}).encode()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(MODEL_REPLY)))
+        self.end_headers()
+        self.wfile.write(MODEL_REPLY)
+
+    def log_message(self, *args):
+        pass
+
+
+def timed(label, fn, n):
+    fn()
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    per_call = (time.perf_counter() - start) / n * 1000
+    print(f"{label:<44} {per_call:>9.3f} ms")
+    return per_call
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+    n = args.requests
+
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}"
+    body = json.dumps({"messages": [{"role": "user", "content": [{"text": "x" * 4000}]}]})
+
+    def invoke(client):
+        client.invoke_model(modelId="amazon.nova-pro-v1:0", body=body)["body"].read()
+
+    def fresh_bedrock():
+        invoke(boto3.client("bedrock-runtime", region_name="us-east-1", endpoint_url=url))
+
+    shared = boto3.session.Session().client("bedrock-runtime", region_name="us-east-1", endpoint_url=url,
+                                            config=Config(max_pool_connections=clients.CLIENT_POOL_SIZE,
+                                                          tcp_keepalive=True))
+
+    print(f"{'path':<44} {'per call':>12}")
+    before = timed("bedrock: boto3.client() per request", fresh_bedrock, max(1, n // 10))
+    after = timed("bedrock: shared client", lambda: invoke(shared), n)
+    print(f"{'':<44} saved {before - after:.3f} ms/request")
+
+    audio = b"\0" * 64_000
+    before = timed("transcribe: requests.post()", lambda: requests.post(url, files={"file": audio}, timeout=5), n)
+    after = timed("transcribe: http_session().post()",
+                  lambda: clients.http_session().post(url, files={"file": audio}, timeout=5), n)
+    print(f"{'':<44} saved {before - after:.3f} ms/request")
+
+    before = timed("slack: WebClient() per send", lambda: WebClient(token="xoxb-bench"), n)
+    after = timed("slack: slack_client()", lambda: clients.slack_client("xoxb-bench"), n)
+    print(f"{'':<44} saved {before - after:.3f} ms/request")
+
+    before = timed("s3: boto3.client('s3') per load", lambda: boto3.client("s3", region_name="us-east-1"), max(1, n // 10))
+    after = timed("s3: aws_client('s3')", lambda: clients.aws_client("s3"), n)
+    print(f"{'':<44} saved {before - after:.3f} ms/request")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Benchmark plan aggregation from raw rows vs the pre-aggregated daily cube.
+
+Run from the backend directory:
+    python -m benchmarks.bench_cube --rows 2000000 --days 365
+"""
+import argparse
+import time
+
+from benchmarks.synthetic import generate_parquet_frame
+from sales_cube import COUNT_COLUMN, build_daily_cube
+from sales_store import SalesStore
+
+DIMENSIONS = ["Branch_Name", "SK_Section", "Item Group Name", "Sales Group Name", "Item_Service_Description"]
+
+PLANS = [
+    ("revenue by branch", "Branch_Name", "Row_Total", []),
+    ("top items in VV", "Item_Service_Description", "Row_Total", [("Branch_Name", "VV")]),
+    ("ecom count by section", "SK_Section", "count", [("Sales Group Name", "Sales - Ecom")]),
+    ("mysore pak by branch", "Branch_Name", "Row_Total", [("Item_Service_Description", "mysore pak")]),
+]
+
+
+def answer_raw(store, x_col, y_col, filters):
+    """Raw-row path: materialize the matching rows and group with pandas"""
+    rows = store.all_rows()
+    for col, value in filters:
+        rows = store.contains_rows(rows, col, value)
+    frame = store.take(rows, [x_col, "Row_Total"])
+    if y_col == "count":
+        return frame[x_col].value_counts()
+    return frame.groupby(x_col, observed=True)[y_col].sum()
+
+
+def answer_cube(cube, x_col, y_col, filters):
+    """Cube path: filter cube cells and sum straight from category codes"""
+    rows = cube.all_rows()
+    for col, value in filters:
+        rows = cube.contains_rows(rows, col, value)
+    return cube.group_sum(rows, x_col, COUNT_COLUMN if y_col == "count" else y_col)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    store = SalesStore.from_frame(generate_parquet_frame(args.rows, days=args.days), dimensions=DIMENSIONS,
+                                  measures=["Row_Total", "Quantity_Inventory_UoM"], index_columns=DIMENSIONS)
+    start = time.perf_counter()
+    cube = build_daily_cube(store, DIMENSIONS)
+    print(f"{len(store):,} rows -> {len(cube):,} cube cells in {time.perf_counter() - start:.2f}s")
+    print(f"{'plan':<24} {'raw ms':>10} {'cube ms':>10} {'speedup':>8}")
+
+    for name, x_col, y_col, filters in PLANS:
+        timings = []
+        for source, answer in ((store, answer_raw), (cube, answer_cube)):
+            best = float("inf")
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                result = answer(source, x_col, y_col, filters)
+                best = min(best, time.perf_counter() - start)
+            timings.append((best, result))
+        (raw_s, raw), (cube_s, cubed) = timings
+        raw, cubed = raw[raw > 0].sort_index(), cubed.sort_index()
+        assert list(raw.index) == list(cubed.index)
+        assert ((raw.to_numpy() - cubed.to_numpy()) ** 2 <= (1e-6 * raw.abs().max() + 1e-2) ** 2).all()
+        print(f"{name:<24} {raw_s * 1e3:>10.1f} {cube_s * 1e3:>10.1f} {raw_s / cube_s:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
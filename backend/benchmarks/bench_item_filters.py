@@ -0,0 +1,61 @@
+"""Benchmark item/branch/section text filters: full-table string scan vs inverted index.
+
+Run from the backend directory:
+    python -m benchmarks.bench_item_filters --rows 2000000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import generate_parquet_frame
+from sales_store import SalesStore
+
+TERMS = [
+    ("Item_Service_Description", "mysore pak"),
+    ("Item_Service_Description", "murukku"),
+    ("Item_Service_Description", "ghee roast special"),
+    ("Branch_Name", "vv"),
+    ("SK_Section", "milk"),
+]
+
+
+def scan(df, col, term):
+    """The pre-index path: lowercase and regex-scan every row"""
+    return df[df[col].astype(str).str.lower().str.contains(term, case=False, na=False)]
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    df = generate_parquet_frame(args.rows)
+    start = time.perf_counter()
+    store = SalesStore.from_frame(df, dimensions=["Branch_Name", "SK_Section", "Item_Service_Description"],
+                                  measures=["Row_Total", "Quantity_Inventory_UoM"],
+                                  index_columns=["Branch_Name", "SK_Section", "Item_Service_Description"])
+    print(f"{args.rows:,} rows, store + index build {time.perf_counter() - start:.2f}s")
+    print(f"{'column':<26} {'term':<20} {'rows':>10} {'scan ms':>10} {'index ms':>10} {'speedup':>8}")
+
+    for col, term in TERMS:
+        scan_s, scanned = timed(lambda: scan(df, col, term), args.repeat)
+        # Fresh index lookups each round so the per-term cache does not flatter the result
+        index_s, rows = timed(lambda: (store.indexes[col]._contains_cache.clear(),
+                                       store.contains_rows(store.all_rows(), col, term))[1], args.repeat)
+        assert len(scanned) == len(rows) and np.array_equal(scanned.index.to_numpy(), rows)
+        print(f"{col:<26} {term:<20} {len(rows):>10,} {scan_s * 1e3:>10.1f} {index_s * 1e3:>10.2f} {scan_s / index_s:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Benchmark the Item_in filter with 1, 10 and 50 search terms.
+
+Compares the original per-term str.contains scan with concat and
+drop_duplicates against matching the distinct item names (per-term index
+lookups vs one pass for all terms) followed by a single row selection.
+
+Run from the backend directory:
+    python -m benchmarks.bench_item_in --rows 2000000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import BASE_ITEMS, VARIANTS, generate_parquet_frame
+from row_filter import RowFilter
+from sales_store import SalesStore
+
+COL = "Item_Service_Description"
+
+
+def search_terms(count: int, seed: int = 0) -> list:
+    """Item terms as users type them: base names, variants of them and a few that match nothing"""
+    rng = np.random.default_rng(seed)
+    pool = [base.lower() for base in BASE_ITEMS]
+    pool += [f"{base.lower()} {variant.lower()}" for base in BASE_ITEMS for variant in VARIANTS[1:4]]
+    pool += [word.lower() for base in BASE_ITEMS for word in base.split()]
+    pool += ["kesari", "jangiri", "thenkuzhal", "omapodi"]
+    return list(rng.choice(sorted(set(pool)), size=count, replace=False))
+
+
+def concat_scan(df, terms):
+    """The original Item_in path: one full scan per term, concat, then dedup on every column"""
+    all_matches = pd.DataFrame()
+    for term in terms:
+        matches = df[df[COL].astype(str).str.contains(term, case=False, na=False)]
+        all_matches = pd.concat([all_matches, matches], ignore_index=True)
+    return all_matches.drop_duplicates()
+
+
+def per_term_codes(store, terms):
+    """One index lookup per term, codes merged with a union"""
+    codes = np.empty(0, dtype=np.int64)
+    for term in terms:
+        codes = np.union1d(codes, store.indexes[COL].codes_containing(term))
+    return codes
+
+
+def one_pass_codes(store, terms):
+    return store.contains_any_codes(COL, terms)
+
+
+def select(store, codes):
+    selection = RowFilter(store)
+    selection.keep_codes(COL, codes)
+    return selection.rows()
+
+
+def timed(fn, repeat, store):
+    best = float("inf")
+    for _ in range(repeat):
+        # Every run starts cold; repeated plans would otherwise hit the term cache
+        store.indexes[COL]._contains_cache.clear()
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-scan", action="store_true", help="skip the slow original scan")
+    args = parser.parse_args()
+
+    df = generate_parquet_frame(args.rows)
+    store = SalesStore.from_frame(df, dimensions=[COL], measures=["Row_Total", "Quantity_Inventory_UoM"],
+                                  index_columns=[COL])
+    print(f"{len(store):,} rows, {len(store.frame[COL].cat.categories)} distinct items")
+    print(f"{'terms':>5} {'rows':>10} {'concat+dedup ms':>16} {'per-term match':>15} {'one-pass match':>15} {'select rows':>12}")
+
+    for count in (1, 10, 50):
+        terms = search_terms(count)
+        scan_ms = float("nan")
+        if not args.skip_scan:
+            scan_ms, scanned = timed(lambda: concat_scan(df, terms), 1, store)
+        per_term_ms, expected = timed(lambda: per_term_codes(store, terms), args.repeat, store)
+        one_pass_ms, codes = timed(lambda: one_pass_codes(store, terms), args.repeat, store)
+        assert np.array_equal(expected, codes), f"matched items differ for {terms}"
+        select_ms, rows = timed(lambda: select(store, codes), args.repeat, store)
+        if not args.skip_scan:
+            assert len(rows) == len(scanned), f"row counts differ for {terms}"
+        print(f"{count:>5} {len(rows):>10,} {scan_ms:>16.1f} {per_term_ms:>15.2f} {one_pass_ms:>15.2f} {select_ms:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""Benchmark data loading: time and peak memory of the old and the projected loaders, for parquet and CSV.
+
+Writes --parts monthly parquet parts in the app_v1.py schema and one CSV in
+the app.py schema, each with --extra-columns columns the app never reads,
+then loads them in a fresh process per loader and reports the load time,
+the peak RSS the load added and the resulting store. The old loaders read
+every column into pandas (the CSV's amounts as strings, cleaned after); the
+new ones go through s3_loader.read_parquet and app.read_sales_csv. The
+parquet loaders read the parts from S3 stand-in bytes, as without a local
+cache. Both loaders must build identical stores; a last parquet run keeps
+only the final --recent-days, skipping row groups by their date statistics.
+
+Run from the backend directory:
+    python -m benchmarks.bench_loading --rows 2000000 --extra-columns 20
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import write_csv, write_parquet_parts
+
+MODES = ["parquet-old", "parquet-new", "parquet-recent", "csv-old", "csv-new"]
+
+
+class LocalS3:
+    """get_object/head_object over local files, so the loaders download parts as they would from S3"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def get_object(self, Bucket, Key):
+        with open(os.path.join(self.directory, Key), "rb") as f:
+            return {"Body": io.BytesIO(f.read()), "ETag": f'"{Key}"'}
+
+    def head_object(self, Bucket, Key):
+        return {"ETag": f'"{Key}"'}
+
+
+def summary(store) -> dict:
+    """What two loaders must agree on for their stores to be the same"""
+    out = {"records": len(store), "days": int(np.asarray(store.days, dtype=np.int64).sum()), "columns": sorted(store.columns)}
+    for col in store.frame.columns:
+        if store.is_categorical(col):
+            out[col] = [str(name) for name in store.frame[col].cat.categories]
+            out[f"{col} codes"] = int(np.asarray(store.codes(col), dtype=np.int64).sum())
+        elif col in store.measures:
+            out[col] = round(float(np.nansum(store.frame[col].to_numpy(), dtype=np.float64)), 0)
+    return out
+
+
+def load(mode: str, directory: str):
+    """Load the data one way (in the process run_mode starts) and return its store"""
+    import app
+    import app_v1
+    from s3_loader import load_parquet_parts
+    if mode.startswith("csv"):
+        path = os.path.join(directory, "sales.csv")
+        if mode == "csv-new":
+            return app.load_anandhaas_data(path)
+        with open(path, "rb") as f:
+            raw = f.read()
+        return app.build_sales_store(pd.read_csv(io.BytesIO(raw), quotechar='"'))
+
+    s3 = LocalS3(directory)
+    keys = sorted(name for name in os.listdir(directory) if name.endswith(".parquet"))
+    if mode == "parquet-old":
+        frames = [pd.read_parquet(io.BytesIO(s3.get_object(Bucket=None, Key=key)["Body"].read())) for key in keys]
+        return app_v1.build_sales_store(pd.concat(frames, ignore_index=True))
+    frame, _ = load_parquet_parts(s3, None, keys, read_options=app_v1.PARQUET_READ)
+    return app_v1.build_sales_store(frame)
+
+
+def rss_mb(field: str) -> float:
+    with open("/proc/self/status") as f:
+        fields = dict(line.split(":", 1) for line in f)
+    return int(fields[field].split()[0]) / 1024
+
+
+def run_mode(mode: str, directory: str, recent_start: str):
+    if mode == "parquet-recent":
+        os.environ["DATA_START_DATE"] = recent_start
+    with contextlib.redirect_stdout(io.StringIO()):
+        # Imports first, then the peak is reset, so the peak measured is the load's own
+        import app
+        import app_v1
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        before = rss_mb("VmRSS")
+        start = time.perf_counter()
+        store = load(mode, directory)
+        seconds = time.perf_counter() - start
+    print(json.dumps({"seconds": seconds, "peak_mb": rss_mb("VmHWM") - before, "store_mb": store.memory_usage() / 1e6,
+                      "summary": summary(store)}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--parts", type=int, default=4, help="monthly parquet parts")
+    parser.add_argument("--extra-columns", type=int, default=20)
+    parser.add_argument("--row-group-rows", type=int, default=100_000)
+    parser.add_argument("--recent-days", type=int, default=30)
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--directory", help=argparse.SUPPRESS)
+    parser.add_argument("--recent-start", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.mode:
+        return run_mode(args.mode, args.directory, args.recent_start)
+
+    with tempfile.TemporaryDirectory() as directory:
+        start = pd.Timestamp("2024-01-01")
+        write_parquet_parts(directory, args.rows, parts=args.parts, start=str(start.date()), chunk_rows=args.rows,
+                            row_group_rows=args.row_group_rows, extra_columns=args.extra_columns)
+        write_csv(os.path.join(directory, "sales.csv"), args.rows, chunk_rows=args.rows, extra_columns=args.extra_columns)
+        end = start + pd.DateOffset(months=args.parts)
+        recent_start = str((end - pd.Timedelta(days=args.recent_days)).date())
+        sizes = {kind: sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)
+                           if name.endswith(kind)) / 1e6 for kind in (".parquet", ".csv")}
+
+        print(f"{args.rows:,} rows, {args.extra_columns} unused columns: {args.parts} parquet parts "
+              f"({sizes['.parquet']:.0f} MB), CSV ({sizes['.csv']:.0f} MB); recent = since {recent_start}")
+        print(f"{'loader':<16} {'records':>10} {'load s':>8} {'peak MB':>8} {'store MB':>9}")
+        results = {}
+        for mode in MODES:
+            output = subprocess.run([sys.executable, "-m", "benchmarks.bench_loading", "--mode", mode,
+                                     "--directory", directory, "--recent-start", recent_start],
+                                    capture_output=True, text=True, check=True).stdout
+            results[mode] = result = json.loads(output.strip().splitlines()[-1])
+            print(f"{mode:<16} {result['summary']['records']:>10,} {result['seconds']:>8.2f} "
+                  f"{result['peak_mb']:>8.0f} {result['store_mb']:>9.1f}")
+
+    same = []
+    for old, new in (("parquet-old", "parquet-new"), ("csv-old", "csv-new")):
+        # The new loaders leave the unused columns out; everything else must match
+        expected = {key: value for key, value in results[old]["summary"].items()
+                    if key in results[new]["summary"] or key == "columns"}
+        expected["columns"] = [c for c in expected["columns"] if c in results[new]["summary"]["columns"]]
+        same.append(expected == results[new]["summary"])
+        print(f"{new} store {'matches' if same[-1] else 'DIFFERS FROM'} {old}")
+    recent = results["parquet-recent"]["summary"]
+    print(f"parquet-recent kept {recent['records']:,} of {results['parquet-new']['summary']['records']:,} records")
+    sys.exit(0 if all(same) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Benchmark what logging costs the query path at each log level.
+
+Each level runs in a fresh process on --rows synthetic rows: --requests
+times, a question is planned and its chart computed, as /api/query does (the
+result cache is bypassed, so every request filters and aggregates). The
+questions include item filters matching many items, whose matched names the
+debug records list. Logs go to a file, as under a process manager, and the
+script reports the time per request, the log bytes written per request and
+the time build_sales_store took, whose diagnostics are debug records too.
+At INFO (production) the debug diagnostics must cost nothing: no record and
+no extra pandas work.
+
+Run from the backend directory:
+    python -m benchmarks.bench_logging --rows 1000000
+"""
+import argparse
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+QUESTIONS = ["top 10 items in VV", "revenue by branch", "sales by section in august", "ecom vs online"]
+PLANS = [
+    {"chart_type": "bar", "x_axis": "Item_Service_Description", "y_axis": "Row_Total", "aggregation": "sum", "limit": 10,
+     "filters": [["Item_Service_Description", "a"]]},
+    {"chart_type": "bar", "x_axis": "Branch_Name", "y_axis": "Row_Total", "aggregation": "sum",
+     "filters": [["Item_in", ["mysore", "murukku", "halwa", "ladoo"]]]},
+]
+LEVELS = [("INFO", 1.0), ("DEBUG", 0.01), ("DEBUG", 1.0)]
+
+
+def run(rows: int, requests: int, log_path: str):
+    """Serve requests queries in this process, logging to log_path, and print the time of each"""
+    from benchmarks.synthetic import generate_parquet_frame
+    with open(log_path, "a") as log, contextlib.redirect_stdout(log):
+        import app_v1
+        frame = generate_parquet_frame(rows)
+        start = time.perf_counter()
+        store = app_v1.build_sales_store(frame)
+        load_seconds = time.perf_counter() - start
+        analysis = app_v1.snapshot_analysis(store)
+        log.flush()
+        loaded_bytes = os.path.getsize(log_path)
+        times = []
+        for i in range(requests):
+            start = time.perf_counter()
+            if i % 2:
+                plan = json.loads(json.dumps(PLANS[i // 2 % len(PLANS)]))
+            else:
+                plan = app_v1.get_ai_plan(QUESTIONS[i // 2 % len(QUESTIONS)], analysis)
+            app_v1.chart_series(store, plan)
+            times.append(time.perf_counter() - start)
+        log.flush()
+    print(json.dumps({"times": times, "loaded_bytes": loaded_bytes, "load_seconds": load_seconds}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--run", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run:
+        return run(args.rows, args.requests, args.run)
+
+    print(f"{args.rows} rows, {args.requests} requests per level")
+    print(f"{'level':16} {'ms/request':>11} {'p95 ms':>8} {'log bytes/request':>18} {'store build s':>14}")
+    for level, sample in LEVELS:
+        with tempfile.NamedTemporaryFile(suffix=".log") as log:
+            env = dict(os.environ, LOG_LEVEL=level, LOG_DEBUG_SAMPLE=str(sample), PLAN_CACHE_FILE="")
+            output = subprocess.run([sys.executable, "-m", "benchmarks.bench_logging", "--rows", str(args.rows),
+                                     "--requests", str(args.requests), "--run", log.name],
+                                    env=env, capture_output=True, text=True, check=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            # Bytes written while serving, less what loading the data logged
+            served_bytes = os.path.getsize(log.name) - result["loaded_bytes"]
+        # The first round plans every question once (later ones come from the plan cache)
+        times = np.array(result["times"][2 * len(QUESTIONS):]) * 1000
+        label = level if sample >= 1 else f"{level} {sample:g}"
+        print(f"{label:16} {times.mean():11.2f} {np.percentile(times, 95):8.2f} "
+              f"{served_bytes / args.requests:18.0f} {result['load_seconds']:14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""Benchmark the whole query pipeline offline, on synthetic data and a stubbed Bedrock.
+
+Writes --rows rows of synthetic sales as monthly parquet parts (the app_v1.py
+schema) and as a CSV (the app.py schema), --chunk-rows at a time, so runs of
+tens of millions of rows fit in memory. Each app then runs in a fresh
+process: it loads its data, and --repeat times answers every recorded plan
+of benchmarks/plan_corpus.json as /api/query and a PDF export would, on cold
+caches: planning (the model is a stub answering the recorded plan after
+--bedrock-latency seconds), filtering and aggregation, drawing the chart and
+writing the PDF. The script reports the load time, the peak RSS of the
+process, requests per second and the p50/p99 of each stage in milliseconds
+(aggregate includes filter, as in the Server-Timing header).
+
+--save writes the results as JSON; --baseline compares a run with saved
+results and exits 1 when a stage, the load or the peak RSS got more than
+--tolerance slower or bigger, so regressions are caught before they ship.
+
+Run from the backend directory:
+    python -m benchmarks.bench_pipeline --rows 1000000 --save baseline.json
+    python -m benchmarks.bench_pipeline --rows 1000000 --baseline baseline.json
+"""
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.bench_loading import LocalS3
+from benchmarks.synthetic import write_csv, write_parquet_parts
+
+APPS = ["app_v1", "app"]
+STAGES = ["plan", "bedrock", "filter", "aggregate", "render", "pdf", "total"]
+CORPUS = os.path.join(os.path.dirname(__file__), "plan_corpus.json")
+# Stages this much slower (and at least MIN_REGRESSION_MS slower) than the baseline fail a --baseline run
+MIN_REGRESSION_MS = 1.0
+
+
+class StubBedrock:
+    """invoke_model answering each query of the prompt with its recorded plan, after latency seconds"""
+
+    def __init__(self, plans: dict, latency: float = 0.0):
+        self.plans = plans
+        self.latency = latency
+        self.calls = 0
+
+    def invoke_model(self, modelId, body):
+        self.calls += 1
+        prompt = json.loads(body)["messages"][0]["content"][0]["text"]
+        plan = self.plans[re.search(r'Query: "(.*)"', prompt).group(1)]
+        if self.latency:
+            time.sleep(self.latency)
+        reply = {"output": {"message": {"content": [{"text": json.dumps(plan)}]}}}
+        return {"body": io.BytesIO(json.dumps(reply).encode())}
+
+
+def load(app, directory: str):
+    if app.__name__ == "app":
+        return app.load_anandhaas_data(os.path.join(directory, "sales.csv"))
+    keys = sorted(name for name in os.listdir(directory) if name.endswith(".parquet"))
+    frame, _ = app.load_parquet_parts(LocalS3(directory), None, keys, read_options=app.PARQUET_READ)
+    return app.build_sales_store(frame)
+
+
+def peak_rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        fields = dict(line.split(":", 1) for line in f)
+    return int(fields["VmHWM"].split()[0]) / 1024
+
+
+def run_app(app_name: str, directory: str, repeat: int, bedrock_latency: float):
+    """Load and answer the corpus in this process (started by main) and print the raw timings"""
+    corpus = json.load(open(CORPUS))[app_name]
+    bedrock = StubBedrock({entry["query"]: entry["plan"] for entry in corpus}, bedrock_latency)
+    with contextlib.redirect_stdout(io.StringIO()):
+        app = importlib.import_module(app_name)
+        import metrics
+        start = time.perf_counter()
+        store = load(app, directory)
+        load_seconds = time.perf_counter() - start
+        analysis = app.snapshot_analysis(store)
+
+        stages = {stage: [] for stage in STAGES}
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for entry in corpus:
+                # Cold caches, so every request is planned by the model and computed
+                app.plan_cache.clear()
+                app.result_cache.clear()
+                metrics.start_request()
+                request_start = time.perf_counter()
+                plan = app.get_ai_plan(entry["query"], analysis, bedrock=bedrock)
+                spec = app.cached_chart_series(store, plan, "query")
+                insights = app.generate_simple_response(plan, spec["chart_data"])
+                app.pdf_bytes(app.draw_chart(spec), {"title": spec["title"], "insights": insights})
+                timings = metrics.request_timings()
+                timings["total"] = (time.perf_counter() - request_start) * 1000
+                for stage in STAGES:
+                    stages[stage].append(timings.get(stage, 0.0))
+        seconds = time.perf_counter() - start
+    print(json.dumps({"records": len(store), "load_seconds": load_seconds, "peak_mb": peak_rss_mb(),
+                      "requests": repeat * len(corpus), "throughput": repeat * len(corpus) / seconds,
+                      "model_calls": bedrock.calls, "stages": stages}))
+
+
+def summarize(raw: dict) -> dict:
+    return {"records": raw["records"], "load_seconds": raw["load_seconds"], "peak_mb": raw["peak_mb"],
+            "throughput": raw["throughput"],
+            "stages": {stage: {"p50": float(np.percentile(ms, 50)), "p99": float(np.percentile(ms, 99))}
+                       for stage, ms in raw["stages"].items()}}
+
+
+def regressions(result: dict, baseline: dict, tolerance: float) -> list:
+    """What got more than tolerance worse than the baseline, as readable lines"""
+    worse = []
+    for app_name, current in result["apps"].items():
+        before = baseline["apps"].get(app_name)
+        if before is None:
+            continue
+        for key, unit in (("load_seconds", "s"), ("peak_mb", " MB")):
+            if current[key] > before[key] * (1 + tolerance):
+                worse.append(f"{app_name} {key}: {before[key]:.2f}{unit} -> {current[key]:.2f}{unit}")
+        if current["throughput"] < before["throughput"] / (1 + tolerance):
+            worse.append(f"{app_name} throughput: {before['throughput']:.1f}/s -> {current['throughput']:.1f}/s")
+        for stage, now in current["stages"].items():
+            was = before["stages"].get(stage, {}).get("p50")
+            if was is not None and now["p50"] > was * (1 + tolerance) and now["p50"] - was >= MIN_REGRESSION_MS:
+                worse.append(f"{app_name} {stage} p50: {was:.1f}ms -> {now['p50']:.1f}ms")
+    return worse
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="100k to 50M")
+    parser.add_argument("--apps", nargs="+", choices=APPS, default=APPS)
+    parser.add_argument("--repeat", type=int, default=5, help="times the corpus is answered")
+    parser.add_argument("--chunk-rows", type=int, default=1_000_000, help="rows generated at a time")
+    parser.add_argument("--bedrock-latency", type=float, default=0.0, help="seconds the stub model takes")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare with results saved by --save")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="share a result may get worse")
+    parser.add_argument("--app", choices=APPS, help=argparse.SUPPRESS)
+    parser.add_argument("--directory", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.app:
+        return run_app(args.app, args.directory, args.repeat, args.bedrock_latency)
+
+    result = {"rows": args.rows, "repeat": args.repeat, "bedrock_latency": args.bedrock_latency, "apps": {}}
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        if "app_v1" in args.apps:
+            write_parquet_parts(directory, args.rows, parts=2, chunk_rows=args.chunk_rows)
+        if "app" in args.apps:
+            write_csv(os.path.join(directory, "sales.csv"), args.rows, chunk_rows=args.chunk_rows)
+        print(f"{args.rows:,} synthetic rows written in {time.perf_counter() - start:.1f}s; "
+              f"corpus answered {args.repeat} times per app")
+
+        for app_name in args.apps:
+            env = dict(os.environ, PLAN_CACHE_FILE="", SHARED_DATA_DIR="", DATA_START_DATE="", DATA_END_DATE="")
+            output = subprocess.run([sys.executable, "-m", "benchmarks.bench_pipeline", "--app", app_name,
+                                     "--directory", directory, "--repeat", str(args.repeat),
+                                     "--bedrock-latency", str(args.bedrock_latency)],
+                                    env=env, capture_output=True, text=True, check=True).stdout
+            raw = json.loads(output.strip().splitlines()[-1])
+            result["apps"][app_name] = summary = summarize(raw)
+            print(f"\n{app_name}: {summary['records']:,} records loaded in {summary['load_seconds']:.2f}s, "
+                  f"peak RSS {summary['peak_mb']:.0f} MB, {summary['throughput']:.1f} requests/s "
+                  f"({raw['model_calls']} of {raw['requests']} planned by the model)")
+            print(f"  {'stage':<10} {'p50 ms':>9} {'p99 ms':>9}")
+            for stage, percentiles in summary["stages"].items():
+                print(f"  {stage:<10} {percentiles['p50']:>9.1f} {percentiles['p99']:>9.1f}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["rows"] != args.rows:
+            print(f"\nthe baseline has {baseline['rows']:,} rows, this run {args.rows:,}: not comparable")
+            sys.exit(1)
+        worse = regressions(result, baseline, args.tolerance)
+        print(f"\n{len(worse)} regression(s) over {args.tolerance:.0%} against {args.baseline}" if worse
+              else f"\nno regression over {args.tolerance:.0%} against {args.baseline}")
+        for line in worse:
+            print(f"  {line}")
+        sys.exit(1 if worse else 0)
+
+
+if __name__ == "__main__":
+    main()
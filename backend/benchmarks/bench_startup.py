@@ -0,0 +1,143 @@
+"""Benchmark server start-up: importing an app, answering readiness probes and warming up.
+
+Each app is started --runs times per mode in a fresh process, with Slack
+answering auth.test from a local stub after --slack-latency seconds. The
+"eager" mode first does what importing the app used to do (load matplotlib,
+its PDF backend, boto3 and slack_sdk, then run the Slack auth test
+synchronously); "lazy" imports the app as it is now, which defers all of
+that to the background warm-up. The script reports the median of:
+  - import: seconds until the app module is imported and can serve
+  - probe: milliseconds the first GET /api/ready takes (503 while warming up)
+  - ready: seconds from that probe until /api/ready answers 200
+  - first pdf: milliseconds the first report export takes once ready
+app.py loads --rows synthetic CSV rows while warming up; app_v1.py (whose
+data is in S3) is handed the same number of synthetic parquet rows before the
+first request, so its warm-up only analyzes them.
+
+Run from the backend directory:
+    python -m benchmarks.bench_startup --slack-latency 2
+"""
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+APPS = ["app_v1", "app"]
+MODES = ["eager", "lazy"]
+HEAVY_MODULES = ["matplotlib", "slack_sdk", "boto3", "aiohttp"]
+
+
+class SlowSlack(BaseHTTPRequestHandler):
+    """Slack's auth.test, answered after latency seconds"""
+    latency = 2.0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.latency)
+        body = json.dumps({"ok": True, "user": "bench"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        # A lazy run may exit before its background Slack check is answered
+        with contextlib.suppress(BrokenPipeError, ConnectionResetError):
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def run(app_name: str, mode: str, rows: int):
+    """Start the app in this process (started by main) and print what it took"""
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if mode == "eager":
+            import boto3
+            import matplotlib.backends.backend_pdf
+            import matplotlib.figure
+            import slack_sdk
+            from clients import slack_client
+            slack_client(os.environ["SLACK_BOT_TOKEN"]).auth_test()
+        app = importlib.import_module(app_name)
+    import_seconds = time.perf_counter() - start
+    loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        if app_name == "app_v1":
+            from benchmarks.synthetic import generate_parquet_frame
+            app.anandhaas_snapshot.store = app.build_sales_store(generate_parquet_frame(rows))
+        client = app.app.test_client()
+        start = time.perf_counter()
+        probe = client.get("/api/ready")
+        probe_ms = (time.perf_counter() - start) * 1000
+        while client.get("/api/ready").status_code != 200:
+            app.warmup.wait(timeout=0.05)
+        ready_seconds = time.perf_counter() - start
+        answer = client.post("/api/query", json={"query": "revenue by branch"}).get_json()
+        start = time.perf_counter()
+        exported = client.get(f"/api/report/{answer['report_id']}.pdf")
+        pdf_ms = (time.perf_counter() - start) * 1000
+    print(json.dumps({"import": import_seconds, "loaded": loaded, "probe_ms": probe_ms, "probe_status": probe.status_code,
+                      "ready": ready_seconds, "pdf_ms": pdf_ms, "pdf_ok": exported.status_code == 200,
+                      "tasks": {name: task["seconds"] if task["state"] != "running" else "running"
+                                for name, task in app.warmup.status()["tasks"].items()}}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--apps", nargs="+", choices=APPS, default=APPS)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--slack-latency", type=float, default=2.0)
+    parser.add_argument("--app", choices=APPS, help=argparse.SUPPRESS)
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.app:
+        return run(args.app, args.mode, args.rows)
+
+    SlowSlack.latency = args.slack_latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowSlack)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    from benchmarks.synthetic import write_csv
+    with tempfile.TemporaryDirectory() as directory:
+        data_file = os.path.join(directory, "sales.csv")
+        write_csv(data_file, args.rows)
+        env = dict(os.environ, SLACK_API_URL=f"http://127.0.0.1:{server.server_port}/", SLACK_BOT_TOKEN="xoxb-bench",
+                   AWS_ACCESS_KEY_ID="bench", AWS_SECRET_ACCESS_KEY="bench", DATA_FILE=data_file,
+                   PLAN_CACHE_FILE="", SHARED_DATA_DIR="", DATA_REFRESH_SECONDS="0")
+
+        print(f"Slack answers after {args.slack_latency:g}s; {args.rows:,} rows; median of {args.runs} runs")
+        print(f"{'app':<7} {'mode':<6} {'import s':>9} {'probe ms':>9} {'ready s':>8} {'first pdf ms':>13}  "
+              f"loaded at import / warm-up task seconds")
+        failed = False
+        for app_name in args.apps:
+            for mode in MODES:
+                runs = []
+                for _ in range(args.runs):
+                    output = subprocess.run([sys.executable, "-m", "benchmarks.bench_startup", "--app", app_name,
+                                             "--mode", mode, "--rows", str(args.rows)],
+                                            env=env, capture_output=True, text=True, check=True).stdout
+                    runs.append(json.loads(output.strip().splitlines()[-1]))
+                failed |= not all(r["pdf_ok"] for r in runs)
+                median = {key: float(np.median([r[key] for r in runs])) for key in ("import", "probe_ms", "ready", "pdf_ms")}
+                tasks = ", ".join(f"{name} {seconds if isinstance(seconds, str) else f'{seconds:.2f}'}"
+                                  for name, seconds in runs[-1]["tasks"].items() if seconds is not None)
+                print(f"{app_name:<7} {mode:<6} {median['import']:>9.2f} {median['probe_ms']:>9.1f} "
+                      f"{median['ready']:>8.2f} {median['pdf_ms']:>13.0f}  "
+                      f"{','.join(runs[-1]['loaded']) or '-'} / {tasks}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
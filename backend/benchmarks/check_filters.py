@@ -0,0 +1,237 @@
+"""Check the compiled plan filters against the original pandas filter loops, and time both.
+
+Runs a corpus of plan filter lists through app_v1.apply_dynamic_filters and
+another through app.apply_filters, each against a row-by-row pandas
+reference (the filter semantics before the sales store existed), failing if
+any plan selects different rows. app.py plans are run on the raw rows and on
+the daily cube, whose matching cells must also add up to the same revenue.
+
+Run from the backend directory:
+    python -m benchmarks.check_filters --rows 1000000
+"""
+import argparse
+import contextlib
+import io
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import generate_csv_bytes, generate_parquet_frame
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import app
+    import app_v1
+
+CORPUS = [
+    [],
+    [("Branch_Name", "VV")],
+    [("Branch_Name", "vv "), ("date_month", 8)],
+    [("SK_Section", "milk")],
+    [("SK_Section", "Milk Section"), ("date_year", 2024)],
+    [("Sales Group Name", "ecom")],
+    [("Sales Group Name", "Sales - Online"), ("Branch_in", ["VV", "SK", "SBC"])],
+    [("Item Group Name", "sweets"), ("date_month_in", [7, 8])],
+    [("Item_Service_Description", "mysore pak")],
+    [("Item_Service_Description", "murukku"), ("Branch_Name", "KMR")],
+    [("Item_in", ["murukku", "mysore pak", "laddu"])],
+    [("Item_in", ["ghee roast", "no such item"]), ("date_range", ["2024-07-10", "2024-07-20"])],
+    [("date_specific", "2024-08-15")],
+    [("date_specific", "08-15"), ("Sales Group Name", "sas")],
+    [("date_specific", "not a date"), ("Branch_Name", "SK")],
+    [("date_range", ["2024-07-01 12:00", "2024-07-31"])],
+    [("date_year_in", [2023, 2024]), ("Section_in", ["Bakery", "Milk Section"])],
+    [("Item_Group_in", ["Sweets", "Kaaram"]), ("Sales_Group_in", ["Sales - Ecom"])],
+    [("date_month", 8), ("Branch_Name", "section")],
+    [("SK_Section", "section"), ("Item_Service_Description", "special"), ("date_month", 7)],
+]
+
+APP_CORPUS = [
+    [],
+    [("Branch Name", "VV")],
+    [("Branch Name", "vv"), ("date_month", 8)],
+    [("Branch Name", "v")],
+    [("Item Name", "Mysore Pak 1kg")],
+    [("Item Name", "mysore pak 1KG"), ("Branch Name", "SK")],
+    [("Item Name", "1kg mysore")],
+    [("Item Name", "Mysore Pak 1kg "), ("date_month_in", [7])],
+    [("Item Name", "no such item")],
+    [("Item_category", "murukku")],
+    [("Item_category", "Halwa"), ("Branch_in", ["VV", "SK", "SBC"])],
+    [("Item_in", ["Mysore Pak 1kg", "ABC Boli", "no such item"])],
+    [("Branch_in", ["VV", "KMR"]), ("date_range", ["2024-07-10", "2024-07-20"])],
+    [("Item_category", "ghee"), ("date_range", ["2024-07-01 12:00", "2024-07-31"])],
+    [("date_specific", "2024-08-15"), ("Item Name", "murukku")],
+    [("date_specific", "08-15")],
+    [("date_specific", "not a date"), ("Branch Name", "SK")],
+    [("date_year_in", [2023, 2024]), ("date_month_in", [7, 8]), ("Item_category", "mixture")],
+    [("date_year", 2024), ("Item Name", "butter"), ("Item Name", "murukku")],
+]
+
+IN_COLUMNS = {
+    "Branch_in": "Branch_Name",
+    "Section_in": "SK_Section",
+    "Item_in": "Item_Service_Description",
+    "Item_Group_in": "Item Group Name",
+    "Sales_Group_in": "Sales Group Name",
+}
+
+
+def reference_rows(df: pd.DataFrame, filters: list) -> np.ndarray:
+    """Row positions kept by the original DataFrame filter loop"""
+    data = df
+    for filter_type, value in filters:
+        dates = data["Date"]
+        if filter_type == "date_month":
+            data = data[dates.dt.month == int(value)]
+        elif filter_type == "date_month_in":
+            data = data[dates.dt.month.isin([int(m) for m in value])]
+        elif filter_type == "date_specific":
+            try:
+                if len(value.split("-")) == 2:
+                    value = f"2024-{value}"
+                data = data[dates.dt.date == pd.to_datetime(value).date()]
+            except Exception:
+                continue
+        elif filter_type == "date_range":
+            data = data[(dates >= pd.to_datetime(value[0])) & (dates <= pd.to_datetime(value[1]))]
+        elif filter_type == "date_year":
+            data = data[dates.dt.year == int(value)]
+        elif filter_type == "date_year_in":
+            data = data[dates.dt.year.isin([int(y) for y in value])]
+        elif filter_type in IN_COLUMNS.values():
+            term = str(value).lower().strip()
+            contains = data[filter_type].astype(str).str.contains(term, case=False, na=False)
+            if filter_type == "Item_Service_Description":
+                data = data[contains]
+            else:
+                exact = data[data[filter_type].astype(str).str.lower().str.strip() == term]
+                data = exact if not exact.empty else data[contains]
+        elif filter_type == "Item_in":
+            col = IN_COLUMNS[filter_type]
+            hits = np.zeros(len(data), dtype=bool)
+            for term in value:
+                hits |= data[col].astype(str).str.contains(str(term).lower().strip(), case=False, na=False).to_numpy()
+            data = data[hits]
+        elif filter_type in IN_COLUMNS:
+            col = IN_COLUMNS[filter_type]
+            data = data[data[col].notna() & data[col].astype(str).isin([str(v) for v in value])]
+    return data.index.to_numpy()
+
+
+def app_reference_rows(df: pd.DataFrame, filters: list) -> np.ndarray:
+    """Row positions kept by app.py's original DataFrame filter loop"""
+    data = df
+    for filter_type, value in filters:
+        dates = data["Date"]
+        if filter_type == "date_month":
+            data = data[dates.dt.month == int(value)]
+        elif filter_type == "date_month_in":
+            data = data[dates.dt.month.isin([int(m) for m in value])]
+        elif filter_type == "date_specific":
+            try:
+                if len(value.split("-")) == 2:
+                    value = f"{pd.Timestamp.now().year}-{value}"
+                data = data[dates.dt.date == pd.to_datetime(value).date()]
+            except Exception:
+                continue
+        elif filter_type == "date_range":
+            data = data[(dates >= pd.to_datetime(value[0])) & (dates <= pd.to_datetime(value[1]))]
+        elif filter_type == "date_year":
+            data = data[dates.dt.year == int(value)]
+        elif filter_type == "date_year_in":
+            data = data[dates.dt.year.isin([int(y) for y in value])]
+        elif filter_type in ["Item Name", "Branch Name"]:
+            data = data.dropna(subset=[filter_type])
+            names = data[filter_type].astype(str).str.lower()
+            exact = data[names == str(value).lower()]
+            if exact.empty:
+                # Every word of the value must be in the name
+                for word in str(value).lower().split():
+                    data = data[data[filter_type].astype(str).str.lower().str.contains(word, case=False, na=False)]
+            else:
+                data = exact
+        elif filter_type == "Item_category":
+            data = data.dropna(subset=["Item Name"])
+            data = data[data["Item Name"].astype(str).str.contains(str(value), case=False, na=False)]
+        elif filter_type in ["Item_in", "Branch_in"]:
+            col = "Item Name" if filter_type == "Item_in" else "Branch Name"
+            data = data.dropna(subset=[col])
+            data = data[data[col].astype(str).isin([str(v) for v in value])]
+    return data.index.to_numpy()
+
+
+def plain_rows(store) -> pd.DataFrame:
+    """Every row of a store as a plain DataFrame (text columns as objects), as the original loops saw them"""
+    frame = store.take(np.arange(len(store)))
+    for col in frame.columns:
+        if isinstance(frame[col].dtype, pd.CategoricalDtype):
+            frame[col] = frame[col].astype(object)
+    return frame.reset_index(drop=True)
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    df = generate_parquet_frame(args.rows)
+    df["Date"] = pd.to_datetime(df["Date"])
+    with contextlib.redirect_stdout(io.StringIO()):
+        store = app_v1.build_sales_store(df.copy())
+
+    failures = 0
+    print(f"app_v1.py\n{'filters':<72} {'rows':>9} {'pandas ms':>10} {'compiled ms':>12}")
+    for filters in CORPUS:
+        reference_ms, expected = timed(lambda: reference_rows(df, filters), args.repeat)
+
+        def compiled():
+            try:
+                return app_v1.apply_dynamic_filters(store, filters)
+            except ValueError:
+                return np.empty(0, dtype=np.int64)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            compiled_ms, rows = timed(compiled, args.repeat)
+        same = np.array_equal(np.sort(expected), rows)
+        failures += not same
+        label = str(filters)[:70]
+        print(f"{label:<72} {len(rows):>9,} {reference_ms:>10.1f} {compiled_ms:>12.1f}{'' if same else '  MISMATCH'}")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        app_store = app.build_sales_store(pd.read_csv(io.BytesIO(generate_csv_bytes(args.rows)), quotechar='"'))
+    sources = {"rows": (app_store, plain_rows(app_store)), "cube": (app_store.cube, plain_rows(app_store.cube))}
+    print(f"\napp.py\n{'filters':<65} {'source':<6} {'rows':>9} {'pandas ms':>10} {'compiled ms':>12}")
+    for filters in APP_CORPUS:
+        revenue = {}
+        for name, (source, frame) in sources.items():
+            reference_ms, expected = timed(lambda: app_reference_rows(frame, filters), args.repeat)
+            with contextlib.redirect_stdout(io.StringIO()):
+                compiled_ms, rows = timed(lambda: app.apply_filters(source, filters), args.repeat)
+            revenue[name] = frame["Total Amount"].to_numpy()[rows].sum()
+            same = np.array_equal(np.sort(expected), rows)
+            if name == "cube":
+                same &= bool(np.isclose(revenue["cube"], revenue["rows"], rtol=1e-6))
+            failures += not same
+            label = str(filters)[:63]
+            print(f"{label:<65} {name:<6} {len(rows):>9,} {reference_ms:>10.1f} {compiled_ms:>12.1f}"
+                  f"{'' if same else '  MISMATCH'}")
+
+    plans = len(CORPUS) + 2 * len(APP_CORPUS)
+    print(f"{plans - failures}/{plans} plans match the reference")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
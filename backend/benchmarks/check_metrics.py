@@ -0,0 +1,151 @@
+"""Check the per-request stage timings and the /metrics endpoint.
+
+/api/query must answer with a Server-Timing header naming its planning,
+filtering and aggregation stages (no aggregation when the result cache
+answers), report exports must time their drawing and PDF, and
+/api/voice-query must end with the timings of its transcription and of the
+data analysis run in the prefetch thread. The ASGI routes must send the same
+header. /metrics must count every stage and request in valid Prometheus
+histograms. Finally the script measures what one span costs.
+
+Run from the backend directory:
+    python -m benchmarks.check_metrics
+"""
+import argparse
+import contextlib
+import io
+import os
+import re
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+os.environ.setdefault("PLAN_CACHE_FILE", "")
+
+from benchmarks.check_slack_delivery import FakeSlack
+from benchmarks.check_transcribe import FakeSTT, speech_wav
+from benchmarks.check_voice_query import read_events
+from benchmarks.synthetic import generate_parquet_frame
+
+SAMPLE = re.compile(r'^(\w+)(?:\{(.*)\})? (\S+)$')
+
+
+def stages(header: str) -> dict:
+    """Milliseconds per stage of a Server-Timing header"""
+    return {name: float(dur) for name, dur in re.findall(r"([\w-]+);dur=([\d.]+)", header or "")}
+
+
+def parse_metrics(text: str) -> dict:
+    """{(name, labels string): value} of a Prometheus text exposition"""
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, labels, value = SAMPLE.match(line).groups()
+            samples[(name, labels or "")] = float(value)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--spans", type=int, default=200_000)
+    args = parser.parse_args()
+
+    FakeSTT.latency = 0.2
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeSTT)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ.update(SARVAM_STT_URL=f"http://127.0.0.1:{server.server_port}/speech-to-text", SARVAM_API_KEY="check")
+    # The warm-up checks Slack's auth.test, answered here instead of by slack.com
+    slack = ThreadingHTTPServer(("127.0.0.1", 0), FakeSlack)
+    threading.Thread(target=slack.serve_forever, daemon=True).start()
+    os.environ.update(SLACK_API_URL=f"http://127.0.0.1:{slack.server_port}/api/", SLACK_BOT_TOKEN="xoxb-check")
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app_v1
+        import metrics
+        from data_refresh import DataSnapshot
+        frame = generate_parquet_frame(args.rows)
+        # Start-up warm-up done first, so it does not analyze the store below before the first query does
+        app_v1.anandhaas_snapshot.store = app_v1.build_sales_store(frame.copy())
+        app_v1.warmup.start()
+        app_v1.warmup.wait()
+        app_v1.anandhaas_snapshot.store = app_v1.build_sales_store(frame.copy())
+    client = app_v1.app.test_client()
+    failed = []
+
+    def check(label, ok):
+        print(f"{'ok  ' if ok else 'FAIL'} {label}")
+        if not ok:
+            failed.append(label)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        first = client.post("/api/query", json={"query": "top 10 items in VV"}, headers={"Origin": "http://localhost:3000"})
+        again = client.post("/api/query", json={"query": "show the top 10 items for VV"})
+    timed = stages(first.headers.get("Server-Timing"))
+    print(f"     /api/query Server-Timing: {first.headers.get('Server-Timing')}")
+    check("/api/query times planning, analysis, filtering and aggregation",
+          {"analysis", "plan", "filter", "aggregate", "total"} <= timed.keys())
+    check("stages take no longer than the request", max(timed.values()) == timed["total"])
+    check("a result cache hit has no aggregation stage", "aggregate" not in stages(again.headers.get("Server-Timing")))
+    check("the header is readable by the frontend",
+          "server-timing" in first.headers.get("Access-Control-Expose-Headers", "").lower())
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        exported = client.get(f"/api/report/{first.json['report_id']}.pdf")
+    check("a PDF export times the drawing and the PDF",
+          exported.status_code == 200 and {"export_pdf", "render", "pdf"} <= stages(exported.headers["Server-Timing"]).keys())
+
+    # A cold snapshot, so the prefetch thread builds the store and analyzes it while the audio is transcribed
+    app_v1.anandhaas_snapshot = DataSnapshot(lambda: app_v1.build_sales_store(frame.copy()), lambda old: old)
+    with contextlib.redirect_stdout(io.StringIO()):
+        response = client.post("/api/voice-query", data={"audio": (io.BytesIO(speech_wav([["revenue", "by", "branch"]])),
+                                                                    "audio.wav")}, buffered=False)
+        events = {name: data for _, name, data in read_events(response, time.perf_counter())}
+    timings = events.get("done", {}).get("timings", {})
+    print(f"     /api/voice-query done: {timings}")
+    check("/api/voice-query reports transcription, the prefetched analysis and planning",
+          {"transcribe", "analysis", "plan"} <= timings.keys() and timings["transcribe"] >= 200)
+
+    try:
+        from starlette.testclient import TestClient
+    except ImportError:
+        TestClient = None
+    if TestClient is None:
+        print("skip ASGI mode (starlette's TestClient needs httpx)")
+    else:
+        with contextlib.redirect_stdout(io.StringIO()):
+            import asgi
+            asgi.flask_app.anandhaas_snapshot = app_v1.anandhaas_snapshot
+            with TestClient(asgi.app) as asgi_client:
+                native = asgi_client.post("/api/query", json={"query": "sales by section in august"})
+        check("the ASGI routes send the same header",
+              native.status_code == 200 and {"plan", "aggregate", "total"} <= stages(native.headers.get("server-timing")).keys())
+
+    samples = parse_metrics(client.get("/metrics").get_data(as_text=True))
+    histograms = {}
+    for (name, labels), value in samples.items():
+        if name.endswith("_bucket"):
+            series = re.sub(r',?le="[^"]*"', "", labels)
+            histograms.setdefault((name[:-len("_bucket")], series), []).append(value)
+    valid = all(counts == sorted(counts) and counts[-1] == samples[(name + "_count", series)]
+                for (name, series), counts in histograms.items())
+    check(f"/metrics has {len(histograms)} valid histograms", histograms and valid)
+    check("every stage is counted", all(samples.get(("anandhaas_stage_seconds_count", f'stage="{stage}"'), 0) >= 1
+                                        for stage in ("plan", "filter", "aggregate", "render", "pdf", "transcribe")))
+    check("requests are counted per endpoint and status",
+          samples.get(("anandhaas_requests_total", 'endpoint="/api/query",status="200"'), 0) >= 2)
+    check("cache lookups are exported",
+          samples.get(("anandhaas_cache_lookups_total", 'cache="result",endpoint="query",result="hit"'), 0) >= 1)
+
+    start = time.perf_counter()
+    for _ in range(args.spans):
+        with metrics.span("overhead"):
+            pass
+    print(f"\none span costs {(time.perf_counter() - start) / args.spans * 1e6:.1f} µs")
+
+    print(f"{len(failed)} check(s) failed" if failed else "all checks passed")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
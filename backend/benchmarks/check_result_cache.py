@@ -0,0 +1,142 @@
+"""Check the chart result cache and measure what a hit saves.
+
+Differently worded questions that plan the same chart, and plans that only
+differ in title, must share one cached result and get exactly the series
+chart_series computes, each under its own title. Plans whose filters differ
+in order are cached apart, as the order can change the rows selected. A refresh must
+drop the results of the old snapshot, the cache must stay within its byte
+bound, and /api/query and /api/voice-query must be counted separately.
+
+Then every plan of check_shared_data is answered on --rows rows, once
+computed and once from the cache, and the script reports the time of each.
+
+Run from the backend directory:
+    python -m benchmarks.check_result_cache --rows 2000000
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+os.environ.setdefault("PLAN_CACHE_FILE", "")
+
+import numpy as np
+
+from benchmarks.check_shared_data import PLANS
+from benchmarks.synthetic import generate_parquet_frame
+from result_cache import ResultCache
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import app_v1
+
+QUESTIONS = [
+    ["top 10 items in VV", "Top 10 items in vv?", "show the top 10 items for VV"],
+    ["revenue by branch", "branch revenue"],
+    ["sales by section in august"],
+]
+
+
+def same_series(a: dict, b: dict) -> bool:
+    return json.dumps(a, sort_keys=True, default=str) == json.dumps(b, sort_keys=True, default=str)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    failed = []
+
+    def check(label, ok):
+        print(f"{'ok  ' if ok else 'FAIL'} {label}")
+        if not ok:
+            failed.append(label)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        store = app_v1.build_sales_store(generate_parquet_frame(200_000))
+        app_v1.anandhaas_snapshot.store = store
+        client = app_v1.app.test_client()
+        answers = [[client.post("/api/query", json={"query": q}).get_json() for q in group] for group in QUESTIONS]
+    stats = app_v1.result_cache.stats()
+    check(f"{sum(map(len, QUESTIONS))} questions planning {len(QUESTIONS)} charts compute {stats['misses']} results",
+          stats["misses"] == stats["entries"] == len(QUESTIONS))
+    with contextlib.redirect_stdout(io.StringIO()):
+        plans = [app_v1.get_ai_plan(group[0], app_v1.snapshot_analysis(store)) for group in QUESTIONS]
+        fresh = [app_v1.chart_series(store, plan) for plan in plans]
+    check("every answer has the data chart_series computes",
+          all(answer["data"] == spec["chart_data"] for group, spec in zip(answers, fresh) for answer in group))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        plan = dict(PLANS[2], title="Murukku in August")
+        retitled = dict(plan, title="August murukku")
+        first = app_v1.cached_chart_series(store, plan, "query")
+        hits = app_v1.result_cache.stats()["hits"]
+        second = app_v1.cached_chart_series(store, retitled, "query")
+    check("the title is not part of the key",
+          same_series(dict(first, title=None), dict(second, title=None)) and app_v1.result_cache.stats()["hits"] == hits + 1)
+    check("each result keeps its own plan's title", (first["title"], second["title"]) == (plan["title"], retitled["title"]))
+    with contextlib.redirect_stdout(io.StringIO()):
+        misses = app_v1.result_cache.stats()["misses"]
+        app_v1.cached_chart_series(store, dict(plan, filters=list(reversed(plan["filters"]))), "query")
+    check("filters in another order are a different result", app_v1.result_cache.stats()["misses"] == misses + 1)
+    with contextlib.redirect_stdout(io.StringIO()):
+        other = app_v1.cached_chart_series(store, dict(plan, limit=5), "query")
+    check("a different limit is a different result", len(other["chart_data"]) == 5 < len(first["chart_data"]))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        refreshed = store.append(app_v1.build_sales_store(generate_parquet_frame(10_000, start="2024-09-01", days=5, seed=1)))
+        app_v1.anandhaas_snapshot.store = refreshed
+        after = client.post("/api/query", json={"query": QUESTIONS[1][0]}).get_json()
+        expected = app_v1.chart_series(refreshed, plans[1])["chart_data"]
+    stats = app_v1.result_cache.stats()
+    check("a refresh drops the old snapshot's results",
+          stats["invalidations"] == 1 and stats["entries"] == 1 and stats["data_version"] == refreshed.version)
+    check("the refreshed data is answered", after["data"] == expected and after["data"] != answers[1][0]["data"])
+    with contextlib.redirect_stdout(io.StringIO()):
+        app_v1.cached_chart_series(store, plans[0], "query")
+    check("results of an older snapshot still answering are not kept", app_v1.result_cache.stats()["entries"] == 1)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        app_v1.result_cache.clear()
+        app_v1.cached_chart_series(refreshed, plans[0], "voice-query")
+        app_v1.cached_chart_series(refreshed, plans[0], "voice-query")
+    endpoints = client.get("/api/result-cache").get_json()["endpoints"]
+    check("hits are counted per endpoint", endpoints["voice-query"] == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+          and endpoints["query"]["misses"] > 0)
+
+    small = ResultCache(app_v1.result_cache.fields, max_bytes=20_000)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for limit in range(1, 60):
+            small.get(refreshed, dict(plans[0], limit=limit), lambda: app_v1.chart_series(refreshed, dict(plans[0], limit=limit)))
+    stats = small.stats()
+    check(f"the byte bound holds ({stats['entries']} results in {stats['bytes']} bytes)",
+          0 < stats["bytes"] <= stats["max_bytes"] and stats["entries"] < 59)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        store = app_v1.build_sales_store(generate_parquet_frame(args.rows))
+    print(f"\n{args.rows} rows, median of {args.repeat}")
+    print(f"{'plan':60} {'computed':>9} {'cached':>9}")
+    for plan in PLANS:
+        cache = ResultCache(app_v1.result_cache.fields)
+        times = {"computed": [], "cached": []}
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                app_v1.chart_series(store, plan)
+                times["computed"].append(time.perf_counter() - start)
+                cache.get(store, plan, lambda: app_v1.chart_series(store, plan))
+                start = time.perf_counter()
+                cache.get(store, plan, lambda: app_v1.chart_series(store, plan))
+                times["cached"].append(time.perf_counter() - start)
+        label = json.dumps({k: v for k, v in plan.items() if k != "chart_type"})[:60]
+        print(f"{label:60} {np.median(times['computed']) * 1000:7.2f}ms {np.median(times['cached']) * 1000:7.3f}ms")
+
+    print(f"{len(failed)} check(s) failed" if failed else "all checks passed")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
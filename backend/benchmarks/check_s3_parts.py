@@ -0,0 +1,160 @@
+"""Check how app_v1.py loads and refreshes its S3 parquet parts against a stubbed S3.
+
+The stub holds two monthly parts in memory and can change a part's ETag,
+delete a part, fail HEAD requests or fail downloads per key. First the
+local snapshot of load_parquet_parts: a part whose ETag is unchanged is read
+from disk, a changed one is downloaded, a failed HEAD falls back to the
+snapshot and a corrupt snapshot is downloaded again. Then the app starts
+from a full load and refreshes after each change: an unchanged bucket keeps
+the store, a failed HEAD keeps the current data instead of reloading, a
+changed ETag reloads everything, a reload that misses a part is not
+published, and a deleted part drops its rows.
+
+Run from the backend directory:
+    python -m benchmarks.check_s3_parts
+"""
+import argparse
+import contextlib
+import glob
+import io
+import os
+import sys
+import tempfile
+
+from benchmarks.synthetic import generate_parquet_frame
+
+KEYS = ["parts/july.parquet", "parts/august.parquet"]
+
+
+class S3Error(Exception):
+    """Shaped like botocore's ClientError: the error code is in response["Error"]["Code"]"""
+
+    def __init__(self, code: str):
+        super().__init__(f"An error occurred ({code})")
+        self.response = {"Error": {"Code": code}}
+
+
+class StubS3:
+    """get_object/head_object over parts held in memory, failing on request"""
+
+    def __init__(self):
+        self.parts = {}
+        self.failing_head = set()
+        self.failing_get = set()
+        self.gets = 0
+
+    def put(self, key: str, frame):
+        version = self.parts[key][1] + 1 if key in self.parts else 1
+        buffer = io.BytesIO()
+        frame.to_parquet(buffer, index=False)
+        self.parts[key] = (buffer.getvalue(), version)
+
+    def etag(self, key: str) -> str:
+        return f'"{key}-v{self.parts[key][1]}"'
+
+    def head_object(self, Bucket, Key):
+        if Key in self.failing_head:
+            raise ConnectionError("connection reset by peer")
+        if Key not in self.parts:
+            raise S3Error("404")
+        return {"ETag": self.etag(Key)}
+
+    def get_object(self, Bucket, Key):
+        if Key in self.failing_get:
+            raise ConnectionError("connection reset by peer")
+        if Key not in self.parts:
+            raise S3Error("NoSuchKey")
+        self.gets += 1
+        return {"Body": io.BytesIO(self.parts[Key][0]), "ETag": self.etag(Key)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20_000, help="rows per part")
+    args = parser.parse_args()
+
+    failed = []
+
+    def check(label, ok):
+        print(f"{'ok  ' if ok else 'FAIL'} {label}")
+        if not ok:
+            failed.append(label)
+
+    s3 = StubS3()
+    july = generate_parquet_frame(args.rows, start="2024-07-01", days=31, seed=1)
+    august = generate_parquet_frame(args.rows, start="2024-08-01", days=31, seed=2)
+    s3.put(KEYS[0], july)
+    s3.put(KEYS[1], august)
+
+    from s3_loader import load_parquet_parts
+    with tempfile.TemporaryDirectory() as cache_dir, contextlib.redirect_stdout(io.StringIO()):
+        def load():
+            gets = s3.gets
+            frame, _ = load_parquet_parts(s3, "bucket", KEYS, cache_dir=cache_dir)
+            return (0 if frame is None else len(frame)), s3.gets - gets
+
+        first = load()
+        unchanged = load()
+        s3.put(KEYS[0], july)
+        changed = load()
+        s3.failing_head = {KEYS[0], KEYS[1]}
+        head_failed = load()
+        s3.failing_head = set()
+        for path in glob.glob(os.path.join(cache_dir, "*.parquet")):
+            with open(path, "r+b") as f:
+                f.write(b"not a parquet file")
+        corrupt = load()
+        repaired = load()
+
+    check("first load downloads every part", first == (2 * args.rows, 2))
+    check("unchanged ETags are read from the local snapshot", unchanged == (2 * args.rows, 0))
+    check("a changed ETag downloads only that part", changed == (2 * args.rows, 1))
+    check("a failed HEAD falls back to the local snapshot", head_failed == (2 * args.rows, 0))
+    check("a corrupt snapshot is downloaded again instead of skipped", corrupt == (2 * args.rows, 2))
+    check("the downloaded copy replaces the corrupt snapshot", repaired == (2 * args.rows, 0))
+
+    with tempfile.TemporaryDirectory() as cache_dir, contextlib.redirect_stdout(io.StringIO()):
+        os.environ.update(S3_CACHE_DIR=cache_dir, S3_PREFIX="", PLAN_CACHE_FILE="", SHARED_DATA_DIR="",
+                          DATA_REFRESH_SECONDS="0")
+        import app_v1
+        app_v1.S3_KEYS = KEYS
+        app_v1.aws_client = lambda service: s3
+
+        store = app_v1.load_anandhaas_data()
+        loaded = store is not None and len(store) == 2 * args.rows and set(store.sources) == set(KEYS)
+
+        gets = s3.gets
+        unchanged = app_v1.refresh_anandhaas_data(store)
+        unchanged_ok = unchanged is store and s3.gets == gets
+
+        s3.failing_head = {KEYS[0]}
+        head_failed = app_v1.refresh_anandhaas_data(store)
+        head_failed_ok = head_failed is store and s3.gets == gets
+        s3.failing_head = set()
+
+        s3.put(KEYS[1], august.head(args.rows // 2))
+        s3.failing_get = {KEYS[1]}
+        partial = app_v1.refresh_anandhaas_data(store)
+        partial_ok = partial is store
+        s3.failing_get = set()
+
+        changed = app_v1.refresh_anandhaas_data(store)
+        changed_ok = (changed is not store and len(changed) == args.rows + args.rows // 2
+                      and changed.sources[KEYS[1]] == s3.etag(KEYS[1]))
+
+        del s3.parts[KEYS[0]]
+        deleted = app_v1.refresh_anandhaas_data(changed)
+        deleted_ok = deleted is not changed and len(deleted) == args.rows // 2 and set(deleted.sources) == {KEYS[1]}
+
+    check(f"full load reads both parts ({2 * args.rows:,} rows)", loaded)
+    check("refresh of an unchanged bucket keeps the store and downloads nothing", unchanged_ok)
+    check("a failed HEAD keeps the current data instead of reloading", head_failed_ok)
+    check("a reload that misses a part is not published", partial_ok)
+    check("a changed ETag reloads every part", changed_ok)
+    check("a deleted part (404) drops its rows", deleted_ok)
+    print(f"{len(failed)} check(s) failed" if failed else "all checks passed")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""Check the shared-memory dataset and measure memory with several server processes.
+
+A store published by SharedSnapshot must answer every plan filter list of
+check_filters and a set of chart plans exactly like the store it was built
+from, with its columns mapped from the segment rather than copied. A second
+snapshot on the same directory (standing in for another worker) attaches
+without loading, and switches to the new segment when the first one
+refreshes, while stores still in use keep working after their segment is
+deleted.
+
+Then --workers processes each get the data, once loading it themselves and
+once attaching to a published segment, and the script reports their load
+time and memory: the private memory of each process plus the segment, which
+is in memory once for all of them.
+
+Run from the backend directory:
+    python -m benchmarks.check_shared_data --rows 1000000 --workers 4
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.check_filters import CORPUS
+from benchmarks.synthetic import generate_parquet_frame
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import app_v1
+    from shared_data import SharedSnapshot
+
+PLANS = [
+    {"chart_type": "bar", "x_axis": "Branch_Name", "y_axis": "Row_Total", "aggregation": "sum"},
+    {"chart_type": "pie", "x_axis": "SK_Section", "y_axis": "Quantity_Inventory_UoM", "aggregation": "sum",
+     "filters": [["Branch_Name", "VV"]]},
+    {"chart_type": "bar", "x_axis": "Item_Service_Description", "y_axis": "Row_Total", "aggregation": "sum",
+     "limit": 10, "filters": [["Item_Service_Description", "murukku"], ["date_month", 8]]},
+    {"chart_type": "line", "x_axis": "Date", "y_axis": "Row_Total", "aggregation": "sum",
+     "filters": [["Sales Group Name", "ecom"]]},
+    {"chart_type": "bar", "x_axis": "Branch_Name", "y_axis": "Row_Total", "dual_metrics": True,
+     "y_axis_secondary": "Quantity_Inventory_UoM", "filters": [["Item Group Name", "sweets"]]},
+]
+
+
+def is_mapped(array) -> bool:
+    while array is not None:
+        if isinstance(array, np.memmap):
+            return True
+        array = array.base
+    return False
+
+
+def selected(store, filters: list) -> np.ndarray:
+    try:
+        return app_v1.apply_dynamic_filters(store, filters)
+    except ValueError:
+        return np.empty(0, dtype=np.int64)
+
+
+def private_mb(pid: int, exclude: str) -> float:
+    """Memory only this process holds, leaving out its mappings of files under exclude"""
+    total, skip = 0, False
+    with open(f"/proc/{pid}/smaps") as f:
+        for line in f:
+            fields = line.split()
+            if "-" in fields[0] and not fields[0].endswith(":"):
+                skip = len(fields) >= 6 and fields[5].startswith(exclude)
+            elif fields[0] in ("Private_Clean:", "Private_Dirty:") and not skip:
+                total += int(fields[1])
+    return total / 1024
+
+
+def directory_mb(path: str) -> float:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names) / 1e6
+
+
+def worker(mode: str, rows: int, directory: str):
+    """Get the data as one server process would, run the chart plans, report and wait to be measured"""
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if mode == "private":
+            store = app_v1.build_sales_store(generate_parquet_frame(rows))
+        else:
+            store = SharedSnapshot(None, lambda store: store, directory, watch=0).get()
+        loaded = time.perf_counter() - start
+        for plan in PLANS:
+            app_v1.chart_series(store, plan)
+    print(json.dumps({"records": len(store), "load": loaded}), flush=True)
+    sys.stdin.read()
+
+
+def run_workers(mode: str, workers: int, rows: int, directory: str) -> dict:
+    processes = [subprocess.Popen([sys.executable, "-m", "benchmarks.check_shared_data", "--worker", mode,
+                                   "--rows", str(rows), "--directory", directory],
+                                  stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+                 for _ in range(workers)]
+    try:
+        reports = [json.loads(process.stdout.readline()) for process in processes]
+        private = [private_mb(process.pid, directory) for process in processes]
+    finally:
+        for process in processes:
+            process.stdin.close()
+            process.wait()
+    return {"records": {r["records"] for r in reports}, "load": float(np.median([r["load"] for r in reports])),
+            "private": float(np.mean(private)), "total": float(np.sum(private))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--worker", choices=["private", "shared"], help=argparse.SUPPRESS)
+    parser.add_argument("--directory", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        return worker(args.worker, args.rows, args.directory)
+
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    directory = tempfile.mkdtemp(prefix="shared-data-", dir=base)
+    directories = [directory]
+    failed = []
+
+    def check(label, ok):
+        print(f"{'ok  ' if ok else 'FAIL'} {label}")
+        if not ok:
+            failed.append(label)
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            frame = generate_parquet_frame(args.rows)
+            store = app_v1.build_sales_store(frame.copy())
+            extra = app_v1.build_sales_store(generate_parquet_frame(args.rows // 10, start="2024-09-01", days=10, seed=1))
+        loads = []
+        appended = []
+
+        def load():
+            loads.append(1)
+            return store
+
+        def refresh(current):
+            if appended:
+                return current
+            appended.append(1)
+            return current.append(extra)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            first = SharedSnapshot(load, lambda current: current, directory, watch=0.1)
+            mapped = first.get()
+        check("first process loads once and publishes", len(loads) == 1 and first.segment is not None)
+        arrays = [mapped.codes(col) if mapped.is_categorical(col) else mapped.frame[col].to_numpy()
+                  for col in mapped.frame.columns]
+        arrays += [mapped.days, mapped.cube.days] + [index.order for index in mapped.indexes.values()]
+        check("columns, days, text indexes and cube are mapped from the segment", all(map(is_mapped, arrays)))
+        check("mapped text indexes share the codes column",
+              all(np.shares_memory(index.codes, mapped.codes(col)) for col, index in mapped.indexes.items()))
+        with contextlib.redirect_stdout(io.StringIO()):
+            same_rows = all(np.array_equal(selected(store, filters), selected(mapped, filters)) for filters in CORPUS)
+            specs = [(app_v1.chart_series(store, plan), app_v1.chart_series(mapped, plan)) for plan in PLANS]
+        check("every filter list selects the same rows", same_rows)
+        check("chart plans give the same series",
+              all(json.dumps(a, sort_keys=True, default=str) == json.dumps(b, sort_keys=True, default=str)
+                  for a, b in specs))
+        check("analysis is the same", json.dumps(app_v1.analyze_anandhaas_structure(store), default=str)
+              == json.dumps(app_v1.analyze_anandhaas_structure(mapped), default=str))
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            second = SharedSnapshot(load, lambda current: current, directory, watch=0.1)
+            before = second.get()
+        check("second process attaches without loading", len(loads) == 1 and second.segment == first.segment)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            first._refresh = refresh
+            status = first.refresh()
+            deadline = time.time() + 5
+            while second.segment != first.segment and time.time() < deadline:
+                time.sleep(0.05)
+        check(f"refresh publishes {status['records']} records and the other process switches to them",
+              status["refreshed"] and len(second.get()) == len(store) + len(extra))
+        check("the switch leaves the store a request already holds unchanged", len(before) == len(store))
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(2):
+                appended.clear()
+                first.refresh()
+        segments = [name for name in os.listdir(directory) if name.startswith("segment-")]
+        check(f"replaced segments are deleted ({len(segments)} kept)", len(segments) == 2)
+        with contextlib.redirect_stdout(io.StringIO()):
+            same_rows = np.array_equal(selected(before, CORPUS[3]), selected(store, CORPUS[3]))
+        check("a store whose segment was deleted still answers", same_rows)
+        del first, second, mapped, before, arrays, specs
+
+        # A fresh directory, so the snapshots above have nothing to switch to
+        directory = tempfile.mkdtemp(prefix="shared-data-", dir=base)
+        directories.append(directory)
+        with contextlib.redirect_stdout(io.StringIO()):
+            SharedSnapshot(lambda: app_v1.build_sales_store(frame), None, directory, watch=0).get()
+        segment_mb = directory_mb(directory)
+
+        print(f"\n{args.workers} processes, {args.rows} rows")
+        print(f"{'mode':8} {'load':>7} {'private/proc':>13} {'segment':>8} {'total':>8}")
+        results = {}
+        for mode in ("private", "shared"):
+            results[mode] = result = run_workers(mode, args.workers, args.rows, directory)
+            shared = segment_mb if mode == "shared" else 0
+            print(f"{mode:8} {result['load']:6.2f}s {result['private']:10.0f} MB {shared:5.0f} MB "
+                  f"{result['total'] + shared:5.0f} MB")
+        check("every process sees every record", results["private"]["records"] == results["shared"]["records"] == {args.rows})
+        check("shared processes use less memory in total",
+              results["shared"]["total"] + segment_mb < results["private"]["total"])
+    finally:
+        for directory in directories:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    print(f"{len(failed)} check(s) failed" if failed else "all checks passed")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Check queued Slack delivery against a local fake Slack API.
+
+The fake server speaks the three calls files_upload_v2 makes
+(files.getUploadURLExternal, the upload itself, files.completeUploadExternal)
+and fails on purpose per channel: CRATE is rate limited twice with a
+Retry-After, C500 answers 500 once, CBAD does not exist. Every upload also
+takes --latency seconds, to show /api/send-to-slack answering before Slack does.
+
+Run from the backend directory:
+    python -m benchmarks.check_slack_delivery
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from benchmarks.synthetic import generate_parquet_frame
+
+FAILURES = {"CRATE": [(429, {"Retry-After": "1"}, {"ok": False, "error": "ratelimited"})] * 2,
+            "C500": [(500, {}, {"ok": False, "error": "internal_error"})]}
+
+
+class FakeSlack(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    latency = 0.0
+    calls = Counter()
+    uploads = Counter()
+    lock = threading.Lock()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path == "/api/auth.test":
+            return self.reply(200, {}, {"ok": True})
+        if self.path == "/api/files.getUploadURLExternal":
+            host = self.headers["Host"]
+            return self.reply(200, {}, {"ok": True, "file_id": "F1", "upload_url": f"http://{host}/upload/F1"})
+        if self.path.startswith("/upload/"):
+            time.sleep(self.latency)
+            return self.reply(200, {}, None)
+        if self.path == "/api/files.completeUploadExternal":
+            params = parse_qs(body.decode())
+            channel = params.get("channel_id", [""])[0]
+            with self.lock:
+                FakeSlack.calls[channel] += 1
+                failures = FAILURES.get(channel, [])
+                attempt = FakeSlack.calls[channel]
+            if attempt <= len(failures):
+                return self.reply(*failures[attempt - 1])
+            if channel == "CBAD":
+                return self.reply(200, {}, {"ok": False, "error": "channel_not_found"})
+            with self.lock:
+                FakeSlack.uploads[channel] += 1
+            return self.reply(200, {}, {"ok": True, "files": [{"id": "F1"}]})
+        self.reply(404, {}, {"ok": False, "error": "unknown_method"})
+
+    def reply(self, status, headers, payload):
+        content = b"OK" if payload is None else json.dumps(payload).encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "text/plain" if payload is None else "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+def wait_for(client, status_url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get(status_url).json
+        if job["finished"]:
+            return job
+        time.sleep(0.05)
+    raise TimeoutError(status_url)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=1.0, help="seconds the fake Slack takes per upload")
+    args = parser.parse_args()
+
+    FakeSlack.latency = args.latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeSlack)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ.update(SLACK_API_URL=f"http://127.0.0.1:{server.server_port}/api/", SLACK_BOT_TOKEN="xoxb-check",
+                      SLACK_CHANNEL_ID="CRATE", SLACK_BACKOFF="0.05")
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app_v1
+        app_v1.anandhaas_snapshot.store = app_v1.build_sales_store(generate_parquet_frame(50_000))
+    app_v1.SLACK_CHANNELS.update(test_channel_3="C500", broken="CBAD")
+    client = app_v1.app.test_client()
+    with contextlib.redirect_stdout(io.StringIO()):
+        report_id = client.post("/api/query", json={"query": "revenue by branch"}).json["report_id"]
+
+    failed = []
+
+    def check(label, ok):
+        print(f"{'ok  ' if ok else 'FAIL'} {label}")
+        if not ok:
+            failed.append(label)
+
+    start = time.perf_counter()
+    response = client.post("/api/send-to-slack", json={"report_id": report_id, "channels": "all"})
+    answered = time.perf_counter() - start
+    check(f"send-to-slack answers 202 in {answered * 1000:.0f} ms, before the {args.latency:.1f}s upload",
+          response.status_code == 202 and answered < args.latency)
+    start = time.perf_counter()
+    job = wait_for(client, response.json["status_url"])
+    elapsed = time.perf_counter() - start
+    channels = job["channels"]
+    check("job fans out to every configured channel", set(channels) == set(app_v1.SLACK_CHANNELS))
+    check("plain channel sent on the first try",
+          channels["test_channel_2"]["state"] == "sent" and channels["test_channel_2"]["attempts"] == 1)
+    check(f"rate-limited channel sent after honoring Retry-After twice ({elapsed:.1f}s)",
+          channels["test_channel_1"]["state"] == "sent" and channels["test_channel_1"]["attempts"] == 3
+          and elapsed >= 2)
+    check("500 retried with backoff, then sent",
+          channels["test_channel_3"]["state"] == "sent" and channels["test_channel_3"]["attempts"] == 2)
+    check("unknown channel fails without retries",
+          channels["broken"]["state"] == "failed" and channels["broken"]["attempts"] == 1
+          and "channel_not_found" in channels["broken"]["error"])
+    check("job reports partial delivery", job["state"] == "partial")
+    check("each channel received the file once",
+          dict(FakeSlack.uploads) == {"CRATE": 1, "C0A6JK35E20": 1, "C500": 1})
+    check("unknown job is 404", client.get("/api/slack-jobs/nope").status_code == 404)
+    check("unknown channel key is rejected",
+          client.post("/api/send-to-slack", json={"report_id": report_id, "channel": "nope"}).status_code == 400)
+
+    server.shutdown()
+    print(f"{len(failed)} check(s) failed" if failed else "all checks passed")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
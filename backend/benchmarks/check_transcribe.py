@@ -0,0 +1,186 @@
+"""Check /api/transcribe against a local stand-in for the Sarvam STT API.
+
+The recording is synthetic speech: every word is a short tone at its own
+pitch, words are separated by short gaps and sentences by longer pauses.
+The stand-in server "transcribes" a WAV piece by finding the tones in it,
+so a piece cut mid-word or pieces stitched out of order give a wrong
+transcript. It also sleeps --latency seconds per request and records how
+many requests overlap.
+
+Run from the backend directory:
+    python -m benchmarks.check_transcribe --seconds 90
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import wave
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+RATE = 16000
+WORDS = ["show", "revenue", "by", "branch", "for", "august", "top", "ten", "items", "in", "vv", "sweets"]
+
+
+def pitch(index: int) -> float:
+    return 300.0 + 80.0 * index
+
+
+def speech_wav(sentences: list, seed: int = 0) -> bytes:
+    """WAV bytes of each sentence's words as tones with short gaps, and a longer pause after each sentence"""
+    rng = np.random.default_rng(seed)
+    audio = []
+    for sentence in sentences:
+        for word in sentence:
+            t = np.arange(int(0.35 * RATE)) / RATE
+            audio += [0.5 * np.sin(2 * np.pi * pitch(WORDS.index(word)) * t), np.zeros(int(0.08 * RATE))]
+        audio.append(np.zeros(int(0.6 * RATE)))
+    samples = (np.concatenate(audio) * 32767).astype(np.int16)
+    samples = samples + rng.normal(0, 20, len(samples)).astype(np.int16)
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(RATE)
+        out.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+
+def synthetic_speech(seconds: float, seed: int = 0):
+    """(WAV bytes, spoken words) of random sentences of 3 to 7 words, about seconds long"""
+    rng = np.random.default_rng(seed)
+    sentences, total = [], 0.0
+    while total < seconds:
+        sentences.append([WORDS[int(i)] for i in rng.integers(len(WORDS), size=rng.integers(3, 8))])
+        total += len(sentences[-1]) * 0.43 + 0.6
+    return speech_wav(sentences, seed), [word for sentence in sentences for word in sentence]
+
+
+def hear(wav_bytes: bytes) -> list:
+    """Words in a WAV piece: each loud run of 20 ms windows is one tone, named by its pitch"""
+    try:
+        with wave.open(io.BytesIO(wav_bytes), "rb") as wav:
+            samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16) / 32768
+    except (wave.Error, EOFError):
+        return []
+    window = int(0.02 * RATE)
+    frames = samples[:len(samples) // window * window].reshape(-1, window)
+    loud = np.sqrt((frames ** 2).mean(axis=1)) > 0.05
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], loud.astype(np.int8), [0]))))
+    words = []
+    for start, end in zip(edges[::2], edges[1::2]):
+        tone = samples[start * window:end * window]
+        peak = np.argmax(np.abs(np.fft.rfft(tone))) * RATE / len(tone)
+        index = int(round((peak - 300.0) / 80.0))
+        words.append(WORDS[index] if 0 <= index < len(WORDS) else "?")
+    return words
+
+
+class FakeSTT(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    latency = 0.0
+    active = 0
+    peak = 0
+    requests = 0
+    last_audio = None
+    lock = threading.Lock()
+
+    def do_POST(self):
+        with self.lock:
+            FakeSTT.active += 1
+            FakeSTT.requests += 1
+            FakeSTT.peak = max(FakeSTT.peak, FakeSTT.active)
+        try:
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            message = BytesParser().parsebytes(f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body)
+            audio = next(part.get_payload(decode=True) for part in message.get_payload()
+                         if part.get_param("name", header="content-disposition") == "file")
+            FakeSTT.last_audio = audio
+            time.sleep(self.latency)
+            reply = json.dumps({"transcript": " ".join(hear(audio))}).encode()
+            self.send_response(200)
+        except Exception as e:
+            reply = json.dumps({"error": str(e)}).encode()
+            self.send_response(400)
+        finally:
+            with self.lock:
+                FakeSTT.active -= 1
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=90)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds the stand-in takes per request")
+    parser.add_argument("--concurrency", type=int, default=3)
+    parser.add_argument("--chunk-seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    FakeSTT.latency = args.latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeSTT)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ.update(SARVAM_STT_URL=f"http://127.0.0.1:{server.server_port}/speech-to-text", SARVAM_API_KEY="check",
+                      STT_MAX_CONCURRENCY=str(args.concurrency), STT_CHUNK_SECONDS=str(args.chunk_seconds))
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app_v1
+    client = app_v1.app.test_client()
+
+    # Nothing may touch the disk on the way through
+    def no_temp_files(*a, **k):
+        raise AssertionError("temp file created")
+    tempfile.NamedTemporaryFile = tempfile.SpooledTemporaryFile = tempfile.TemporaryFile = no_temp_files
+
+    failed = []
+
+    def check(label, ok):
+        print(f"{'ok  ' if ok else 'FAIL'} {label}")
+        if not ok:
+            failed.append(label)
+
+    def transcribe(audio: bytes, filename: str = "audio.wav"):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            response = client.post("/api/transcribe", data={"audio": (io.BytesIO(audio), filename)})
+        return response.json, time.perf_counter() - start
+
+    short, short_words = synthetic_speech(4)
+    result, elapsed = transcribe(short)
+    check(f"short recording: one request, exact transcript ({elapsed * 1000:.0f} ms)",
+          result.get("chunks") == 1 and result["transcript"] == " ".join(short_words))
+
+    audio, words = synthetic_speech(args.seconds)
+    FakeSTT.peak = FakeSTT.requests = 0
+    result, elapsed = transcribe(audio)
+    pieces = result.get("chunks", 0)
+    serial = pieces * args.latency
+    check(f"{args.seconds:.0f}s recording cut into {pieces} pieces at pauses; stitched transcript is exact",
+          pieces > 1 and result["transcript"] == " ".join(words))
+    check(f"at most {args.concurrency} pieces in flight (peak {FakeSTT.peak}), {elapsed:.2f}s vs {serial:.2f}s one by one",
+          1 < FakeSTT.peak <= args.concurrency and elapsed < serial)
+
+    webm = b"\x1aE\xdf\xa3 not a wav recording" * 1000
+    result, _ = transcribe(webm, "audio.webm")
+    check("non-WAV uploads are passed through unchanged in one request",
+          result.get("chunks") == 1 and FakeSTT.last_audio == webm)
+
+    server.shutdown()
+    print(f"{len(failed)} check(s) failed" if failed else "all checks passed")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Check /api/voice-query against /api/transcribe followed by /api/query.
+
+Uses the stand-in STT server of check_transcribe (--latency seconds per
+request) and a data snapshot that takes --load-seconds to load, as the
+first S3 read does. Both paths start from a cold snapshot; the combined
+endpoint loads it while the audio is transcribed, so its chart arrives
+sooner, and it must stream the same answer /api/query gives.
+
+Run from the backend directory:
+    python -m benchmarks.check_voice_query
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+from benchmarks.check_transcribe import FakeSTT, speech_wav
+from benchmarks.synthetic import generate_parquet_frame
+
+SPOKEN = ["revenue", "by", "branch"]
+
+
+def read_events(response, start: float):
+    """(seconds after start, event name, data) of each server-sent event as it arrives"""
+    buffer = b""
+    for block in response.response:
+        buffer += block if isinstance(block, bytes) else block.encode()
+        while b"\n\n" in buffer:
+            message, buffer = buffer.split(b"\n\n", 1)
+            fields = dict(line.split(": ", 1) for line in message.decode().split("\n"))
+            yield time.perf_counter() - start, fields["event"], json.loads(fields["data"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--latency", type=float, default=1.0, help="seconds the stand-in STT takes per request")
+    parser.add_argument("--load-seconds", type=float, default=1.5, help="seconds a cold data snapshot takes to load")
+    args = parser.parse_args()
+
+    FakeSTT.latency = args.latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeSTT)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ.update(SARVAM_STT_URL=f"http://127.0.0.1:{server.server_port}/speech-to-text", SARVAM_API_KEY="check")
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app_v1
+        from data_refresh import DataSnapshot
+        store = app_v1.build_sales_store(generate_parquet_frame(args.rows))
+        # Start-up warm-up done first, so it does not load the cold snapshots below in the background
+        app_v1.anandhaas_snapshot.store = store
+        app_v1.warmup.start()
+        app_v1.warmup.wait()
+
+    def slow_load():
+        time.sleep(args.load_seconds)
+        return store
+
+    def cold_start():
+        app_v1.anandhaas_snapshot = DataSnapshot(slow_load, lambda old: old)
+
+    audio = speech_wav([SPOKEN])
+    failed = []
+
+    def check(label, ok):
+        print(f"{'ok  ' if ok else 'FAIL'} {label}")
+        if not ok:
+            failed.append(label)
+
+    # Two round trips: transcribe, then query
+    cold_start()
+    client = app_v1.app.test_client()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        transcript = client.post("/api/transcribe", data={"audio": (io.BytesIO(audio), "audio.wav")}).json["transcript"]
+        answer = client.post("/api/query", json={"query": transcript}).json
+    sequential = time.perf_counter() - start
+
+    # One streamed request
+    cold_start()
+    client = app_v1.app.test_client()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        response = client.post("/api/voice-query", data={"audio": (io.BytesIO(audio), "audio.wav")}, buffered=False)
+        events = list(read_events(response, start))
+    names = [name for _, name, _ in events]
+    timing = {name: elapsed for elapsed, name, _ in events}
+    data = {name: payload for _, name, payload in events}
+
+    check(f"events arrive in order: {', '.join(names)}", names == ["transcript", "plan", "chart", "report", "done"])
+    check(f"transcript after {timing.get('transcript', 0):.2f}s is exact",
+          data.get("transcript", {}).get("transcript") == " ".join(SPOKEN))
+    check("chart matches /api/query for the same transcript",
+          {key: value for key, value in answer.items() if key != "report_id"} == data.get("chart"))
+    check(f"chart after {timing.get('chart', 0):.2f}s vs {sequential:.2f}s transcribing then querying "
+          f"({args.latency:.1f}s STT, {args.load_seconds:.1f}s data load)",
+          timing.get("chart", sequential) < sequential - min(args.latency, args.load_seconds) / 2)
+
+    report_id = data.get("report", {}).get("report_id")
+    check("report link downloads the PDF", report_id is not None
+          and client.get(data["report"]["pdf_url"]).data.startswith(b"%PDF"))
+    check("the stream's session cookie finds the report",
+          client.get("/api/last-pdf-info").json.get("report_id") == report_id)
+
+    FakeSTT.latency = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        response = client.post("/api/voice-query", data={"audio": (io.BytesIO(speech_wav([[]])), "audio.wav")},
+                               buffered=False)
+        silent = list(read_events(response, time.perf_counter()))
+    check("silence ends the stream with an error event", [name for _, name, _ in silent] == ["transcript", "error"])
+    check("missing audio is a 400", client.post("/api/voice-query").status_code == 400)
+
+    server.shutdown()
+    print(f"{len(failed)} check(s) failed" if failed else "all checks passed")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""Load test /api/voice-query with many concurrent users, Flask's threaded server against the ASGI mode.
+
+Sarvam and Bedrock are replaced by local stand-ins that take --stt-latency
+and --bedrock-latency seconds per request. Every transcript is a different
+question the rule planner does not know, so every request goes to the
+stand-in Bedrock. For each server mode the app is started in a subprocess
+on synthetic data, --users clients each send one recording after another
+for --seconds, and the script reports completed requests, latency
+percentiles, errors, the server's threads and memory under load and its
+CPU time per request.
+
+Run from the backend directory:
+    python -m benchmarks.load_voice --users 200 --seconds 20
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import itertools
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import aiohttp
+import numpy as np
+
+from benchmarks.check_transcribe import speech_wav
+
+PLAN = {"chart_type": "bar", "x_axis": "Branch_Name", "y_axis": "Row_Total", "aggregation": "sum",
+        "title": "Revenue by Branch", "dual_metrics": False, "limit": None}
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 4096
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers after latency seconds and counts the requests in flight"""
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    latency = 0.0
+    active = 0
+    peak = 0
+    served = 0
+    questions = itertools.count()
+    lock = threading.Lock()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        counts = type(self)
+        with self.lock:
+            counts.active += 1
+            counts.peak = max(counts.peak, counts.active)
+        try:
+            time.sleep(self.latency)
+            reply = json.dumps(self.answer()).encode()
+        finally:
+            with self.lock:
+                counts.active -= 1
+                counts.served += 1
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeSarvam(StubHandler):
+    active = peak = served = 0
+
+    def answer(self):
+        return {"transcript": f"how did we do last week number {next(self.questions)}"}
+
+
+class FakeBedrock(StubHandler):
+    active = peak = served = 0
+
+    def answer(self):
+        return {"output": {"message": {"content": [{"text": json.dumps(PLAN)}]}}}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve(mode: str, port: int, rows: int):
+    """Run the app in this process on synthetic data (the load test starts this as a subprocess)"""
+    from benchmarks.synthetic import generate_parquet_frame
+    with contextlib.redirect_stdout(io.StringIO()):
+        if mode == "asgi":
+            import asgi
+            flask_app = asgi.flask_app
+        else:
+            import app_v1 as flask_app
+        flask_app.anandhaas_snapshot.store = flask_app.build_sales_store(generate_parquet_frame(rows))
+        flask_app.snapshot_analysis(flask_app.anandhaas_snapshot.store)
+    # The app's per-request prints would dominate the profile
+    sys.stdout = open(os.devnull, "w")
+    if mode == "asgi":
+        import uvicorn
+        uvicorn.run(asgi.app, host="127.0.0.1", port=port, log_level="warning", backlog=4096)
+    else:
+        # What `python app_v1.py` runs, a thread per request, without the reloader, debugger and request log
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        flask_app.app.run(host="127.0.0.1", port=port, threaded=True)
+
+
+def process_status(pid: int) -> dict:
+    with open(f"/proc/{pid}/status") as f:
+        fields = dict(line.split(":", 1) for line in f)
+    return {"threads": int(fields["Threads"]), "rss_mb": int(fields["VmRSS"].split()[0]) / 1024}
+
+
+def cpu_seconds(pid: int) -> float:
+    """CPU time of a process and its live child processes (the render workers)"""
+    total = 0.0
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(entry) == pid or int(fields[1]) == pid:
+            total += (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    return total
+
+
+async def run_load(base: str, users: int, seconds: float, audio: bytes, pid: int) -> dict:
+    latencies, errors, samples = [], [], []
+    deadline = time.perf_counter() + seconds
+
+    async def user(session):
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            form = aiohttp.FormData()
+            form.add_field("audio", audio, filename="audio.wav", content_type="audio/wav")
+            try:
+                async with session.post(f"{base}/api/voice-query", data=form) as response:
+                    body = (await response.read()).decode()
+                if response.status != 200 or "event: done" not in body:
+                    errors.append(body[-200:] or str(response.status))
+                    continue
+                latencies.append(time.perf_counter() - start)
+            except aiohttp.ClientError as e:
+                errors.append(repr(e))
+
+    async def sample():
+        while time.perf_counter() < deadline:
+            with contextlib.suppress(OSError):
+                samples.append(process_status(pid))
+            await asyncio.sleep(0.5)
+
+    # aiohttp rather than httpx, whose connection pool made the client itself the bottleneck at a few hundred users
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=users),
+                                     timeout=aiohttp.ClientTimeout(total=120)) as session:
+        started, cpu_start = time.perf_counter(), cpu_seconds(pid)
+        await asyncio.gather(sample(), *(user(session) for _ in range(users)))
+        elapsed, cpu = time.perf_counter() - started, cpu_seconds(pid) - cpu_start
+    return {"latencies": latencies, "errors": errors, "elapsed": elapsed, "samples": samples, "cpu": cpu}
+
+
+def wait_until_up(base: str, process, timeout: float = 120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("server exited during startup")
+        with contextlib.suppress(OSError):
+            with urllib.request.urlopen(f"{base}/api/plan-cache", timeout=1) as response:
+                if response.status == 200:
+                    return
+        time.sleep(0.2)
+    raise TimeoutError(base)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--serve", choices=["wsgi", "asgi"], help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--modes", default="wsgi,asgi")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--stt-latency", type=float, default=1.0)
+    parser.add_argument("--bedrock-latency", type=float, default=1.5)
+    args = parser.parse_args()
+    if args.serve:
+        return serve(args.serve, args.port, args.rows)
+
+    FakeSarvam.latency = args.stt_latency
+    FakeBedrock.latency = args.bedrock_latency
+    stubs = [StubServer(("127.0.0.1", 0), handler) for handler in (FakeSarvam, FakeBedrock)]
+    for stub in stubs:
+        threading.Thread(target=stub.serve_forever, daemon=True).start()
+    env = dict(os.environ, SARVAM_API_KEY="load", SARVAM_STT_URL=f"http://127.0.0.1:{stubs[0].server_port}/stt",
+               AWS_ENDPOINT_URL_BEDROCK_RUNTIME=f"http://127.0.0.1:{stubs[1].server_port}",
+               AWS_ACCESS_KEY_ID="load", AWS_SECRET_ACCESS_KEY="load", AWS_REGION="us-east-1",
+               CLIENT_POOL_SIZE=str(args.users), PLAN_CACHE_FILE="", APP_MODULE="app_v1")
+    audio = speech_wav([["revenue", "by", "branch"]])
+    floor = args.stt_latency + args.bedrock_latency
+
+    print(f"{args.users} users for {args.seconds:.0f}s, {args.stt_latency:.1f}s STT + {args.bedrock_latency:.1f}s Bedrock "
+          f"per request ({floor:.1f}s floor)")
+    print(f"{'mode':6} {'done':>6} {'req/s':>7} {'p50':>7} {'p95':>7} {'p99':>7} {'errors':>7} "
+          f"{'peak STT':>9} {'peak LLM':>9} {'threads':>8} {'RSS MB':>7} {'CPU/req':>8}")
+    for mode in args.modes.split(","):
+        port = free_port()
+        process = subprocess.Popen([sys.executable, "-m", "benchmarks.load_voice", "--serve", mode,
+                                    "--port", str(port), "--rows", str(args.rows)], env=env)
+        base = f"http://127.0.0.1:{port}"
+        try:
+            wait_until_up(base, process)
+            for handler in (FakeSarvam, FakeBedrock):
+                handler.peak = 0
+            result = asyncio.run(run_load(base, args.users, args.seconds, audio, process.pid))
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+        latencies = np.array(result["latencies"]) if result["latencies"] else np.array([np.nan])
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        threads = max((s["threads"] for s in result["samples"]), default=0)
+        rss = max((s["rss_mb"] for s in result["samples"]), default=0)
+        print(f"{mode:6} {len(result['latencies']):6d} {len(result['latencies']) / result['elapsed']:7.1f} "
+              f"{p50:6.2f}s {p95:6.2f}s {p99:6.2f}s {len(result['errors']):7d} "
+              f"{FakeSarvam.peak:9d} {FakeBedrock.peak:9d} {threads:8d} {rss:7.0f} "
+              f"{result['cpu'] / max(1, len(result['latencies'])) * 1000:6.1f}ms")
+        if result["errors"]:
+            print(f"       first error: {result['errors'][0]}")
+
+
+if __name__ == "__main__":
+    main()
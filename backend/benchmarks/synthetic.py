@@ -0,0 +1,124 @@
+"""Synthetic Anandhaas sales data for offline benchmarks."""
+import os
+
+import numpy as np
+import pandas as pd
+
+BRANCHES = ["VV", "SK", "SBC", "RMN", "THD", "KMR", "SLR", "SMR", "AVR", "LMJ",
+            "NLR", "SPM", "RSP", "RPP", "KCR", "TMR", "KNP", "PMR", "SNC", "KUN"]
+SECTIONS = ["Boli Section", "Milk Section", "Bakery", "Kovilpatti Section", "Mixture Section",
+            "Ghee Sweets Section", "Savoury Section", "Beverages"]
+ITEM_GROUPS = ["Sweets", "Kaaram", "Bakery", "Beverages", "Snacks"]
+SALES_GROUPS = ["Sales - Ecom", "Sales - Online", "Sales - SAS", "Sales - Party Order"]
+BASE_ITEMS = ["Mysore Pak", "Achu Murukku", "Butter Murukku", "Bombay Mixture", "Corn Mixture",
+              "Ribbon Pakoda", "Kaju Katli", "Milk Peda", "Badam Halwa", "Ghee Roast",
+              "Jangiri", "Boli", "Kara Sev", "Thattai", "Adhirasam", "Rava Laddu",
+              "Motichoor Laddu", "Palkova", "Rasmalai", "Coconut Burfi"]
+VARIANTS = ["", "Special", "Premium", "Mini", "Classic", "Sugar Free", "Ghee", "Family Pack",
+            "250g", "500g", "1kg", "Gift Box", "Jar", "Combo", "ABC", "Usilampatti"]
+
+
+def item_names() -> list:
+    """A few hundred distinct item names built from base items and variants"""
+    names = []
+    for base in BASE_ITEMS:
+        for variant in VARIANTS:
+            names.append(f"{variant} {base}".strip() if variant in ("ABC", "Usilampatti", "Ghee", "Classic") else f"{base} {variant}".strip())
+    return names
+
+
+def unused_columns(rows: int, count: int, rng) -> dict:
+    """count columns the app never reads (document numbers, customers, taxes, ...), as in a full ERP export"""
+    columns = {}
+    for i in range(count):
+        if i % 3 == 0:
+            columns[f"Document_No_{i}"] = np.char.add("DOC-", rng.integers(0, 10 ** 7, rows).astype(str)).astype(object)
+        elif i % 3 == 1:
+            columns[f"Customer_{i}"] = np.array([f"Customer {n}" for n in range(500)], dtype=object)[rng.integers(0, 500, rows)]
+        else:
+            columns[f"Tax_Amount_{i}"] = np.round(rng.gamma(2.0, 20.0, rows), 2)
+    return columns
+
+
+def generate_parquet_frame(rows: int, start: str = "2024-07-01", days: int = 62, seed: int = 0,
+                           extra_columns: int = 0) -> pd.DataFrame:
+    """Rows in the app_v1.py (S3 parquet) schema, with extra_columns unused columns after them"""
+    rng = np.random.default_rng(seed)
+    items = np.array(item_names(), dtype=object)
+    # Every item belongs to one section and one item group, as in the real catalogue
+    item_section = rng.integers(0, len(SECTIONS), len(items))
+    item_group = rng.integers(0, len(ITEM_GROUPS), len(items))
+    item = rng.zipf(1.3, rows) % len(items)
+    dates = pd.date_range(start, periods=days, freq="D")
+    return pd.DataFrame({
+        "Branch_Name": rng.choice(np.array(BRANCHES, dtype=object), rows),
+        "SK_Section": np.array(SECTIONS, dtype=object)[item_section[item]],
+        "Item_Service_Description": items[item],
+        "Item Group Name": np.array(ITEM_GROUPS, dtype=object)[item_group[item]],
+        "Sales Group Name": rng.choice(np.array(SALES_GROUPS, dtype=object), rows, p=[0.1, 0.15, 0.7, 0.05]),
+        "Row_Total": np.round(rng.gamma(2.0, 250.0, rows), 2),
+        "Quantity_Inventory_UoM": np.round(rng.gamma(2.0, 1.5, rows), 3),
+        "Inventory_UoM": rng.choice(np.array(["KG", "NOS", "PKT"], dtype=object), rows),
+        "Date": dates[rng.integers(0, days, rows)],
+        **unused_columns(rows, extra_columns, rng),
+    })
+
+
+def generate_csv_bytes(rows: int, start: str = "2024-07-01", days: int = 62, seed: int = 0,
+                       extra_columns: int = 0) -> bytes:
+    """A CSV export in the app.py schema: amounts over 999 are quoted with thousands separators"""
+    rng = np.random.default_rng(seed)
+    items = np.array(item_names(), dtype=object)
+    amounts = np.round(rng.gamma(2.0, 250.0, rows), 2)
+    dates = pd.date_range(start, periods=days, freq="D").strftime("%Y-%m-%d").to_numpy(dtype=object)
+    frame = pd.DataFrame({
+        "Bill No": np.char.add("B", rng.integers(0, 10 ** 6, rows).astype(str)),
+        "Branch Name": rng.choice(np.array(BRANCHES, dtype=object), rows),
+        "Date": dates[rng.integers(0, days, rows)],
+        "ItemName": items[rng.zipf(1.3, rows) % len(items)],
+        "Quantity": rng.integers(1, 6, rows),
+        "Net Value": [f"{amount:,.2f}" for amount in amounts],
+        "TotalBillAmt": [f"{amount * 1.05:,.2f}" for amount in amounts],
+        **unused_columns(rows, extra_columns, rng),
+    })
+    return frame.to_csv(index=False).encode()
+
+
+def write_parquet_parts(directory: str, rows: int, parts: int = 4, start: str = "2024-07-01", chunk_rows: int = 1_000_000,
+                        row_group_rows: int = 100_000, extra_columns: int = 0) -> list:
+    """Write rows in the app_v1.py schema as monthly parquet parts and return their file names.
+
+    Each part is written chunk_rows at a time (each chunk sorted by date), so
+    tens of millions of rows never have to be in memory at once.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    names = []
+    first = pd.Timestamp(start)
+    for part in range(parts):
+        month = first + pd.DateOffset(months=part)
+        name = f"sales_{month:%Y_%m}.parquet"
+        part_rows = rows // parts + (1 if part < rows % parts else 0)
+        writer = None
+        for chunk, offset in enumerate(range(0, part_rows, chunk_rows)):
+            frame = generate_parquet_frame(min(chunk_rows, part_rows - offset), start=str(month.date()),
+                                           days=month.days_in_month, seed=part * 10_000 + chunk, extra_columns=extra_columns)
+            table = pa.Table.from_pandas(frame.sort_values("Date", kind="stable"), preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(os.path.join(directory, name), table.schema)
+            writer.write_table(table, row_group_size=row_group_rows)
+        if writer is not None:
+            writer.close()
+            names.append(name)
+    return names
+
+
+def write_csv(path: str, rows: int, start: str = "2024-07-01", days: int = 62, chunk_rows: int = 1_000_000,
+              extra_columns: int = 0):
+    """Write rows in the app.py schema to a CSV file, chunk_rows at a time"""
+    with open(path, "wb") as f:
+        for chunk, offset in enumerate(range(0, rows, chunk_rows)):
+            raw = generate_csv_bytes(min(chunk_rows, rows - offset), start=start, days=days, seed=chunk,
+                                     extra_columns=extra_columns)
+            # Only the first chunk keeps its header line
+            f.write(raw if chunk == 0 else raw[raw.index(b"\n") + 1:])
@@ -0,0 +1,97 @@
+import os
+import threading
+from typing import TYPE_CHECKING
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# boto3 and slack_sdk are imported with the first client, not when the server starts
+if TYPE_CHECKING:
+    import boto3
+    from slack_sdk import WebClient
+
+AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
+# Connections kept open per client (per thread for HTTP sessions)
+CLIENT_POOL_SIZE = int(os.getenv("CLIENT_POOL_SIZE", "16"))
+CLIENT_CONNECT_TIMEOUT = float(os.getenv("CLIENT_CONNECT_TIMEOUT", "5"))
+CLIENT_READ_TIMEOUT = float(os.getenv("CLIENT_READ_TIMEOUT", "60"))
+SLACK_TIMEOUT = int(os.getenv("SLACK_TIMEOUT", "30"))
+# Point Slack calls elsewhere, e.g. at a local fake server in checks
+SLACK_API_URL = os.getenv("SLACK_API_URL", "https://slack.com/api/")
+
+_lock = threading.RLock()
+_clients = {}
+_local = threading.local()
+
+
+def _shared(key, factory):
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _clients[key] = factory()
+    return client
+
+
+def aws_session() -> "boto3.session.Session":
+    """boto3 session shared by the clients, resolving credentials once"""
+    def create():
+        import boto3
+        return boto3.session.Session()
+
+    return _shared("boto3-session", create)
+
+
+def aws_client(service: str, region: str = AWS_REGION):
+    """Shared boto3 client for service.
+
+    boto3 clients are thread-safe once created, so one per service and region
+    serves every request thread. Creation (credential lookup, loading the
+    service model) happens once under a lock, on a session of our own since
+    the default boto3 session is not safe to use from several threads.
+    """
+    def create():
+        from botocore.config import Config
+        config = Config(
+            max_pool_connections=CLIENT_POOL_SIZE,
+            connect_timeout=CLIENT_CONNECT_TIMEOUT,
+            read_timeout=CLIENT_READ_TIMEOUT,
+            tcp_keepalive=True,
+            retries={"max_attempts": 3, "mode": "standard"},
+        )
+        return aws_session().client(service, region_name=region, config=config)
+
+    return _shared(("aws", service, region), create)
+
+
+def http_session() -> requests.Session:
+    """Keep-alive requests session for the calling thread.
+
+    requests does not promise that a Session is thread-safe, so each server
+    thread gets its own, reused for every call that thread makes.
+    """
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=CLIENT_POOL_SIZE)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _local.session = session
+    return session
+
+
+def slack_client(token: str) -> "WebClient":
+    """Shared Slack WebClient for token (WebClient is safe to share between threads)"""
+    def create():
+        from slack_sdk import WebClient
+        return WebClient(token=token, timeout=SLACK_TIMEOUT, base_url=SLACK_API_URL)
+
+    return _shared(("slack", token), create)
+
+
+def reset():
+    """Drop the cached clients (and this thread's HTTP session), e.g. after credentials change"""
+    with _lock:
+        _clients.clear()
+    _local.__dict__.clear()
@@ -0,0 +1,69 @@
+import threading
+import time
+
+from log import get_logger
+
+logger = get_logger("data_refresh")
+
+
+class DataSnapshot:
+    """Holds the current SalesStore and swaps in refreshed ones atomically.
+
+    Request handlers call get() once and keep using that store, so a refresh
+    running in parallel never exposes a half-loaded dataset: the new store is
+    fully built before the single reference assignment that publishes it.
+    """
+
+    def __init__(self, load, refresh, interval: float = 0):
+        self._load = load
+        self._refresh = refresh
+        self.interval = interval
+        self.store = None
+        self.last_refresh = None
+        self._lock = threading.Lock()
+        self._poller = None
+
+    def get(self):
+        store = self.store
+        if store is None:
+            with self._lock:
+                if self.store is None:
+                    self.store = self._load()
+                    self.last_refresh = time.time()
+                store = self.store
+            self._start_poller()
+        return store
+
+    def refresh(self) -> dict:
+        """Load new or changed data and publish it; returns a status summary"""
+        with self._lock:
+            old = self.store
+            new = self._load() if old is None else self._refresh(old)
+            if new is not None and new is not old:
+                self.store = new
+            self.last_refresh = time.time()
+        current = self.store
+        return {
+            "refreshed": current is not old,
+            "version": current.version if current is not None else None,
+            "records": len(current) if current is not None else 0,
+        }
+
+    def _start_poller(self):
+        if self.interval <= 0 or self._poller is not None:
+            return
+        with self._lock:
+            if self._poller is not None:
+                return
+            self._poller = threading.Thread(target=self._poll, name="data-refresh", daemon=True)
+            self._poller.start()
+
+    def _poll(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                status = self.refresh()
+                if status["refreshed"]:
+                    logger.info("🔄 Data refreshed: version %s, %s records", status["version"], status["records"])
+            except Exception as e:
+                logger.warning("⚠️ Data refresh failed: %s", e)
@@ -0,0 +1,19 @@
+from flask import Response, json, stream_with_context
+
+
+def sse_event(event: str, data) -> str:
+    """One server-sent event carrying data as JSON"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def event_stream(events) -> Response:
+    """Response sending each string events yields to the client as soon as it is produced.
+
+    The generator keeps the request context, so it can still read headers
+    and cookies (not uploaded files, which close when the view returns);
+    proxies are told not to buffer the stream.
+    """
+    response = Response(stream_with_context(events), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
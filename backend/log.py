@@ -0,0 +1,95 @@
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+# Least severe records written: DEBUG, INFO, WARNING or ERROR
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "text" for people reading the console, "json" for one object per line for a log collector
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+# Share of DEBUG records kept (1: all), so debug logging can stay on under load
+LOG_DEBUG_SAMPLE = float(os.getenv("LOG_DEBUG_SAMPLE", "1"))
+
+ROOT = "anandhaas"
+
+
+class lazy:
+    """A log argument computed only when a record is actually written.
+
+    Diagnostics that need extra pandas work (matched item lists, samples)
+    go in a lazy, so with DEBUG off or the record sampled away they cost
+    nothing: logger.debug("Items matched: %s", lazy(lambda: sorted(items))).
+    """
+
+    def __init__(self, compute):
+        self.compute = compute
+
+    def __str__(self):
+        return str(self.compute())
+
+    def __repr__(self):
+        return repr(self.compute())
+
+
+class DebugSampler(logging.Filter):
+    """Keeps every record above DEBUG and a random share rate of the DEBUG ones"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record) -> bool:
+        return record.levelno > logging.DEBUG or self.rate >= 1 or random.random() < self.rate
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record) -> str:
+        line = f"{self.formatTime(record)} {record.levelname:<7} {record.name.removeprefix(ROOT + '.')}: {record.getMessage()}"
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record) -> str:
+        entry = {"time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+                 "level": record.levelname, "logger": record.name, "message": record.getMessage(),
+                 **(getattr(record, "fields", None) or {})}
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class StdoutHandler(logging.StreamHandler):
+    """Writes to whatever sys.stdout is when a record is emitted, as print() did"""
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+def _configure() -> logging.Logger:
+    root = logging.getLogger(ROOT)
+    if not root.handlers:
+        handler = StdoutHandler()
+        handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+        handler.addFilter(DebugSampler(LOG_DEBUG_SAMPLE))
+        root.addHandler(handler)
+        root.setLevel(LOG_LEVEL)
+        root.propagate = False
+    return root
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger of one module; fields=... in extra become fields of the record"""
+    _configure()
+    return logging.getLogger(f"{ROOT}.{name}")
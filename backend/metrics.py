@@ -0,0 +1,164 @@
+import contextlib
+import contextvars
+import os
+import threading
+import time
+
+from flask import g, request
+
+# Upper bounds in seconds of the latency histogram buckets
+METRICS_BUCKETS = [float(b) for b in os.getenv("METRICS_BUCKETS", "0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30").split(",")]
+
+# Seconds per stage of the request being served, for its Server-Timing header (None outside a request)
+_timings = contextvars.ContextVar("timings", default=None)
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+class Histogram:
+    """Prometheus-style latency histogram, one series per label values"""
+
+    def __init__(self, name: str, help: str, labels: tuple, buckets: list = METRICS_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = sorted(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, values: tuple, seconds: float):
+        with self._lock:
+            counts, total = self._series.get(values, ([0] * (len(self.buckets) + 1), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[i] += 1
+            counts[-1] += 1
+            self._series[values] = (counts, total + seconds)
+
+    def lines(self) -> list:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {values: (list(counts), total) for values, (counts, total) in self._series.items()}
+        for values, (counts, total) in sorted(series.items()):
+            for bound, count in zip([*map(str, self.buckets), "+Inf"], counts):
+                out.append(f"{self.name}_bucket{_labels(self.labels + ('le',), values + (bound,))} {count}")
+            out.append(f"{self.name}_sum{_labels(self.labels, values)} {total:.6f}")
+            out.append(f"{self.name}_count{_labels(self.labels, values)} {counts[-1]}")
+        return out
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def inc(self, values: tuple, amount: float = 1):
+        with self._lock:
+            self._counts[values] = self._counts.get(values, 0) + amount
+
+    def lines(self) -> list:
+        with self._lock:
+            counts = dict(self._counts)
+        return sample_lines(self.name, self.help, "counter",
+                            [(dict(zip(self.labels, values)), count) for values, count in sorted(counts.items())])
+
+
+stage_seconds = Histogram("anandhaas_stage_seconds", "Seconds spent in each stage of serving a request", ("stage",))
+request_seconds = Histogram("anandhaas_request_seconds", "Seconds until the response headers were sent", ("endpoint",))
+requests_total = Counter("anandhaas_requests_total", "Requests answered", ("endpoint", "status"))
+
+
+def sample_lines(name: str, help: str, kind: str, samples: list) -> list:
+    """Exposition lines of one metric family from (labels dict, value) samples"""
+    out = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        out.append(f"{name}{_labels(tuple(labels), tuple(labels.values()))} {value}")
+    return out
+
+
+@contextlib.contextmanager
+def span(stage: str):
+    """Time a block (or, as a decorator, a function) as one stage of the request it serves.
+
+    The time goes to the stage histogram and, inside a request, to that
+    request's breakdown. Threads started with the request's context (see
+    contextvars.copy_context) add to the same breakdown.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        stage_seconds.observe((stage,), seconds)
+        timings = _timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+def start_request():
+    _timings.set({})
+
+
+def request_timings() -> dict:
+    """Milliseconds per stage of the current request so far"""
+    return {stage: round(seconds * 1000, 1) for stage, seconds in (_timings.get() or {}).items()}
+
+
+def server_timing(total: float) -> str:
+    """Server-Timing header value of the current request's stages and its total seconds"""
+    stages = [f"{stage.replace(' ', '_')};dur={ms}" for stage, ms in request_timings().items()]
+    return ", ".join(stages + [f"total;dur={total * 1000:.1f}"])
+
+
+def finish_request(endpoint: str, status: int, seconds: float):
+    request_seconds.observe((endpoint,), seconds)
+    requests_total.inc((endpoint, str(status)))
+
+
+def cache_lines(caches: dict) -> list:
+    """Counters of PlanCache/ResultCache-like stats() (hits, misses, per endpoint when they keep them)"""
+    lookups, entries = [], []
+    for name, cache in caches.items():
+        stats = cache.stats()
+        for endpoint, counts in (stats.get("endpoints") or {"": stats}).items():
+            labels = {"cache": name, "endpoint": endpoint} if endpoint else {"cache": name}
+            lookups += [({**labels, "result": "hit"}, counts["hits"]), ({**labels, "result": "miss"}, counts["misses"])]
+        entries.append(({"cache": name}, stats["entries"]))
+    return (sample_lines("anandhaas_cache_lookups_total", "Cache lookups by result", "counter", lookups)
+            + sample_lines("anandhaas_cache_entries", "Entries kept in each cache", "gauge", entries))
+
+
+def render(caches: dict) -> str:
+    """Every metric of this process in the Prometheus text format"""
+    lines = stage_seconds.lines() + request_seconds.lines() + requests_total.lines() + cache_lines(caches)
+    return "\n".join(lines) + "\n"
+
+
+def instrument_app(app, caches: dict):
+    """Time every request of a Flask app, add a Server-Timing header and serve GET /metrics"""
+
+    @app.before_request
+    def start_timing():
+        g.request_started = time.perf_counter()
+        start_request()
+
+    @app.after_request
+    def record_timing(response):
+        started = g.get("request_started")
+        if started is not None:
+            seconds = time.perf_counter() - started
+            finish_request(request.url_rule.rule if request.url_rule else "unmatched", response.status_code, seconds)
+            response.headers["Server-Timing"] = server_timing(seconds)
+        return response
+
+    @app.route("/metrics", methods=["GET"])
+    def get_metrics():
+        return app.response_class(render(caches), mimetype="text/plain; version=0.0.4")
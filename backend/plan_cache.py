@@ -0,0 +1,150 @@
+import atexit
+import copy
+import datetime
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from log import get_logger
+
+logger = get_logger("plan_cache")
+
+# Seconds new plans wait before the cache file is rewritten, so a burst of new questions costs one write
+PLAN_CACHE_SAVE_SECONDS = float(os.getenv("PLAN_CACHE_SAVE_SECONDS", "5"))
+
+# Phrases whose plan holds dates worked out from the day it was made ("last 7 days" -> a date_filter)
+RELATIVE_DATE = re.compile(r"\b(?:today|tonight|yesterday|tomorrow|ytd|mtd|wtd"
+                           r"|(?:this|last|past|previous|current|next)\s+(?:\d+\s+)?(?:days?|weeks?|months?|quarters?|years?)"
+                           r"|(?:week|month|year)\s+to\s+date|\d+\s+(?:days?|weeks?|months?)\s+ago)\b")
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation"""
+    return re.sub(r"\s+", " ", query.lower()).strip().rstrip("?.!").strip()
+
+
+def context_hash(context: dict) -> str:
+    """Stable hash of the data context the prompt was built from"""
+    return hashlib.sha256(json.dumps(context, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+class PlanCache:
+    """LRU cache of model-generated query plans with a TTL.
+
+    Entries are keyed by the normalized query and a hash of the data context
+    given to the model, so a plan is reused only while the branch/item lists
+    it was produced from are unchanged. Queries with a relative date ("last
+    month", "yesterday") are also keyed on today's date, as their plans hold
+    the dates they resolved to. With a path the cache is also kept in a JSON
+    file and reloaded on startup. The file is rewritten in the background
+    save_delay seconds after a change (and at exit), outside the lock that
+    lookups take.
+    """
+
+    def __init__(self, ttl: float = 86400, max_entries: int = 512, path: str | None = None,
+                 save_delay: float = PLAN_CACHE_SAVE_SECONDS):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.path = path
+        self.save_delay = save_delay
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._save_timer = None
+        if path:
+            self._load()
+            atexit.register(self.flush)
+
+    def key(self, query: str, context: dict) -> str:
+        query = normalize_query(query)
+        if RELATIVE_DATE.search(query):
+            return f"{context_hash(context)}:{datetime.date.today().isoformat()}:{query}"
+        return f"{context_hash(context)}:{query}"
+
+    def get(self, query: str, context: dict) -> dict | None:
+        key = self.key(query, context)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["expires"] < time.time():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return copy.deepcopy(entry["plan"])
+
+    def put(self, query: str, context: dict, plan: dict):
+        key = self.key(query, context)
+        with self._lock:
+            self._entries[key] = {"plan": copy.deepcopy(plan), "expires": time.time() + self.ttl}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        self._schedule_save()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        self._schedule_save()
+
+    def flush(self):
+        """Write pending changes to the file now"""
+        with self._lock:
+            timer, self._save_timer = self._save_timer, None
+        if timer is not None:
+            timer.cancel()
+            self._save()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        for key, entry in entries.items():
+            if entry.get("expires", 0) >= now:
+                self._entries[key] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _schedule_save(self):
+        if not self.path:
+            return
+        with self._lock:
+            if self._save_timer is not None:
+                return
+            self._save_timer = threading.Timer(self.save_delay, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def _save(self):
+        # Entries are never changed once stored, so a shallow copy is a consistent snapshot
+        with self._lock:
+            entries = dict(self._entries)
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with self._save_lock:
+                with open(tmp_path, "w") as f:
+                    json.dump(entries, f)
+                os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning("⚠️ Cannot persist plan cache to %s: %s", self.path, e)
@@ -0,0 +1,327 @@
+import contextvars
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from log import get_logger
+
+logger = get_logger("report_store")
+
+# Threads drawing report figures
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "2"))
+# Worker processes drawing report figures in the ASGI server (0: draw on RENDER_WORKERS threads there too)
+RENDER_PROCESSES = int(os.getenv("RENDER_PROCESSES", "2"))
+# Seconds an export request waits for its figure to be drawn
+RENDER_TIMEOUT = float(os.getenv("RENDER_TIMEOUT", "60"))
+# Reports kept for export; the least recently used are dropped first
+REPORT_MAX_ENTRIES = int(os.getenv("REPORT_MAX_ENTRIES", "64"))
+# Bytes of chart specs and exported files kept across all reports
+REPORT_MAX_BYTES = int(os.getenv("REPORT_MAX_BYTES", str(64 * 1024 * 1024)))
+# Reports not exported or looked up for this many seconds are dropped
+REPORT_TTL = float(os.getenv("REPORT_TTL", "3600"))
+# Directory shared by all server processes on the host, so any worker can serve any report (empty: memory only)
+REPORT_DIR = os.getenv("REPORT_DIR", "")
+
+REPORT_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+def png_bytes(fig, info: dict) -> bytes:
+    with io.BytesIO() as buffer:
+        fig.savefig(buffer, format="png", bbox_inches="tight", dpi=100)
+        return buffer.getvalue()
+
+
+def render(draw, exporter, spec: dict, info: dict) -> bytes:
+    """Draw a report and export it, in one go for a worker process"""
+    return exporter(draw(spec), info)
+
+
+def render_process_pool(workers: int = RENDER_PROCESSES) -> ProcessPoolExecutor | None:
+    """Worker processes for ReportStore(processes=...), or None without the fork start method or workers.
+
+    The workers are forked at once, from the server as it is: call this
+    before the server starts threads, as a thread holding a lock while the
+    process forks would leave that lock held in every worker.
+    """
+    if workers <= 0 or "fork" not in multiprocessing.get_all_start_methods():
+        return None
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"))
+    # With fork all workers start on the first submit
+    pool.submit(int).result()
+    return pool
+
+
+def _encode(value):
+    """A report's spec or info as JSON-ready values; Series become tagged dicts, tuples lists"""
+    if isinstance(value, pd.Series):
+        dates = isinstance(value.index, pd.DatetimeIndex)
+        index = [item.isoformat() for item in value.index] if dates else [_encode(item) for item in value.index]
+        return {"__series__": {"name": _encode(value.name), "dates": dates, "index": index,
+                               "values": [_encode(item) for item in value.tolist()]}}
+    if isinstance(value, dict):
+        return {str(key): _encode(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(item) for item in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    return value
+
+
+def _decode(item: dict):
+    # json object_hook: rebuild the Series _encode tagged
+    if "__series__" not in item:
+        return item
+    series = item["__series__"]
+    index = pd.DatetimeIndex(series["index"]) if series["dates"] else series["index"]
+    return pd.Series(series["values"], index=index, name=series["name"])
+
+
+def dumps_report(spec: dict, info: dict, session: str | None) -> bytes:
+    """A report as JSON, so the shared directory only ever holds data (never pickles)"""
+    return json.dumps({"spec": _encode(spec), "info": _encode(info), "session": session}).encode()
+
+
+def loads_report(content: bytes) -> tuple:
+    """(spec, info, session) of a report written by dumps_report"""
+    report = json.loads(content, object_hook=_decode)
+    return report["spec"], report["info"], report["session"]
+
+
+def _write(path: str, content: bytes):
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+class ReportStore:
+    """Query reports kept under a report id and drawn only when exported.
+
+    add() keeps the chart spec and report details; nothing is drawn until the
+    first export, which draws the Figure and saves it as the file in a small
+    worker pool (bounding how many charts are rendered at once) using the
+    object-oriented matplotlib API (never pyplot's global state). The
+    export's bytes are kept for later requests and the Figure is dropped,
+    so only specs and exported files stay in memory; another format draws
+    it again from the spec. Reports are dropped least recently used first
+    once there are more than max_entries or their specs and exports exceed
+    max_bytes (never the report being added or used, so one over max_bytes
+    on its own lasts until the next), and after ttl seconds without use. exporters maps a format
+    name to a function of (figure, info) returning the file's bytes.
+
+    Given processes (an Executor of worker processes), each export is
+    drawn and saved there instead, once per format, so drawing never holds
+    the server's GIL; draw and the exporters must then be module-level
+    functions.
+
+    Each session's latest report can be looked up with latest(), so one
+    user never gets another's report. With a directory, reports, exports and
+    each session's latest report id are also written there, so any server
+    process on the host can serve a report another one answered.
+    """
+
+    def __init__(self, draw, exporters: dict, workers: int = RENDER_WORKERS, max_entries: int = REPORT_MAX_ENTRIES,
+                 max_bytes: int = REPORT_MAX_BYTES, ttl: float = REPORT_TTL, directory: str = REPORT_DIR,
+                 processes=None):
+        self.draw = draw
+        self.exporters = exporters
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.directory = directory or None
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report-render")
+        self.processes = processes
+        self._reports = OrderedDict()
+        self._sessions = {}
+        self._bytes = 0
+        self._swept = 0.0
+        self._lock = threading.Lock()
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+    def add(self, spec: dict, session: str | None = None, **info) -> str:
+        """Keep a report for later export and return its id; info is passed to the exporters"""
+        report_id = uuid.uuid4().hex
+        content = dumps_report(spec, info, session)
+        entry = self._new_entry(spec, info, session, len(content))
+        with self._lock:
+            self._reports[report_id] = entry
+            self._bytes += entry["bytes"]
+            if session:
+                self._sessions[session] = report_id
+            self._evict(keep=report_id)
+        if self.directory:
+            self._persist(report_id, content, session)
+        return report_id
+
+    def info(self, report_id: str) -> dict | None:
+        entry = self._entry(report_id)
+        return None if entry is None else entry["info"]
+
+    def latest(self, session: str | None) -> str | None:
+        """Id of the session's most recent report, if it is still kept"""
+        if not session:
+            return None
+        with self._lock:
+            report_id = self._sessions.get(session)
+        if self.directory:
+            # The session may have queried another process since
+            try:
+                with open(self._session_path(session)) as f:
+                    report_id = f.read().strip()
+            except OSError:
+                pass
+        return report_id if report_id and self.info(report_id) is not None else None
+
+    def export(self, report_id: str, fmt: str, timeout: float = RENDER_TIMEOUT) -> bytes | None:
+        """The report as a fmt file, drawn on first use; None for unknown or expired reports"""
+        entry = self._entry(report_id)
+        if entry is None:
+            return None
+        # One export per report at a time: a Figure must not be drawn or saved from two threads
+        with entry["lock"]:
+            content = entry["exports"].get(fmt)
+            if content is not None:
+                return content
+            content = self._read(report_id, fmt)
+            if content is None:
+                if self.processes is not None:
+                    content = self.processes.submit(render, self.draw, self.exporters[fmt], entry["spec"],
+                                                    entry["info"]).result(timeout)
+                else:
+                    # In the exporting request's context, so drawing and saving count towards its stage timings
+                    content = self.pool.submit(contextvars.copy_context().run, render, self.draw, self.exporters[fmt],
+                                               entry["spec"], entry["info"]).result(timeout)
+                if self.directory:
+                    _write(self._path(report_id, fmt), content)
+            entry["exports"][fmt] = content
+        with self._lock:
+            # The report may have been evicted while it was drawn
+            if self._reports.get(report_id) is entry:
+                entry["bytes"] += len(content)
+                self._bytes += len(content)
+                self._evict(keep=report_id)
+        return content
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"reports": len(self._reports), "sessions": len(self._sessions), "bytes": self._bytes}
+
+    def _new_entry(self, spec, info, session, size: int) -> dict:
+        # A report is counted at its JSON size, close to what its lists and strings take in memory
+        return {"spec": spec, "info": info, "session": session, "exports": {}, "bytes": size,
+                "used": time.monotonic(), "lock": threading.Lock()}
+
+    def _entry(self, report_id: str) -> dict | None:
+        with self._lock:
+            self._evict(keep=report_id)
+            entry = self._reports.get(report_id)
+            if entry is not None:
+                entry["used"] = time.monotonic()
+                self._reports.move_to_end(report_id)
+        if entry is not None:
+            self._touch(report_id)
+            return entry
+        entry = self._load(report_id)
+        if entry is None:
+            return None
+        with self._lock:
+            if report_id not in self._reports:
+                self._reports[report_id] = entry
+                self._bytes += entry["bytes"]
+            entry = self._reports[report_id]
+            self._evict(keep=report_id)
+        return entry
+
+    def _evict(self, keep: str | None = None):
+        # Callers hold _lock; entries are in least recently used order. keep, a report being added
+        # or used, is not dropped for size even when it alone is over max_bytes: its id was handed out
+        expired = time.monotonic() - self.ttl
+        while True:
+            report_id = next((rid for rid, entry in self._reports.items()
+                              if rid != keep or entry["used"] < expired), None)
+            if report_id is None:
+                break
+            entry = self._reports[report_id]
+            if (len(self._reports) <= self.max_entries and self._bytes <= self.max_bytes
+                    and entry["used"] >= expired):
+                break
+            del self._reports[report_id]
+            self._bytes -= entry["bytes"]
+            if entry["session"] and self._sessions.get(entry["session"]) == report_id:
+                del self._sessions[entry["session"]]
+
+    def _path(self, report_id: str, suffix: str) -> str:
+        return os.path.join(self.directory, f"{report_id}.{suffix}")
+
+    def _session_path(self, session: str) -> str:
+        return os.path.join(self.directory, f"session-{hashlib.sha1(session.encode()).hexdigest()}")
+
+    def _persist(self, report_id, content, session):
+        try:
+            _write(self._path(report_id, "report"), content)
+            if session:
+                _write(self._session_path(session), report_id.encode())
+            self._sweep()
+        except OSError as e:
+            logger.warning("⚠️ Cannot write report %s to %s: %s", report_id, self.directory, e)
+
+    def _load(self, report_id: str) -> dict | None:
+        """A report another process added, from the shared directory"""
+        if not self.directory or not REPORT_ID.match(report_id):
+            return None
+        path = self._path(report_id, "report")
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path, "rb") as f:
+                content = f.read()
+            spec, info, session = loads_report(content)
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        return self._new_entry(spec, info, session, len(content))
+
+    def _read(self, report_id: str, fmt: str) -> bytes | None:
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(report_id, fmt), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _touch(self, report_id: str):
+        # Other processes sweep by modification time, so a report in use stays on disk
+        if self.directory:
+            try:
+                os.utime(self._path(report_id, "report"))
+            except OSError:
+                pass
+
+    def _sweep(self):
+        # Files of reports no process has used for ttl seconds, checked at most once a minute
+        now = time.time()
+        if now - self._swept < min(60.0, self.ttl):
+            return
+        self._swept = now
+        expired = now - self.ttl
+        with os.scandir(self.directory) as entries:
+            for item in entries:
+                try:
+                    if item.stat().st_mtime < expired:
+                        os.remove(item.path)
+                except OSError:
+                    pass
@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+# Bytes of chart results kept across all plans; the least recently used are dropped first
+RESULT_CACHE_BYTES = int(os.getenv("RESULT_CACHE_BYTES", str(32 * 1024 * 1024)))
+
+
+def plan_key(plan: dict, fields: dict) -> str:
+    """Stable hash of the plan fields a chart depends on, with their defaults filled in.
+
+    Filters are hashed in plan order: an exact-or-partial name filter falls
+    back to partial matches only when no row kept by the filters before it
+    matches exactly, so reordering them can change the rows they select.
+    """
+    semantic = {field: plan.get(field, default) for field, default in fields.items()}
+    return hashlib.sha256(json.dumps(semantic, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class ResultCache:
+    """LRU cache of computed chart results, bounded by their total size.
+
+    Entries are keyed by the data snapshot's version and a hash of the plan
+    fields the result depends on (fields maps each to its default), so two
+    questions worded differently that plan the same chart share one result.
+    Once a newer snapshot is seen the entries of older ones are dropped, and
+    results of older snapshots still answering requests are not kept.
+
+    Results are shared between requests and must not be modified. Hits and
+    misses are counted per endpoint.
+    """
+
+    def __init__(self, fields: dict, max_bytes: int = RESULT_CACHE_BYTES):
+        self.fields = fields
+        self.max_bytes = max_bytes
+        self.version = None
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def get(self, data, plan: dict, compute, endpoint: str = "query"):
+        """compute() for plan on data, from the cache when the same chart was computed before"""
+        key = (data.version, plan_key(plan, self.fields))
+        with self._lock:
+            counts = self._counts.setdefault(endpoint, {"hits": 0, "misses": 0})
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                counts["hits"] += 1
+                return entry[0]
+            counts["misses"] += 1
+
+        result = compute()
+        size = len(pickle.dumps(result, pickle.HIGHEST_PROTOCOL))
+        with self._lock:
+            if self.version is None or data.version > self.version:
+                self._drop_all()
+                self.invalidations += self.version is not None
+                self.version = data.version
+            if data.version == self.version and size <= self.max_bytes and key not in self._entries:
+                self._entries[key] = (result, size)
+                self._bytes += size
+                while self._bytes > self.max_bytes:
+                    _, (_, dropped) = self._entries.popitem(last=False)
+                    self._bytes -= dropped
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._drop_all()
+
+    def stats(self) -> dict:
+        with self._lock:
+            endpoints = {endpoint: dict(counts, hit_rate=_rate(counts)) for endpoint, counts in self._counts.items()}
+            hits = sum(counts["hits"] for counts in self._counts.values())
+            misses = sum(counts["misses"] for counts in self._counts.values())
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "data_version": self.version,
+                "invalidations": self.invalidations,
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": _rate({"hits": hits, "misses": misses}),
+                "endpoints": endpoints,
+            }
+
+    def _drop_all(self):
+        # Callers hold _lock
+        self._entries.clear()
+        self._bytes = 0
+
+
+def _rate(counts: dict) -> float:
+    lookups = counts["hits"] + counts["misses"]
+    return round(counts["hits"] / lookups, 3) if lookups else 0.0
@@ -0,0 +1,116 @@
+import numpy as np
+
+from sales_store import NAT_DAY, SalesStore
+
+# Below this fraction of all rows a selection is kept as row positions rather than a mask
+SPARSE_FRACTION = 1 / 16
+
+
+def _calendar(store: SalesStore) -> dict:
+    """Day numbers from the store's first to last day with their month and year"""
+    valid = store.days[store.days != NAT_DAY]
+    first, last = (int(valid.min()), int(valid.max())) if len(valid) else (0, -1)
+    days = np.arange(first, last + 1)
+    dates = days.astype("datetime64[D]")
+    return {
+        "first": first,
+        "days": days,
+        "months": dates.astype("datetime64[M]").astype(np.int64) % 12 + 1,
+        "years": dates.astype("datetime64[Y]").astype(np.int64) + 1970,
+        # Position of every row's day in the table; unparseable dates point one past the end
+        "offsets": np.where(store.days == NAT_DAY, len(days), store.days - first).astype(np.int32),
+    }
+
+
+class RowFilter:
+    """Plan filters compiled into one selection over a store's rows.
+
+    Text filters are resolved to category codes on the distinct names and
+    date filters to a table over the store's days, so each filter costs one
+    vectorized lookup per row and no frame is built until the caller
+    materializes rows(). The selection is a boolean mask over all rows, or
+    the sorted positions straight from the text index posting lists when a
+    filter keeps only a small share of rows, so a selective filter is never
+    followed by full-length scans. Filters combine with AND in the order given.
+    """
+
+    def __init__(self, store: SalesStore):
+        self.store = store
+        self.mask = None
+        self.positions = None
+        self._calendar = store.derived("calendar", lambda: _calendar(store))
+        self._days_ok = None
+
+    def keep_codes(self, col: str, codes: np.ndarray):
+        """Keep rows whose value in col has one of codes"""
+        index = self.store.indexes.get(col)
+        # One code's posting list is a ready-made slice; several are merged only when small
+        if self._untouched() and index is not None and (
+                len(codes) == 1 or index.count(codes) < len(self.store) * SPARSE_FRACTION):
+            self.positions = index.rows(codes)
+        elif self.positions is not None:
+            self.positions = self.positions[self.store.code_mask(col, codes, self.positions)]
+        else:
+            self._and(self.store.code_mask(col, codes))
+
+    def keep_codes_or(self, col: str, codes: np.ndarray, fallback: np.ndarray):
+        """Keep rows with one of codes if any row kept so far has one, else rows with one of fallback"""
+        saved = (None if self.mask is None else self.mask.copy(), self.positions, self._days_ok)
+        self.keep_codes(col, codes)
+        self._apply_days()
+        if not self._empty():
+            return
+        self.mask, self.positions, self._days_ok = saved
+        self.keep_codes(col, fallback)
+
+    def keep_months(self, months: list):
+        self._keep_days(np.isin(self._calendar["months"], months))
+
+    def keep_years(self, years: list):
+        self._keep_days(np.isin(self._calendar["years"], years))
+
+    def keep_day_range(self, start_day: int, end_day: int):
+        """Keep rows dated from start_day to end_day (day numbers, inclusive)"""
+        days = self._calendar["days"]
+        self._keep_days((days >= start_day) & (days <= end_day))
+
+    def rows(self) -> np.ndarray:
+        """Sorted positions of the rows passing every filter"""
+        self._apply_days()
+        if self.positions is not None:
+            return self.positions
+        if self.mask is None:
+            return self.store.all_rows()
+        return np.flatnonzero(self.mask)
+
+    def _untouched(self) -> bool:
+        # Pending date filters do not count: they commute with text filters and apply last
+        return self.mask is None and self.positions is None
+
+    def _empty(self) -> bool:
+        if self.positions is not None:
+            return len(self.positions) == 0
+        if self.mask is not None:
+            return not self.mask.any()
+        return len(self.store) == 0
+
+    def _keep_days(self, ok: np.ndarray):
+        # Date filters only touch the small per-day table until rows are needed
+        self._days_ok = ok if self._days_ok is None else self._days_ok & ok
+
+    def _apply_days(self):
+        if self._days_ok is None:
+            return
+        table = np.append(self._days_ok, False)
+        self._days_ok = None
+        offsets = self._calendar["offsets"]
+        if self.positions is not None:
+            self.positions = self.positions[table[offsets[self.positions]]]
+        else:
+            self._and(table[offsets])
+
+    def _and(self, mask: np.ndarray):
+        if self.mask is None:
+            self.mask = mask
+        else:
+            self.mask &= mask
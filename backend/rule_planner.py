@@ -0,0 +1,203 @@
+import datetime
+import re
+
+MONTHS = {
+    "january": 1, "february": 2, "march": 3, "april": 4, "may": 5, "june": 6, "july": 7,
+    "august": 8, "september": 9, "october": 10, "november": 11, "december": 12,
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "jun": 6, "jul": 7, "aug": 8, "sep": 9, "sept": 9,
+    "oct": 10, "nov": 11, "dec": 12,
+}
+# "may" is also a verb ("may i get ..."): it is a month only next to a date word, a year or a day
+MAY_AS_MONTH = re.compile(r"\b(?:in|for|during|of|from|since|till|until|to|before|after)\s+may\b"
+                          r"|\bmay\s+(?:20\d\d|\d{1,2}(?:st|nd|rd|th)?)\b")
+MONTH_NAMES = ["", "January", "February", "March", "April", "May", "June", "July", "August",
+               "September", "October", "November", "December"]
+
+# Phrases rewritten before parsing so one spelling covers its variants
+SYNONYMS = {
+    "e-commerce": "ecom", "ecommerce": "ecom", "e commerce": "ecom", "offline": "sas",
+    "versus": "vs", "compared to": "vs", "compare": "vs", "comparison": "vs",
+    "month wise": "monthly", "day wise": "daily", "date wise": "daily",
+}
+MEASURE_WORDS = {
+    "revenue": ["revenue", "sales", "amount", "value", "turnover", "income", "earnings"],
+    "quantity": ["quantity", "qty", "units", "volume", "how many units"],
+    "count": ["count", "number of transactions", "number of bills", "number of orders", "transactions",
+              "bills", "orders", "how many"],
+}
+PIE_WORDS = ["distribution", "breakdown", "share", "split", "proportion", "contribution"]
+TIME_AXES = {
+    "Month": ["monthly", "by month", "by months", "each month", "per month", "months"],
+    "Date": ["daily", "by day", "by date", "each day", "per day", "day by day", "trend", "days", "dates"],
+}
+# Words that carry no planning information on their own
+STOPWORDS = set("""
+a an the me us our we i show give get list display tell what which who is are was were of in for at on
+by to from with and across all each per wise chart graph plot visualize please total overall sales
+data during top best first highest most how much did do does has have made make breakdown between
+sold selling performing performance wise this month year vs
+""".split())
+
+
+def _phrase_pattern(phrase: str) -> str:
+    return r"(?<![\w-])" + re.escape(phrase) + r"(?![\w-])"
+
+
+class RulePlanner:
+    """Builds query plans for plainly templated questions without calling the model.
+
+    dimensions describes the text columns of one dataset: each entry has the
+    x axis name, the words that ask for that axis, and optionally the plan key
+    for filters on it plus the data_analysis key holding its known values.
+    plan() returns a plan in the same format the model is asked to produce,
+    or None when any part of the query is not understood, so those queries
+    still go to the model. With dual_comparisons, "X vs Y" of one dimension
+    becomes a dual_metrics plan, as the model is told to do.
+    """
+
+    def __init__(self, dimensions: list, measures: dict, dual_comparisons: bool = False):
+        self.dimensions = dimensions
+        self.measures = measures
+        self.dual_comparisons = dual_comparisons
+
+    def vocabulary(self, data_analysis: dict) -> dict:
+        """{lowercased phrase: (dimension, value)} for the known values of filterable dimensions"""
+        vocab = {}
+        for dim in self.dimensions:
+            for value in data_analysis.get(dim.get("values"), []) or []:
+                name = str(value).strip()
+                phrases = {name.lower()}
+                # "Sales - Ecom" is asked for as "ecom"
+                if " - " in name:
+                    phrases.add(name.split(" - ", 1)[1].lower())
+                for phrase in phrases:
+                    if vocab.get(phrase, (dim, value)) != (dim, value):
+                        vocab[phrase] = None
+                    else:
+                        vocab[phrase] = (dim, value)
+        return {phrase: match for phrase, match in vocab.items() if match is not None and len(phrase) > 1}
+
+    def plan(self, query: str, data_analysis: dict, today: datetime.date | None = None) -> dict | None:
+        text = " " + re.sub(r"[^\w\s-]", " ", query.lower()) + " "
+        text = re.sub(r"\s+", " ", text)
+        for phrase, replacement in SYNONYMS.items():
+            text = re.sub(_phrase_pattern(phrase), replacement, text)
+        today = today or datetime.date.today()
+
+        def take(phrase):
+            nonlocal text
+            pattern = _phrase_pattern(phrase)
+            if not re.search(pattern, text):
+                return False
+            text = re.sub(pattern, " ", text)
+            return True
+
+        # Known values of branches, sections, sales groups, ... longest phrase first
+        mentions = []
+        for phrase, (dim, value) in sorted(self.vocabulary(data_analysis).items(), key=lambda kv: -len(kv[0])):
+            match = re.search(_phrase_pattern(phrase), text)
+            if match:
+                mentions.append((match.start(), dim, value))
+                take(phrase)
+        filters = {}
+        for _, dim, value in sorted(mentions, key=lambda m: m[0]):
+            values = filters.setdefault(dim["filter"], [])
+            if value not in values:
+                values.append(value)
+
+        limit = None
+        match = re.search(r"\b(?:top|best|first|highest)\s+(\d{1,3})\b", text)
+        if match:
+            limit = int(match.group(1))
+            text = text.replace(match.group(0), " ")
+        if re.search(r"\b(bottom|lowest|least|worst)\b", text):
+            return None
+
+        # "this month" and "last month" are calendar months of one year, not that month of every year
+        relative = []
+        if take("this month"):
+            relative.append(today.replace(day=1))
+        if take("last month"):
+            relative.append((today.replace(day=1) - datetime.timedelta(days=1)).replace(day=1))
+        months = []
+        for word, number in MONTHS.items():
+            if word == "may" and not MAY_AS_MONTH.search(text):
+                continue
+            if take(word) and number not in months:
+                months.append(number)
+        if len(relative) > 1 or (relative and months):
+            return None
+        years = [int(y) for y in re.findall(r"\b(20\d\d)\b", text)]
+        text = re.sub(r"\b20\d\d\b", " ", text)
+        if take("this year"):
+            years.append(today.year)
+
+        x_axis = None
+        for axis, words in TIME_AXES.items():
+            if any([take(word) for word in words]):
+                x_axis = x_axis or axis
+        for dim in sorted(self.dimensions, key=lambda d: -max(len(w) for w in d["words"])):
+            if any([take(word) for word in sorted(dim["words"], key=len, reverse=True)]):
+                x_axis = x_axis or dim["axis"]
+
+        found = {}
+        measure_words = [(word, name) for name, words in MEASURE_WORDS.items() for word in words]
+        for word, name in sorted(measure_words, key=lambda wn: -len(wn[0])):
+            if take(word):
+                found.setdefault(name, []).append(word)
+        # "sales quantity" asks for quantity; any other mix of measures goes to the model
+        if len(found) > 1 and found.get("revenue") == ["sales"]:
+            del found["revenue"]
+        if len(found) > 1:
+            return None
+        measure = next(iter(found), "revenue")
+        pie = any([take(word) for word in PIE_WORDS])
+
+        compare = " vs " in text
+        dual = False
+        if compare:
+            compared = [dim for dim in self.dimensions if len(filters.get(dim.get("filter"), [])) > 1]
+            if len(compared) != 1 or months[1:] or x_axis not in (None, compared[0]["axis"]):
+                return None
+            dual = self.dual_comparisons
+            x_axis = compared[0]["axis"]
+        elif x_axis is None:
+            return None
+
+        # Anything left that is not filler means the query says more than these rules understand
+        leftover = [word for word in text.split() if word not in STOPWORDS]
+        if leftover:
+            return None
+
+        y_axis = self.measures[measure]
+        plan = {
+            "chart_type": "pie" if pie else "line" if x_axis == "Date" else "bar",
+            "x_axis": x_axis,
+            "y_axis": y_axis,
+            "aggregation": "count" if y_axis == self.measures["count"] else "sum",
+            "limit": limit,
+            "dual_metrics": dual,
+        }
+        plan.update(filters)
+        if relative:
+            first = relative[0]
+            last = (first.replace(day=28) + datetime.timedelta(days=4)).replace(day=1) - datetime.timedelta(days=1)
+            plan["date_filter"] = [first.isoformat(), last.isoformat()]
+        if months:
+            plan["month_filter"] = months[0] if len(months) == 1 else months
+        if years:
+            plan["year_filter"] = years[0] if len(years) == 1 else years
+        plan["title"] = self.title(plan, measure, filters, months, years, relative)
+        return plan
+
+    def title(self, plan: dict, measure: str, filters: dict, months: list, years: list, relative: list = ()) -> str:
+        labels = {dim["axis"]: dim["label"] for dim in self.dimensions}
+        labels.update({"Month": "Month", "Date": "Date"})
+        title = f"{measure.title()} by {labels.get(plan['x_axis'], plan['x_axis'])}"
+        if plan.get("limit"):
+            title = f"Top {plan['limit']}: {title}"
+        scope = [" vs ".join(map(str, values)) for values in filters.values()]
+        scope += [" vs ".join(MONTH_NAMES[m] for m in months)] if months else []
+        scope += [f"{MONTH_NAMES[first.month]} {first.year}" for first in relative]
+        scope += [" vs ".join(map(str, years))] if years else []
+        return f"{title} - {', '.join(scope)}" if scope else title
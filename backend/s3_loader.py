@@ -0,0 +1,191 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from log import get_logger
+
+logger = get_logger("s3_loader")
+
+MANIFEST_FILE = "manifest.json"
+
+
+def _read_manifest(cache_dir: str) -> dict:
+    try:
+        with open(os.path.join(cache_dir, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_atomic(path: str, data: bytes):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _overlapping_row_groups(metadata, column: str, start: pd.Timestamp | None, end: pd.Timestamp | None) -> list:
+    """Row groups whose min/max statistics for a date column may hold dates in [start, end)"""
+    position = next((i for i in range(metadata.num_columns) if metadata.schema.column(i).path == column), None)
+    groups = []
+    for group in range(metadata.num_row_groups):
+        stats = metadata.row_group(group).column(position).statistics if position is not None else None
+        if stats is not None and stats.has_min_max:
+            try:
+                low, high = pd.Timestamp(stats.min), pd.Timestamp(stats.max)
+                if (start is not None and high < start) or (end is not None and low >= end):
+                    continue
+            except (TypeError, ValueError):
+                pass
+        groups.append(group)
+    return groups
+
+
+def read_parquet(source, columns: list | None = None, dictionary_columns: list = (), date_column: str | None = None,
+                 start: pd.Timestamp | None = None, end: pd.Timestamp | None = None) -> pa.Table:
+    """Read one parquet file (a path or a pyarrow buffer) as an Arrow table.
+
+    Only the given columns are read (those the file lacks are skipped) and
+    dictionary_columns come back dictionary-encoded, so text never becomes
+    one Python string per row. With start and/or end, row groups whose
+    date_column statistics lie outside [start, end) are not read at all and
+    the remaining rows are filtered to the range.
+    """
+    metadata = pq.read_metadata(source)
+    names = metadata.schema.to_arrow_schema().names
+    parquet_file = pq.ParquetFile(source, metadata=metadata, memory_map=isinstance(source, str),
+                                  read_dictionary=[c for c in dictionary_columns if c in names])
+    columns = None if columns is None else [c for c in columns if c in names]
+    bounded = date_column in names and (start is not None or end is not None)
+    if not bounded:
+        return parquet_file.read(columns=columns)
+
+    # Row groups are only pruned on real date/timestamp columns; text dates are not ordered like the dates they spell
+    date_type = parquet_file.schema_arrow.field(date_column).type
+    temporal = pa.types.is_timestamp(date_type) or pa.types.is_date(date_type)
+    groups = _overlapping_row_groups(metadata, date_column, start, end) if temporal else range(metadata.num_row_groups)
+    table = parquet_file.read_row_groups(groups, columns=columns)
+    dates = pd.to_datetime(table.column(date_column).to_pandas(), errors="coerce")
+    keep = np.ones(len(dates), dtype=bool)
+    if start is not None:
+        keep &= (dates >= start).to_numpy()
+    if end is not None:
+        keep &= (dates < end).to_numpy()
+    return table.filter(pa.array(keep))
+
+
+def _is_missing(error: Exception) -> bool:
+    """Whether an S3 error says the object does not exist (rather than that it could not be checked)"""
+    code = str(getattr(error, "response", {}).get("Error", {}).get("Code", ""))
+    return code in ("404", "NoSuchKey", "NotFound")
+
+
+def _fetch_part(s3_client, bucket: str, key: str, cache_dir: str | None, cached: dict | None, read_options: dict):
+    """Return (Arrow table, manifest entry) for one parquet part, using the local copy when its ETag still matches"""
+    local_path = None
+    if cache_dir:
+        local_path = os.path.join(cache_dir, hashlib.sha1(f"{bucket}/{key}".encode()).hexdigest() + ".parquet")
+        if cached and os.path.exists(local_path):
+            try:
+                etag = s3_client.head_object(Bucket=bucket, Key=key)["ETag"]
+            except Exception as e:
+                if _is_missing(e):
+                    raise
+                logger.warning("⚠️ Cannot validate %s (%s), using local snapshot", key, e)
+                etag = cached["etag"]
+            if etag == cached["etag"]:
+                try:
+                    table = read_parquet(local_path, **read_options)
+                    logger.info("📦 %s: local snapshot is current", key)
+                    return table, cached
+                except Exception as e:
+                    logger.warning("⚠️ Local snapshot of %s is unreadable (%s), downloading it again", key, e)
+
+    response = s3_client.get_object(Bucket=bucket, Key=key)
+    parquet_data = response["Body"].read()
+    entry = {"etag": response.get("ETag")}
+    if local_path:
+        _write_atomic(local_path, parquet_data)
+    logger.info("⬇️ %s: downloaded %.1f MB", key, len(parquet_data) / 1e6)
+    return read_parquet(pa.BufferReader(parquet_data), **read_options), entry
+
+
+def load_parquet_parts(s3_client, bucket: str, keys: list, cache_dir: str | None = None, max_workers: int = 8,
+                       read_options: dict | None = None) -> tuple:
+    """Load parquet parts from S3 concurrently and concatenate them once.
+
+    With a cache_dir each part is kept on disk next to its ETag; on the next
+    load a part is only downloaded again when its ETag has changed. Parts that
+    fail to load are skipped, like before. read_options are passed to
+    read_parquet for each part, and dictionary-encoded columns become
+    categoricals. Returns (dataframe or None, {key: ETag} of the parts that
+    loaded).
+    """
+    manifest = {}
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        manifest = _read_manifest(cache_dir)
+    if not keys:
+        return None, {}
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(keys)))) as pool:
+        futures = [pool.submit(_fetch_part, s3_client, bucket, key, cache_dir, manifest.get(key), read_options or {})
+                   for key in keys]
+
+    tables = []
+    new_manifest = {}
+    for key, future in zip(keys, futures):
+        try:
+            table, entry = future.result()
+        except Exception as e:
+            logger.warning("⚠️ Failed to load %s: %s", key, e)
+            continue
+        logger.debug("Loaded %d records from %s", table.num_rows, key)
+        tables.append(table)
+        new_manifest[key] = entry
+
+    if cache_dir:
+        merged = {**manifest, **new_manifest}
+        if merged != manifest:
+            _write_atomic(os.path.join(cache_dir, MANIFEST_FILE), json.dumps(merged, indent=2).encode())
+
+    etags = {key: entry["etag"] for key, entry in new_manifest.items()}
+    if not tables:
+        return None, etags
+    # Parts may differ in columns or numeric widths; dictionaries are unified when converting
+    table = pa.concat_tables(tables, promote_options="permissive")
+    del tables
+    return table.to_pandas(split_blocks=True, self_destruct=True), etags
+
+
+def current_etags(s3_client, bucket: str, keys: list, max_workers: int = 8) -> dict:
+    """{key: ETag} for the keys that currently exist in S3, via concurrent HEAD requests.
+
+    A key S3 answers 404 for is left out; any other failure (network,
+    permissions, throttling) is raised, since it says nothing about the part.
+    """
+    def head(key):
+        try:
+            return s3_client.head_object(Bucket=bucket, Key=key)["ETag"]
+        except Exception as e:
+            if _is_missing(e):
+                return None
+            raise
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(keys) or 1))) as pool:
+        etags = dict(zip(keys, pool.map(head, keys)))
+    return {key: etag for key, etag in etags.items() if etag is not None}
+
+
+def list_parquet_keys(s3_client, bucket: str, prefix: str) -> list:
+    """All parquet keys under prefix, in key order"""
+    keys = []
+    for page in s3_client.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix):
+        keys += [obj["Key"] for obj in page.get("Contents", []) if obj["Key"].endswith(".parquet")]
+    return sorted(keys)
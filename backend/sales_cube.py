@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+from sales_store import SalesStore
+
+COUNT_COLUMN = "Row_Count"
+
+
+def build_daily_cube(store: SalesStore, dimensions: list) -> SalesStore:
+    """Pre-aggregate a sales store to one row per dimension combination per day.
+
+    Each cube row carries the sum of every measure plus the number of raw rows
+    behind it. The cube is itself a SalesStore with the same categories and
+    text indexes, so plan filters run against it unchanged.
+    """
+    dimensions = [d for d in dimensions if d in store.frame.columns]
+    keys = {col: store.frame[col] for col in dimensions}
+    keys["_day"] = store.days
+    measures = {col: store.frame[col].astype(np.float64) for col in store.measures}
+    grouped = pd.DataFrame({**keys, **measures}).groupby(list(keys), observed=True, dropna=False, sort=False)
+
+    cube = grouped[list(measures)].sum()
+    cube[COUNT_COLUMN] = grouped.size().astype(np.int64)
+    cube = cube.reset_index()
+
+    days = cube.pop("_day").to_numpy(dtype=np.int32)
+    for col in dimensions:
+        cube[col] = cube[col].astype(store.frame[col].dtype)
+    return SalesStore(cube, days, list(measures) + [COUNT_COLUMN], store.date_col,
+                      index_columns=[c for c in store.indexes if c in dimensions])
+
+
+def row_counts(frame: pd.DataFrame, keys) -> pd.Series:
+    """Number of raw rows per group, for raw rows or materialized cube rows"""
+    if COUNT_COLUMN in frame.columns:
+        return frame.groupby(keys, observed=True)[COUNT_COLUMN].sum()
+    if isinstance(keys, str):
+        return frame[keys].value_counts()
+    return frame.groupby(keys, observed=True).size()
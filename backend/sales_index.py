@@ -0,0 +1,168 @@
+import numpy as np
+import pandas as pd
+
+REGEX_CHARS = set(".^$*+?{}[]\\|()")
+CONTAINS_CACHE_SIZE = 1024
+
+
+def is_literal(term: str) -> bool:
+    """True when str.contains would treat term as a plain substring"""
+    return not (set(term) & REGEX_CHARS)
+
+
+class TextIndex:
+    """Inverted index over the distinct values of one categorical column.
+
+    Lowercased names and their trigrams map to category codes, and each code
+    maps to a sorted posting list of row positions. Lookups only touch the
+    distinct names; rows are only touched when posting lists are merged.
+    """
+
+    def __init__(self, values: pd.Series, postings: tuple | None = None):
+        self.names = [str(name) for name in values.cat.categories]
+        self.lowered = [name.lower() for name in self.names]
+        self.codes = values.array.codes
+
+        # Posting lists stored CSR-style: rows of code c are order[offsets[c]:offsets[c + 1]]
+        if postings is None:
+            order = np.argsort(self.codes, kind="stable")
+            sorted_codes = self.codes[order]
+            self.order = order[sorted_codes >= 0].astype(np.int32)
+            self.offsets = np.searchsorted(sorted_codes[sorted_codes >= 0], np.arange(len(self.names) + 1))
+        else:
+            self.order, self.offsets = postings
+
+        self.exact = {}
+        self.exact_stripped = {}
+        self.by_name = {}
+        self.trigrams = {}
+        for code, (name, lowered) in enumerate(zip(self.names, self.lowered)):
+            self.exact.setdefault(lowered, []).append(code)
+            self.exact_stripped.setdefault(lowered.strip(), []).append(code)
+            self.by_name.setdefault(name, []).append(code)
+            for i in range(len(lowered) - 2):
+                self.trigrams.setdefault(lowered[i:i + 3], set()).add(code)
+        self._contains_cache = {}
+        self._lowered_index = None
+
+    def extended(self, values: pd.Series) -> "TextIndex":
+        """Index for values, whose leading rows (and categories) are the ones indexed here.
+
+        Only the appended rows are sorted; each new posting list is the old one
+        followed by the appended rows holding that code.
+        """
+        old_rows = len(self.codes)
+        appended = TextIndex(values.iloc[old_rows:])
+        empty = np.empty(0, dtype=np.int32)
+        parts = []
+        offsets = [0]
+        for code in range(len(values.cat.categories)):
+            old = self.order[self.offsets[code]:self.offsets[code + 1]] if code < len(self.names) else empty
+            new = appended.order[appended.offsets[code]:appended.offsets[code + 1]] + old_rows
+            parts += [old, new]
+            offsets.append(offsets[-1] + len(old) + len(new))
+        order = np.concatenate(parts).astype(np.int32) if parts else empty
+        return TextIndex(values, postings=(order, np.array(offsets)))
+
+    def codes_equal(self, term: str, strip: bool = False) -> np.ndarray:
+        """Codes whose lowercased name equals term (case-insensitive)"""
+        lookup = self.exact_stripped if strip else self.exact
+        key = term.lower().strip() if strip else term.lower()
+        return np.array(lookup.get(key, []), dtype=np.int64)
+
+    def codes_isin(self, values: list) -> np.ndarray:
+        """Codes whose name is exactly one of values (case-sensitive)"""
+        codes = [code for value in set(values) for code in self.by_name.get(value, [])]
+        return np.array(sorted(codes), dtype=np.int64)
+
+    def codes_containing(self, term: str) -> np.ndarray:
+        """Codes whose name contains term, case-insensitive, like str.contains(case=False)"""
+        cached = self._contains_cache.get(term)
+        if cached is not None:
+            return cached
+
+        if not is_literal(term):
+            hits = pd.Index(self.names).str.contains(term, case=False, na=False)
+            codes = np.flatnonzero(np.asarray(hits, dtype=bool))
+        else:
+            lowered = term.lower()
+            candidates = self._trigram_candidates(lowered)
+            codes = np.array(sorted(c for c in candidates if lowered in self.lowered[c]), dtype=np.int64)
+
+        if len(self._contains_cache) >= CONTAINS_CACHE_SIZE:
+            self._contains_cache.clear()
+        self._contains_cache[term] = codes
+        return codes
+
+    def codes_containing_any(self, terms: list) -> np.ndarray:
+        """Codes whose name contains at least one of terms.
+
+        Literal terms are matched together in a single pass over the distinct
+        names with one alternation pattern, run by the vectorized string
+        engine, so the cost hardly grows with the number of terms.
+        """
+        terms = sorted(set(terms))
+        if len(terms) == 1:
+            return self.codes_containing(terms[0])
+        key = ("any",) + tuple(terms)
+        cached = self._contains_cache.get(key)
+        if cached is not None:
+            return cached
+
+        codes = np.empty(0, dtype=np.int64)
+        literal = [term.lower() for term in terms if is_literal(term)]
+        if literal:
+            # Literal terms hold no regex metacharacters, so they join into a pattern as they are
+            if self._lowered_index is None:
+                self._lowered_index = pd.Index(self.lowered, dtype=object)
+            hits = self._lowered_index.str.contains("|".join(literal), regex=True)
+            codes = np.flatnonzero(np.asarray(hits, dtype=bool))
+        for term in terms:
+            if not is_literal(term):
+                codes = np.union1d(codes, self.codes_containing(term))
+
+        if len(self._contains_cache) >= CONTAINS_CACHE_SIZE:
+            self._contains_cache.clear()
+        self._contains_cache[key] = codes
+        return codes
+
+    def _trigram_candidates(self, term: str):
+        if len(term) < 3:
+            return range(len(self.names))
+        candidates = None
+        for i in range(len(term) - 2):
+            codes = self.trigrams.get(term[i:i + 3])
+            if not codes:
+                return ()
+            candidates = set(codes) if candidates is None else candidates & codes
+        return candidates
+
+    def codes_containing_all(self, terms: list) -> np.ndarray:
+        """Codes whose name contains every one of terms"""
+        codes = np.arange(len(self.names), dtype=np.int64)
+        for term in terms:
+            codes = np.intersect1d(codes, self.codes_containing(term), assume_unique=True)
+        return codes
+
+    def count(self, codes: np.ndarray) -> int:
+        """Number of rows holding any of codes, from the posting list lengths"""
+        codes = np.asarray(codes, dtype=np.int64)
+        return int((self.offsets[codes + 1] - self.offsets[codes]).sum())
+
+    def rows(self, codes: np.ndarray) -> np.ndarray:
+        """Sorted row positions of all rows holding any of codes"""
+        if len(codes) == 0:
+            return np.empty(0, dtype=np.int64)
+        if len(codes) == 1:
+            code = int(codes[0])
+            return self.order[self.offsets[code]:self.offsets[code + 1]]
+        parts = [self.order[self.offsets[c]:self.offsets[c + 1]] for c in codes]
+        return np.sort(np.concatenate(parts))
+
+    def select(self, rows: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """Keep the rows (a sorted subset of all rows) that hold any of codes"""
+        if len(rows) == len(self.codes):
+            return self.rows(codes)
+        hits = np.zeros(len(self.names) + 1, dtype=bool)
+        hits[codes] = True
+        return rows[hits[self.codes[rows]]]
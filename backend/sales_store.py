@@ -0,0 +1,319 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from sales_index import TextIndex
+
+# Day numbers are days since 1970-01-01; unparseable dates get this sentinel
+NAT_DAY = np.iinfo(np.int32).min
+
+_versions = itertools.count(1)
+
+
+def to_day_number(value) -> int:
+    """Convert a date-like value to its day number"""
+    ts = pd.Timestamp(value)
+    return int((ts.normalize() - pd.Timestamp("1970-01-01")).days)
+
+
+def _equals(term: str, strip: bool):
+    key = term.lower().strip() if strip else term.lower()
+    if strip:
+        return lambda names: names.str.lower().str.strip() == key
+    return lambda names: names.str.lower() == key
+
+
+def _contains_all(terms: list):
+    def contains_all(names):
+        mask = np.ones(len(names), dtype=bool)
+        for term in terms:
+            mask &= np.asarray(names.str.contains(term, case=False, na=False), dtype=bool)
+        return mask
+    return contains_all
+
+
+def _sorted_categories(values: pd.Categorical) -> pd.Categorical:
+    """values with its categories in sorted order, as astype("category") gives for plain values.
+
+    Categoricals read from Arrow dictionaries list categories in order of
+    appearance instead; sorting keeps codes, and so group order, independent
+    of how the data was read.
+    """
+    categories = values.categories
+    if categories.is_monotonic_increasing:
+        return values
+    try:
+        return values.reorder_categories(categories.sort_values())
+    except TypeError:
+        return values
+
+
+class SalesStore:
+    """Columnar in-memory sales data.
+
+    Text columns are held as categorical codes, measures as float32 and the
+    date as an int32 day number. Filters work on arrays of row positions and
+    only the rows a query needs are materialized into a DataFrame via take().
+    """
+
+    def __init__(self, frame: pd.DataFrame, days: np.ndarray, measures: list, date_col: str = "Date",
+                 index_columns: list = (), indexes: dict | None = None):
+        self.frame = frame
+        self.days = days
+        self.measures = measures
+        self.date_col = date_col
+        # Inverted indexes over the distinct names of the text filter columns
+        if indexes is None:
+            indexes = {col: TextIndex(frame[col]) for col in index_columns if col in frame.columns}
+        self.indexes = indexes
+        # Optional pre-aggregated SalesStore (see sales_cube.build_daily_cube)
+        self.cube = None
+        # Where the rows came from (S3 part ETags, CSV offsets), used to detect changes on refresh
+        self.sources = {}
+        # Every store is an immutable snapshot with its own version
+        self.version = next(_versions)
+        # Values derived from this snapshot (dashboard analysis, ...), see derived()
+        self._derived = {}
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, dimensions: list, measures: list, date_col: str = "Date", index_columns: list = ()) -> "SalesStore":
+        dates = pd.to_datetime(df[date_col], errors="coerce")
+        days = np.full(len(df), NAT_DAY, dtype=np.int32)
+        valid = dates.notna().to_numpy()
+        days[valid] = (dates[valid].dt.normalize() - pd.Timestamp("1970-01-01")).dt.days.to_numpy()
+
+        columns = {}
+        for col in df.columns:
+            if col == date_col:
+                continue
+            series = df[col]
+            if col in measures:
+                columns[col] = pd.to_numeric(series, errors="coerce").astype(np.float32).to_numpy()
+            elif (col in dimensions or series.dtype == object or pd.api.types.is_string_dtype(series.dtype)
+                  or isinstance(series.dtype, pd.CategoricalDtype)):
+                columns[col] = _sorted_categories(series.astype("category").values)
+            else:
+                columns[col] = series.to_numpy()
+        frame = pd.DataFrame(columns, index=pd.RangeIndex(len(df)))
+        return cls(frame, days, [m for m in measures if m in frame.columns], date_col, index_columns)
+
+    def append(self, other: "SalesStore") -> "SalesStore":
+        """New store with other's rows after this store's rows.
+
+        Existing category codes and row positions are unchanged, so text
+        indexes are extended rather than rebuilt. This store is not modified.
+        """
+        columns = {}
+        for col in self.frame.columns:
+            values = self.frame[col]
+            extra = other.frame[col] if col in other.frame.columns else pd.Series([None] * len(other), dtype=object)
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                if not isinstance(extra.dtype, pd.CategoricalDtype):
+                    extra = extra.astype(object).astype("category")
+                columns[col] = union_categoricals([values.values, extra.values])
+            else:
+                columns[col] = pd.concat([values, extra], ignore_index=True).to_numpy()
+        frame = pd.DataFrame(columns, index=pd.RangeIndex(len(self) + len(other)))
+        indexes = {col: index.extended(frame[col]) for col, index in self.indexes.items()}
+        store = SalesStore(frame, np.concatenate([self.days, other.days]), self.measures, self.date_col, indexes=indexes)
+        if self.cube is not None and other.cube is not None:
+            store.cube = self.cube.append(other.cube)
+        store.sources = {**self.sources, **other.sources}
+        return store
+
+    def derived(self, key: str, compute):
+        """compute() for this snapshot, memoized under key.
+
+        The store never changes after it is built, so anything computed from it
+        stays valid until a refresh publishes a new store.
+        """
+        if key not in self._derived:
+            self._derived.setdefault(key, compute())
+        return self._derived[key]
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+    @property
+    def empty(self) -> bool:
+        return len(self.frame) == 0
+
+    @property
+    def columns(self) -> list:
+        return list(self.frame.columns) + [self.date_col]
+
+    def all_rows(self) -> np.ndarray:
+        return np.arange(len(self.frame), dtype=np.int64)
+
+    def dates(self, rows: np.ndarray | None = None) -> pd.DatetimeIndex:
+        days = (self.days if rows is None else self.days[rows]).astype(np.int64)
+        days[days == NAT_DAY] = np.iinfo(np.int64).min
+        return pd.DatetimeIndex(days.view("datetime64[D]").astype("datetime64[ns]"))
+
+    def date_range(self) -> tuple:
+        valid = self.days[self.days != NAT_DAY]
+        if len(valid) == 0:
+            return pd.NaT, pd.NaT
+        epoch = pd.Timestamp("1970-01-01")
+        return epoch + pd.Timedelta(days=int(valid.min())), epoch + pd.Timedelta(days=int(valid.max()))
+
+    def distinct(self, col: str) -> list:
+        """Distinct non-null values of a column in order of first appearance"""
+        values = self.frame[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            codes = pd.unique(self.codes(col))
+            codes = codes[codes >= 0]
+            return list(values.cat.categories.take(codes))
+        return list(values.dropna().unique())
+
+    def measure_stats(self, col: str) -> dict:
+        values = self.frame[col].to_numpy()
+        if len(values) == 0 or np.isnan(values).all():
+            return {"total": 0.0, "avg": float("nan"), "max": float("nan"), "min": float("nan")}
+        # Measures are kept as float32 but hold amounts and quantities with at most two decimals:
+        # max and min are rounded to those, so the model sees 659.42 rather than 659.419983
+        return {
+            "total": float(np.nansum(values, dtype=np.float64)),
+            "avg": float(np.nanmean(values, dtype=np.float64)),
+            "max": round(float(np.nanmax(values)), 2),
+            "min": round(float(np.nanmin(values)), 2),
+        }
+
+    def match_rows(self, rows: np.ndarray, col: str, predicate) -> np.ndarray:
+        """Keep the rows whose non-null value in col satisfies predicate.
+
+        predicate receives the distinct values as a string Index and returns a
+        boolean array, so string matching never touches every row.
+        """
+        values = self.frame[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            return rows[self.code_mask(col, self.match_codes(col, predicate), rows)]
+        subset = values.take(rows)
+        present = subset.notna().to_numpy()
+        strings = pd.Index(subset[present].astype(str))
+        return rows[present][np.asarray(predicate(strings), dtype=bool)]
+
+    def match_codes(self, col: str, predicate) -> np.ndarray:
+        """Category codes of col whose name satisfies predicate (see match_rows)"""
+        categories = self.frame[col].cat.categories.astype(str)
+        return np.flatnonzero(np.asarray(predicate(categories), dtype=bool))
+
+    def select_codes(self, rows: np.ndarray, col: str, codes: np.ndarray) -> np.ndarray:
+        """Keep the rows (a sorted subset of all rows) whose value in col has one of codes"""
+        index = self.indexes.get(col)
+        if index is not None:
+            return index.select(rows, codes)
+        return rows[self.code_mask(col, codes, rows)]
+
+    def code_mask(self, col: str, codes: np.ndarray, rows: np.ndarray | None = None) -> np.ndarray:
+        """Boolean mask over rows (default all rows): does the value in col have one of codes"""
+        values = self.frame[col]
+        hits = np.zeros(len(values.cat.categories) + 1, dtype=bool)
+        hits[codes] = True
+        row_codes = self.codes(col)
+        # Null rows have code -1 and land on the trailing False
+        return hits[row_codes if rows is None else row_codes[rows]]
+
+    def codes(self, col: str) -> np.ndarray:
+        """Category code of every row of col (-1 for nulls), as a read-only view rather than a copy like .cat.codes"""
+        return self.frame[col].array.codes
+
+    def is_categorical(self, col: str) -> bool:
+        return isinstance(self.frame[col].dtype, pd.CategoricalDtype)
+
+    def notnull_rows(self, rows: np.ndarray, col: str) -> np.ndarray:
+        return self.match_rows(rows, col, lambda names: np.ones(len(names), dtype=bool))
+
+    def equal_codes(self, col: str, term: str, strip: bool = False) -> np.ndarray:
+        """Codes whose name equals term, ignoring case (and surrounding spaces if strip)"""
+        index = self.indexes.get(col)
+        if index is not None:
+            return index.codes_equal(term, strip)
+        return self.match_codes(col, _equals(term, strip))
+
+    def equal_rows(self, rows: np.ndarray, col: str, term: str, strip: bool = False) -> np.ndarray:
+        """Rows whose value equals term, ignoring case (and surrounding spaces if strip)"""
+        if self.is_categorical(col):
+            return self.select_codes(rows, col, self.equal_codes(col, term, strip))
+        return self.match_rows(rows, col, _equals(term, strip))
+
+    def contains_codes(self, col: str, terms: list) -> np.ndarray:
+        """Codes whose name contains every one of terms, with str.contains(case=False) semantics"""
+        index = self.indexes.get(col)
+        if index is not None:
+            return index.codes_containing_all(terms)
+        return self.match_codes(col, _contains_all(terms))
+
+    def contains_any_codes(self, col: str, terms: list) -> np.ndarray:
+        """Codes whose name contains at least one of terms, with str.contains(case=False) semantics"""
+        index = self.indexes.get(col)
+        if index is not None:
+            return index.codes_containing_any(terms)
+
+        def contains_any(names):
+            mask = np.zeros(len(names), dtype=bool)
+            for term in terms:
+                mask |= np.asarray(names.str.contains(term, case=False, na=False), dtype=bool)
+            return mask
+
+        return self.match_codes(col, contains_any)
+
+    def contains_rows(self, rows: np.ndarray, col: str, term: str) -> np.ndarray:
+        """Rows whose value contains term, with str.contains(case=False) semantics"""
+        return self.contains_all_rows(rows, col, [term])
+
+    def contains_all_rows(self, rows: np.ndarray, col: str, terms: list) -> np.ndarray:
+        """Rows whose value contains every one of terms"""
+        if self.is_categorical(col):
+            return self.select_codes(rows, col, self.contains_codes(col, terms))
+        return self.match_rows(rows, col, _contains_all(terms))
+
+    def isin_codes(self, col: str, values: list) -> np.ndarray:
+        """Codes whose name is exactly one of values"""
+        values = [str(v) for v in values]
+        index = self.indexes.get(col)
+        if index is not None:
+            return index.codes_isin(values)
+        return self.match_codes(col, lambda names: names.isin(values))
+
+    def isin_rows(self, rows: np.ndarray, col: str, values: list) -> np.ndarray:
+        """Rows whose value is exactly one of values"""
+        if self.is_categorical(col):
+            return self.select_codes(rows, col, self.isin_codes(col, values))
+        values = [str(v) for v in values]
+        return self.match_rows(rows, col, lambda names: names.isin(values))
+
+    def group_sum(self, rows: np.ndarray, col: str, measure: str) -> pd.Series:
+        """Sum of measure per observed value of a categorical column, skipping nulls like groupby().sum()"""
+        values = self.frame[col]
+        codes = self.codes(col)[rows]
+        weights = self.frame[measure].to_numpy()[rows].astype(np.float64)
+        present = codes >= 0
+        codes, weights = codes[present], np.nan_to_num(weights[present], nan=0.0)
+        size = len(values.cat.categories)
+        sums = np.bincount(codes, weights=weights, minlength=size)
+        observed = np.bincount(codes, minlength=size) > 0
+        if np.issubdtype(self.frame[measure].dtype, np.integer):
+            sums = sums.astype(np.int64)
+        return pd.Series(sums[observed], index=pd.Index(values.cat.categories[observed], name=col), name=measure)
+
+    def take(self, rows: np.ndarray, columns: list | None = None) -> pd.DataFrame:
+        """Materialize the given rows as a DataFrame with a real Date column"""
+        with_date = columns is None or self.date_col in columns
+        columns = [c for c in (columns or self.frame.columns) if c in self.frame.columns]
+        out = {}
+        for col in columns:
+            values = self.frame[col].take(rows).reset_index(drop=True)
+            if values.dtype == np.float32:
+                values = values.astype(np.float64)
+            elif isinstance(values.dtype, pd.CategoricalDtype):
+                values = values.cat.remove_unused_categories()
+            out[col] = values
+        if with_date:
+            out[self.date_col] = self.dates(rows)
+        return pd.DataFrame(out)
+
+    def memory_usage(self) -> int:
+        return int(self.frame.memory_usage(index=False, deep=True).sum() + self.days.nbytes)
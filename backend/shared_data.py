@@ -0,0 +1,218 @@
+import contextlib
+import os
+import pickle
+import shutil
+import threading
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from data_refresh import DataSnapshot
+from log import get_logger
+from sales_index import TextIndex
+from sales_store import SalesStore
+
+logger = get_logger("shared_data")
+
+# Seconds between checks for a segment published by another process
+SHARED_DATA_WATCH = float(os.getenv("SHARED_DATA_WATCH", "1"))
+
+POINTER_FILE = "current"
+LOCK_FILE = "lock"
+META_FILE = "meta.pkl"
+SEGMENT_PREFIX = "segment-"
+
+
+def save_store(store: SalesStore, path: str):
+    """Write store and its cube under path as one .npy file per array plus their metadata"""
+    os.makedirs(path)
+    columns = []
+    for i, col in enumerate(store.frame.columns):
+        values = store.frame[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            np.save(os.path.join(path, f"{i}.npy"), store.codes(col))
+            columns.append((col, values.dtype, None))
+        elif isinstance(values.dtype, np.dtype) and values.dtype != object:
+            np.save(os.path.join(path, f"{i}.npy"), values.to_numpy())
+            columns.append((col, None, None))
+        else:
+            # Mixed object columns cannot be mapped; each process gets its own copy
+            columns.append((col, None, values.to_numpy()))
+    np.save(os.path.join(path, "days.npy"), store.days)
+
+    indexes = []
+    for col, index in store.indexes.items():
+        i = store.frame.columns.get_loc(col)
+        np.save(os.path.join(path, f"index-{i}-order.npy"), index.order)
+        np.save(os.path.join(path, f"index-{i}-offsets.npy"), index.offsets)
+        indexes.append(col)
+    if store.cube is not None:
+        save_store(store.cube, os.path.join(path, "cube"))
+
+    meta = {"rows": len(store), "columns": columns, "measures": store.measures, "date_col": store.date_col,
+            "indexes": indexes, "sources": store.sources, "cube": store.cube is not None}
+    with open(os.path.join(path, META_FILE), "wb") as f:
+        pickle.dump(meta, f)
+
+
+def map_store(path: str) -> SalesStore:
+    """The store saved at path, with its arrays mapped read-only from the files instead of copied into memory"""
+    with open(os.path.join(path, META_FILE), "rb") as f:
+        meta = pickle.load(f)
+
+    def mapped(name):
+        return np.load(os.path.join(path, name), mmap_mode="r")
+
+    columns = {}
+    for i, (col, category, values) in enumerate(meta["columns"]):
+        if values is not None:
+            columns[col] = values
+        elif category is not None:
+            columns[col] = pd.Categorical.from_codes(mapped(f"{i}.npy"), dtype=category, validate=False)
+        else:
+            columns[col] = mapped(f"{i}.npy")
+    # copy=False keeps every column on its mapped array rather than consolidating them into new blocks
+    frame = pd.DataFrame(columns, index=pd.RangeIndex(meta["rows"]), copy=False)
+
+    indexes = {}
+    for col in meta["indexes"]:
+        i = frame.columns.get_loc(col)
+        indexes[col] = TextIndex(frame[col], postings=(mapped(f"index-{i}-order.npy"), mapped(f"index-{i}-offsets.npy")))
+    store = SalesStore(frame, mapped("days.npy"), meta["measures"], meta["date_col"], indexes=indexes)
+    store.sources = meta["sources"]
+    if meta["cube"]:
+        store.cube = map_store(os.path.join(path, "cube"))
+    return store
+
+
+class SharedSnapshot(DataSnapshot):
+    """DataSnapshot whose store is held once for all server processes.
+
+    The first process to need data loads it and publishes it as a segment
+    under directory (a tmpfs such as /dev/shm keeps it in shared memory);
+    every process then maps the segment's arrays read-only, so the data is
+    in memory once however many workers serve it. A process attaching to an
+    existing segment checks it against the source like a refresh would.
+
+    A refresh in any process publishes a new segment and points the others
+    at it; they switch within SHARED_DATA_WATCH seconds, with the same single
+    reference assignment as DataSnapshot. Replaced segments are deleted, and
+    their memory is freed once the last process stops using them.
+    """
+
+    def __init__(self, load, refresh, directory: str, interval: float = 0, watch: float = SHARED_DATA_WATCH):
+        super().__init__(load, refresh, interval)
+        self.directory = directory
+        self.watch = watch
+        self.segment = None
+        self._watcher = None
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self):
+        store = self.store
+        if store is None:
+            with self._lock:
+                if self.store is None:
+                    with self._file_lock(exclusive=True):
+                        self._use(*self._current_checked())
+                    self.last_refresh = time.time()
+                store = self.store
+            self._start_poller()
+            self._start_watcher()
+        return store
+
+    def refresh(self) -> dict:
+        with self._lock:
+            old = self.store
+            with self._file_lock(exclusive=True):
+                self._use(*self._current_checked())
+            self.last_refresh = time.time()
+        current = self.store
+        return {
+            "refreshed": current is not old,
+            "version": current.version if current is not None else None,
+            "records": len(current) if current is not None else 0,
+        }
+
+    def _current_checked(self) -> tuple:
+        """(segment, store) of the latest data, loading or refreshing and publishing it as needed"""
+        segment = self._published()
+        if segment is None:
+            store = self._load()
+        else:
+            store = self.store if segment == self.segment else map_store(os.path.join(self.directory, segment))
+            checked = self._refresh(store)
+            if checked is store:
+                return segment, store
+            store = checked
+        if store is None:
+            return None, None
+        segment = self._publish(store)
+        return segment, map_store(os.path.join(self.directory, segment))
+
+    def _use(self, segment: str | None, store):
+        if store is not None:
+            self.segment, self.store = segment, store
+
+    def _published(self) -> str | None:
+        try:
+            with open(os.path.join(self.directory, POINTER_FILE)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _publish(self, store: SalesStore) -> str:
+        """Save store as a new segment and point every process at it (hold the exclusive lock)"""
+        segment = f"{SEGMENT_PREFIX}{uuid.uuid4().hex}"
+        tmp_path = os.path.join(self.directory, f".{segment}.tmp")
+        save_store(store, tmp_path)
+        os.rename(tmp_path, os.path.join(self.directory, segment))
+
+        previous = self._published()
+        pointer_tmp = os.path.join(self.directory, f"{POINTER_FILE}.tmp")
+        with open(pointer_tmp, "w") as f:
+            f.write(segment)
+        os.replace(pointer_tmp, os.path.join(self.directory, POINTER_FILE))
+        logger.info("📤 Published %d records as shared segment %s", len(store), segment)
+
+        # The previous segment stays for processes that have not switched yet; partial ones are from crashed publishers
+        for name in os.listdir(self.directory):
+            stale = name.startswith(SEGMENT_PREFIX) and name not in (segment, previous)
+            if stale or (name.startswith(f".{SEGMENT_PREFIX}") and name.endswith(".tmp")):
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+        return segment
+
+    @contextlib.contextmanager
+    def _file_lock(self, exclusive: bool):
+        import fcntl
+        with open(os.path.join(self.directory, LOCK_FILE), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _start_watcher(self):
+        if self.watch <= 0 or self._watcher is not None:
+            return
+        with self._lock:
+            if self._watcher is not None:
+                return
+            self._watcher = threading.Thread(target=self._watch, name="shared-data", daemon=True)
+            self._watcher.start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.watch)
+            if self._published() in (None, self.segment):
+                continue
+            try:
+                with self._lock, self._file_lock(exclusive=False):
+                    segment = self._published()
+                    if segment is not None and segment != self.segment:
+                        self._use(segment, map_store(os.path.join(self.directory, segment)))
+                        logger.info("🔄 Switched to shared segment %s: %d records", segment, len(self.store))
+            except Exception as e:
+                logger.warning("⚠️ Cannot switch to shared segment: %s", e)
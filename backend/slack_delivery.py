@@ -0,0 +1,178 @@
+import io
+import os
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from clients import slack_client
+from log import get_logger
+from metrics import span
+
+logger = get_logger("slack_delivery")
+
+# Uploads to Slack running at once
+SLACK_WORKERS = int(os.getenv("SLACK_WORKERS", "4"))
+# Tries per channel before a delivery is given up
+SLACK_MAX_ATTEMPTS = int(os.getenv("SLACK_MAX_ATTEMPTS", "5"))
+# Seconds before the first retry, doubled for every further one up to SLACK_MAX_BACKOFF
+SLACK_BACKOFF = float(os.getenv("SLACK_BACKOFF", "1"))
+SLACK_MAX_BACKOFF = float(os.getenv("SLACK_MAX_BACKOFF", "60"))
+# Finished jobs kept for the status endpoint
+SLACK_JOBS_KEPT = int(os.getenv("SLACK_JOBS_KEPT", "256"))
+
+# Slack error codes worth retrying; anything else (invalid_auth, channel_not_found, ...) fails at once
+RETRYABLE_ERRORS = {"ratelimited", "internal_error", "fatal_error", "service_unavailable", "request_timeout"}
+
+
+def _header(headers, name: str):
+    for key, value in (headers or {}).items():
+        if key.lower() == name.lower():
+            return value
+    return None
+
+
+def retry_delay(error: Exception, attempt: int) -> float | None:
+    """Seconds to wait before try number attempt + 1 after error, or None when retrying cannot help"""
+    from slack_sdk.errors import SlackApiError, SlackRequestError
+    if isinstance(error, SlackApiError):
+        response = error.response
+        retry_after = _header(response.headers, "Retry-After")
+        if response.status_code == 429 and retry_after is not None:
+            # Slack says exactly how long the rate limit lasts
+            return float(retry_after)
+        if response.status_code < 500 and response.get("error") not in RETRYABLE_ERRORS:
+            return None
+    elif not isinstance(error, (OSError, SlackRequestError)):
+        return None
+    # Exponential backoff with jitter so queued jobs do not retry in lockstep
+    return min(SLACK_MAX_BACKOFF, SLACK_BACKOFF * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+
+
+class SlackDelivery:
+    """Background queue uploading files to Slack, one job per send request.
+
+    A job uploads one file to one or more channels; each channel is a
+    separate task in the worker pool, retried with exponential backoff (or
+    after Slack's Retry-After on rate limits). The file is produced once per
+    job, in the worker, by the load function given to submit(). A channel
+    waiting for its retry holds no worker: it is queued again once the delay
+    is over. status() reports the job and every channel as queued, sending,
+    sent or failed.
+    """
+
+    def __init__(self, token: str | None, workers: int = SLACK_WORKERS, max_attempts: int = SLACK_MAX_ATTEMPTS,
+                 jobs_kept: int = SLACK_JOBS_KEPT):
+        self.token = token
+        self.max_attempts = max_attempts
+        self.jobs_kept = jobs_kept
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="slack-delivery")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, channels: dict, load, filename: str, title: str, initial_comment: str) -> str:
+        """Queue an upload of load() to every channel in channels (name -> channel id) and return the job id"""
+        job_id = uuid.uuid4().hex
+        job = {
+            "id": job_id,
+            "state": "queued",
+            "title": title,
+            "created": time.time(),
+            "finished": None,
+            "channels": {name: {"channel_id": channel_id, "state": "queued", "attempts": 0, "error": None}
+                         for name, channel_id in channels.items()},
+        }
+        upload = {"filename": filename, "title": title, "initial_comment": initial_comment}
+        with self._lock:
+            self._jobs[job_id] = job
+            self._trim()
+        content = _Once(load)
+        for name in channels:
+            self.pool.submit(self._deliver, job, name, content, upload)
+        return job_id
+
+    def status(self, job_id: str) -> dict | None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return {**job, "channels": {name: dict(channel) for name, channel in job["channels"].items()}}
+
+    def _deliver(self, job: dict, name: str, content, upload: dict, attempt: int = 1):
+        channel = job["channels"][name]
+        self._update(job, channel, state="sending", attempts=attempt)
+        try:
+            data = content.get()
+        except Exception as e:
+            self._update(job, channel, state="failed", error=f"Report unavailable: {e}")
+            return
+        if not data:
+            self._update(job, channel, state="failed", error="Report not found or expired")
+            return
+        client = slack_client(self.token)
+        try:
+            with span("slack"):
+                response = client.files_upload_v2(channel=channel["channel_id"], file=io.BytesIO(data), **upload)
+            if response.get("ok"):
+                self._update(job, channel, state="sent", error=None)
+                return
+            error = response.get("error", "Unknown error")
+            self._update(job, channel, state="failed", error=f"Failed to send to Slack: {error}")
+        except Exception as e:
+            # slack_sdk is loaded by slack_client above
+            from slack_sdk.errors import SlackApiError
+            message = str(e.response.get("error", e)) if isinstance(e, SlackApiError) else str(e)
+            delay = retry_delay(e, attempt)
+            if delay is None or attempt == self.max_attempts:
+                self._update(job, channel, state="failed", error=f"Slack API error: {message}")
+                return
+            logger.warning("⚠️ Slack upload to %s failed (%s), retry %d in %.1fs", name, message, attempt, delay)
+            self._update(job, channel, state="queued", error=message)
+            # The retry is queued again after the delay, so waiting never holds a worker
+            timer = threading.Timer(delay, self.pool.submit, args=(self._deliver, job, name, content, upload, attempt + 1))
+            timer.daemon = True
+            timer.start()
+
+    def _update(self, job: dict, channel: dict, **changes):
+        with self._lock:
+            channel.update(changes)
+            states = [c["state"] for c in job["channels"].values()]
+            if any(state in ("queued", "sending") for state in states):
+                job["state"] = "sending"
+                return
+            job["state"] = "sent" if all(state == "sent" for state in states) else (
+                "failed" if all(state == "failed" for state in states) else "partial")
+            job["finished"] = job["finished"] or time.time()
+
+    def _trim(self):
+        # Callers hold _lock; only finished jobs are dropped, oldest first
+        for job_id in list(self._jobs):
+            if len(self._jobs) <= self.jobs_kept:
+                break
+            if self._jobs[job_id]["finished"] is not None:
+                del self._jobs[job_id]
+
+
+class _Once:
+    """load() evaluated by the first channel that needs it and shared with the rest"""
+
+    def __init__(self, load):
+        self._load = load
+        self._lock = threading.Lock()
+        self._done = False
+        self._value = None
+        self._error = None
+
+    def get(self):
+        with self._lock:
+            if not self._done:
+                try:
+                    self._value = self._load()
+                except Exception as e:
+                    self._error = e
+                self._done = True
+        if self._error is not None:
+            raise self._error
+        return self._value
@@ -0,0 +1,226 @@
+import asyncio
+import io
+import os
+import uuid
+import wave
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from flask import Request
+
+from clients import CLIENT_CONNECT_TIMEOUT, http_session
+from log import get_logger
+
+logger = get_logger("transcription")
+
+# Largest audio upload accepted, held in memory rather than spooled to a temp file
+STT_MAX_UPLOAD_BYTES = int(os.getenv("STT_MAX_UPLOAD_BYTES", str(25 * 1024 * 1024)))
+# Seconds to wait for the STT service to answer one piece
+STT_TIMEOUT = float(os.getenv("STT_TIMEOUT", "45"))
+# WAV recordings longer than this are cut at pauses and the pieces transcribed concurrently
+STT_CHUNK_SECONDS = float(os.getenv("STT_CHUNK_SECONDS", "25"))
+# Pieces of any recordings sent to the STT service at once, across all requests
+STT_MAX_CONCURRENCY = int(os.getenv("STT_MAX_CONCURRENCY", "4"))
+# A pause is at least this long and this quiet (dB below full scale)
+STT_SILENCE_SECONDS = float(os.getenv("STT_SILENCE_SECONDS", "0.3"))
+STT_SILENCE_DB = float(os.getenv("STT_SILENCE_DB", "-40"))
+
+WINDOW_SECONDS = 0.02
+UPLOAD_BLOCK_BYTES = 64 * 1024
+
+_pool = ThreadPoolExecutor(max_workers=STT_MAX_CONCURRENCY, thread_name_prefix="stt")
+_loop_slots = weakref.WeakKeyDictionary()
+
+
+class InMemoryUploads(Request):
+    """Request keeping uploaded files in memory (up to max_content_length) instead of temp files"""
+
+    max_content_length = STT_MAX_UPLOAD_BYTES
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return io.BytesIO()
+
+
+class TranscriptionError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"Transcription failed: {status_code}")
+        self.status_code = status_code
+
+
+class MultipartBody:
+    """A multipart/form-data body with one file part, read straight from the file's stream.
+
+    requests sends a file-like body block by block with a Content-Length
+    taken from len, so the audio is never copied into a second buffer.
+    """
+
+    def __init__(self, field: str, filename: str, content_type: str, stream, length: int):
+        self.boundary = uuid.uuid4().hex
+        head = (f"--{self.boundary}\r\n"
+                f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+                f"Content-Type: {content_type}\r\n\r\n").encode()
+        tail = f"\r\n--{self.boundary}--\r\n".encode()
+        self._parts = [io.BytesIO(head), stream, io.BytesIO(tail)]
+        self.len = len(head) + length + len(tail)
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def read(self, size: int = -1) -> bytes:
+        out = b""
+        while self._parts and (size < 0 or len(out) < size):
+            block = self._parts[0].read(-1 if size < 0 else size - len(out))
+            if not block:
+                self._parts.pop(0)
+            out += block
+        return out
+
+
+def post_audio(url: str, api_key: str, stream, length: int, filename: str = "audio.wav",
+               content_type: str = "audio/wav") -> str:
+    """Transcript of one recording, its bytes streamed from stream into the request body"""
+    body = MultipartBody("file", filename, content_type, stream, length)
+    headers = {"api-subscription-key": api_key, "Content-Type": body.content_type}
+    response = http_session().post(url, headers=headers, data=body, timeout=(CLIENT_CONNECT_TIMEOUT, STT_TIMEOUT))
+    if response.status_code != 200:
+        raise TranscriptionError(response.status_code)
+    return response.json().get("transcript", "")
+
+
+def pause_cuts(samples: np.ndarray, rate: int, max_seconds: float = STT_CHUNK_SECONDS) -> list:
+    """Sample offsets splitting a recording into pieces of at most max_seconds, cut mid-pause where possible"""
+    window = max(1, int(rate * WINDOW_SECONDS))
+    count = len(samples) // window
+    frames = samples[:count * window].reshape(count, window).astype(np.float64)
+    loudness = 20 * np.log10(np.sqrt((frames ** 2).mean(axis=1)) + 1e-9)
+    quiet = loudness < STT_SILENCE_DB
+
+    # Centers of quiet runs long enough to be a pause, in windows
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], quiet.astype(np.int8), [0]))))
+    starts, ends = edges[::2], edges[1::2]
+    long_enough = (ends - starts) * WINDOW_SECONDS >= STT_SILENCE_SECONDS
+    pauses = ((starts[long_enough] + ends[long_enough]) // 2) * window
+
+    limit = int(max_seconds * rate)
+    cuts, start = [0], 0
+    while len(samples) - start > limit:
+        # The last pause that keeps the piece under the limit, else a hard cut
+        candidates = pauses[(pauses > start) & (pauses <= start + limit)]
+        start = int(candidates[-1]) if len(candidates) else start + limit
+        cuts.append(start)
+    cuts.append(len(samples))
+    return cuts
+
+
+def _wav_bytes(params, frames: bytes) -> bytes:
+    with io.BytesIO() as buffer:
+        with wave.open(buffer, "wb") as out:
+            out.setparams(params)
+            out.writeframes(frames)
+        return buffer.getvalue()
+
+
+def _read_wav(stream):
+    """(params, raw frames, mono samples) of a PCM WAV stream, or None for anything else"""
+    try:
+        with wave.open(stream, "rb") as wav:
+            params = wav.getparams()
+            raw = wav.readframes(params.nframes)
+    except (wave.Error, EOFError):
+        return None
+    finally:
+        stream.seek(0)
+    dtypes = {1: np.uint8, 2: np.int16, 4: np.int32}
+    if params.sampwidth not in dtypes:
+        return None
+    samples = np.frombuffer(raw, dtype=dtypes[params.sampwidth]).reshape(-1, params.nchannels).mean(axis=1)
+    if params.sampwidth == 1:
+        samples = samples - 128
+    full_scale = {1: 128, 2: 32768, 4: 2 ** 31}[params.sampwidth]
+    return params, raw, samples / full_scale
+
+
+def _pieces(upload) -> list:
+    """(stream, length) of each request to send the STT service for upload.
+
+    Every request is sent as audio.wav, as the client's file name and type
+    would otherwise go unescaped into the multipart headers.
+    """
+    stream = upload.stream
+    stream.seek(0, os.SEEK_END)
+    length = stream.tell()
+    stream.seek(0)
+
+    wav = _read_wav(stream)
+    if wav is not None:
+        params, raw, samples = wav
+        if len(samples) > STT_CHUNK_SECONDS * params.framerate:
+            cuts = pause_cuts(samples, params.framerate)
+            frame_bytes = params.sampwidth * params.nchannels
+            pieces = [_wav_bytes(params, raw[a * frame_bytes:b * frame_bytes]) for a, b in zip(cuts, cuts[1:])]
+            logger.debug("🎙️ Transcribing %.1fs of audio in %d pieces", len(samples) / params.framerate, len(pieces))
+            return [(io.BytesIO(piece), len(piece)) for piece in pieces]
+    return [(stream, length)]
+
+
+def _joined(transcripts: list) -> dict:
+    return {"transcript": " ".join(t.strip() for t in transcripts if t.strip()), "chunks": len(transcripts)}
+
+
+def transcribe_upload(upload, url: str, api_key: str) -> dict:
+    """Transcribe an uploaded recording (a werkzeug FileStorage) with the STT service at url.
+
+    Short recordings and anything that is not PCM WAV go to the service in
+    one request streamed from the upload. Longer WAV recordings are cut at
+    pauses into pieces of at most STT_CHUNK_SECONDS, transcribed
+    concurrently (STT_MAX_CONCURRENCY at a time across all requests) and
+    the transcripts joined in order.
+    """
+    pieces = _pieces(upload)
+    if len(pieces) == 1:
+        return {"transcript": post_audio(url, api_key, *pieces[0]), "chunks": 1}
+    futures = [_pool.submit(post_audio, url, api_key, *piece) for piece in pieces]
+    return _joined([future.result() for future in futures])
+
+
+async def post_audio_async(client, url: str, api_key: str, stream, length: int, filename: str = "audio.wav",
+                           content_type: str = "audio/wav") -> str:
+    """post_audio on an aiohttp session"""
+    # Only the ASGI server transcribes this way, and it has loaded aiohttp already
+    import aiohttp
+    body = MultipartBody("file", filename, content_type, stream, length)
+
+    async def blocks():
+        while block := body.read(UPLOAD_BLOCK_BYTES):
+            yield block
+
+    headers = {"api-subscription-key": api_key, "Content-Type": body.content_type, "Content-Length": str(body.len)}
+    timeout = aiohttp.ClientTimeout(sock_connect=CLIENT_CONNECT_TIMEOUT, sock_read=STT_TIMEOUT)
+    async with client.post(url, headers=headers, data=blocks(), timeout=timeout) as response:
+        if response.status != 200:
+            raise TranscriptionError(response.status)
+        return (await response.json(content_type=None)).get("transcript", "")
+
+
+async def transcribe_upload_async(upload, url: str, api_key: str, client) -> dict:
+    """transcribe_upload for the ASGI server, sending the pieces concurrently from the event loop"""
+    pieces = await asyncio.to_thread(_pieces, upload)
+    if len(pieces) == 1:
+        return {"transcript": await post_audio_async(client, url, api_key, *pieces[0]), "chunks": 1}
+
+    async def post_piece(piece):
+        # STT_MAX_CONCURRENCY pieces at a time across all requests, as on the thread pool
+        async with _async_slots():
+            return await post_audio_async(client, url, api_key, *piece)
+
+    return _joined(list(await asyncio.gather(*(post_piece(piece) for piece in pieces))))
+
+
+def _async_slots() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    slots = _loop_slots.get(loop)
+    if slots is None:
+        slots = _loop_slots[loop] = asyncio.Semaphore(STT_MAX_CONCURRENCY)
+    return slots
@@ -0,0 +1,94 @@
+import os
+import threading
+import time
+
+from flask import jsonify
+
+from log import get_logger
+from metrics import span
+
+logger = get_logger("warmup")
+
+# Seconds before a failed start-up task is tried again (on the next request or readiness check)
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "30"))
+
+
+class WarmUp:
+    """Start-up work (data load, client checks, heavy imports) run in background threads.
+
+    Nothing runs when the app is imported: start() is called once the server
+    is up, and again with every request, where it only starts the tasks not
+    run yet and retries failed ones after WARMUP_RETRY_SECONDS. The server is
+    ready when every required task has succeeded; the others (e.g. the Slack
+    check) only report how they went.
+    """
+
+    def __init__(self, tasks: dict, required: tuple = ()):
+        self.tasks = tasks
+        self.required = set(required)
+        self.started = None
+        self._state = {name: {"state": "pending", "seconds": None, "error": None, "finished": 0.0} for name in tasks}
+        self._done = False
+        self._changed = threading.Condition()
+
+    def start(self):
+        if self._done:
+            return
+        now = time.time()
+        with self._changed:
+            due = [name for name, task in self._state.items() if task["state"] == "pending"
+                   or (task["state"] == "failed" and now - task["finished"] >= WARMUP_RETRY_SECONDS)]
+            for name in due:
+                self._state[name]["state"] = "running"
+            if self.started is None:
+                self.started = now
+        for name in due:
+            threading.Thread(target=self._run, args=(name,), name=f"warmup-{name}", daemon=True).start()
+
+    def _run(self, name: str):
+        start = time.perf_counter()
+        try:
+            with span(f"warmup_{name}"):
+                self.tasks[name]()
+            state, error = "ok", None
+        except Exception as e:
+            state, error = "failed", str(e)
+            logger.warning("⚠️ Start-up task %s failed: %s", name, e)
+        with self._changed:
+            self._state[name].update(state=state, error=error, seconds=round(time.perf_counter() - start, 3),
+                                     finished=time.time())
+            self._done = all(task["state"] == "ok" for task in self._state.values())
+            self._changed.notify_all()
+        if state == "ok":
+            logger.debug("Start-up task %s done in %.2fs", name, time.perf_counter() - start)
+
+    @property
+    def ready(self) -> bool:
+        return all(self._state[name]["state"] == "ok" for name in self.required)
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Block until ready or until no required task is running any more; returns ready"""
+        with self._changed:
+            self._changed.wait_for(lambda: self.ready or all(self._state[name]["state"] in ("ok", "failed")
+                                                             for name in self.required), timeout)
+            return self.ready
+
+    def status(self) -> dict:
+        with self._changed:
+            tasks = {name: {"state": task["state"], "required": name in self.required, "seconds": task["seconds"],
+                            "error": task["error"]} for name, task in self._state.items()}
+        return {"ready": self.ready, "started": self.started is not None,
+                "uptime": round(time.time() - self.started, 1) if self.started else None, "tasks": tasks}
+
+
+def serve_readiness(app, warmup: WarmUp):
+    """Start warmup with the first request (whichever server runs app) and serve GET /api/ready"""
+
+    @app.before_request
+    def start_warmup():
+        warmup.start()
+
+    @app.route("/api/ready", methods=["GET"])
+    def get_ready():
+        status = warmup.status()
+        return jsonify(status), 200 if status["ready"] else 503
@@ -13,6 +13,28 @@ const GRADIENT_COLORS = [
   { start: '#ef4444', end: '#dc2626' }
 ];
 
+// Server-sent events of a streamed response, each as { event, data } once it has fully arrived
+async function* readEvents(response) {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let end;
+    while ((end = buffer.indexOf('\n\n')) !== -1) {
+      const message = buffer.slice(0, end);
+      buffer = buffer.slice(end + 2);
+      const fields = Object.fromEntries(message.split('\n').map(line => {
+        const colon = line.indexOf(': ');
+        return [line.slice(0, colon), line.slice(colon + 2)];
+      }));
+      yield { event: fields.event, data: JSON.parse(fields.data) };
+    }
+  }
+}
+
 export default function VoiceAssistant() {
   const { user } = useAuth();
   const [transcript, setTranscript] = useState('');
@@ -113,7 +135,10 @@ export default function VoiceAssistant() {
           formData.append('audio', audioBlob, 'audio.wav');
           
           console.log('Sending audio to backend...');
-          const response = await fetch(`${API_BASE}/transcribe`, {
+          setLoading(true);
+          setResponse('Transcribing...');
+          // One request: the backend streams the transcript, plan, chart and report as server-sent events
+          const response = await fetch(`${API_BASE}/voice-query`, {
             method: 'POST',
             body: formData
           });
@@ -124,20 +149,34 @@ export default function VoiceAssistant() {
             throw new Error(`HTTP ${response.status}: ${errorText}`);
           }
           
-          const result = await response.json();
-          console.log('Transcription result:', result);
-          const transcribedText = result.transcript || 'Transcription failed';
-          setTranscript(transcribedText);
-          
-          // Auto-send the transcribed query
-          if (transcribedText && !transcribedText.includes('error') && !transcribedText.includes('failed')) {
-            setTimeout(() => {
-              handleSend(transcribedText);
-            }, 500); // Small delay to ensure state is updated
+          let query = '';
+          let chart = null;
+          for await (const { event, data } of readEvents(response)) {
+            console.log('Voice query event:', event, data);
+            if (event === 'transcript') {
+              query = data.transcript;
+              setTranscript(query);
+              setResponse('Processing your request...');
+            } else if (event === 'plan') {
+              setResponse(`Building ${data.title || 'chart'}...`);
+            } else if (event === 'chart') {
+              chart = data;
+              setChartData(chart);
+              setResponse(describeResult(chart));
+            } else if (event === 'report') {
+              showResult(query, { ...chart, report_id: data.report_id });
+            } else if (event === 'error') {
+              setResponse(`Error: ${data.error}`);
+              if (!query) {
+                setTranscript(data.error);
+              }
+            }
           }
         } catch (error) {
           console.error('Transcription error:', error);
           setTranscript(`Transcription error: ${error.message}`);
+        } finally {
+          setLoading(false);
         }
       };
       
@@ -157,6 +196,40 @@ export default function VoiceAssistant() {
     }
   }
 
+  function describeResult(result) {
+    return `${result.title} (${result.chart_type} chart with ${result.data?.length || 0} data points)`;
+  }
+
+  function showResult(query, result) {
+    const responseText = describeResult(result);
+    setResponse(responseText);
+    setChartData(result);
+    
+    // Add to chat history
+    const newChat = {
+      id: Date.now(),
+      query: query,
+      response: responseText,
+      timestamp: new Date(),
+      chartType: result.chart_type,
+      chartData: result // Store complete chart data
+    };
+    
+    setChatHistory(prev => {
+      const updated = [...prev, newChat];
+      // Save to localStorage with user-specific key
+      try {
+        const userId = user?.username || user?.signInDetails?.loginId || 'authenticated_user';
+        const storageKey = `anandhaas_sweets_chat_history_${userId}`;
+        console.log('Saving chat history for user:', userId, 'with key:', storageKey);
+        localStorage.setItem(storageKey, JSON.stringify(updated));
+      } catch (error) {
+        console.error('Error saving chat history:', error);
+      }
+      return updated;
+    });
+  }
+
   async function handleSend(customQuery = null) {
     const query = customQuery || transcript || textInput;
     if (!query || query === 'Listening...' || loading) return;
@@ -178,34 +251,7 @@ export default function VoiceAssistant() {
       
       const result = await response.json();
       console.log('Backend response:', result);
-      
-      const responseText = `${result.title} (${result.chart_type} chart with ${result.data?.length || 0} data points)`;
-      setResponse(responseText);
-      setChartData(result);
-      
-      // Add to chat history
-      const newChat = {
-        id: Date.now(),
-        query: query,
-        response: responseText,
-        timestamp: new Date(),
-        chartType: result.chart_type,
-        chartData: result // Store complete chart data
-      };
-      
-      setChatHistory(prev => {
-        const updated = [...prev, newChat];
-        // Save to localStorage with user-specific key
-        try {
-          const userId = user?.username || user?.signInDetails?.loginId || 'authenticated_user';
-          const storageKey = `anandhaas_sweets_chat_history_${userId}`;
-          console.log('Saving chat history for user:', userId, 'with key:', storageKey);
-          localStorage.setItem(storageKey, JSON.stringify(updated));
-        } catch (error) {
-          console.error('Error saving chat history:', error);
-        }
-        return updated;
-      });
+      showResult(query, result);
       
       // Clear inputs after successful query
       if (textInput) {
@@ -228,19 +274,18 @@ export default function VoiceAssistant() {
   }
 
   async function handleDownloadPDF() {
-    if (!chartData || !chartData.pdf_base64) {
+    if (!chartData || !chartData.report_id) {
       alert('No PDF available to download');
       return;
     }
     
     try {
-      const byteCharacters = atob(chartData.pdf_base64);
-      const byteNumbers = new Array(byteCharacters.length);
-      for (let i = 0; i < byteCharacters.length; i++) {
-        byteNumbers[i] = byteCharacters.charCodeAt(i);
+      // The server generates the PDF on first download and caches it
+      const response = await fetch(`${API_BASE}/report/${chartData.report_id}.pdf`);
+      if (!response.ok) {
+        throw new Error(`HTTP ${response.status}`);
       }
-      const byteArray = new Uint8Array(byteNumbers);
-      const blob = new Blob([byteArray], { type: 'application/pdf' });
+      const blob = await response.blob();
       
       const url = window.URL.createObjectURL(blob);
       const link = document.createElement('a');
@@ -257,7 +302,7 @@ export default function VoiceAssistant() {
   }
 
   async function handleSendToSlack() {
-    if (!chartData || !chartData.pdf_base64) {
+    if (!chartData || !chartData.report_id) {
       alert('No report available to send');
       return;
     }
@@ -271,7 +316,7 @@ export default function VoiceAssistant() {
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
           channel: selectedChannel,
-          pdf_base64: chartData.pdf_base64,
+          report_id: chartData.report_id,
           filename: chartData.pdf_filename || 'report.pdf',
           title: chartData.title || 'Business Report',
           insights: chartData.insights || 'Analysis completed'
@@ -280,10 +325,25 @@ export default function VoiceAssistant() {
       
       const result = await response.json();
       
-      if (result.success) {
+      if (!result.success) {
+        setSlackMessage(`❌ Failed: ${result.message}`);
+        return;
+      }
+      
+      // The upload runs in the background; follow the job until Slack has it
+      setSlackMessage('Queued for Slack...');
+      let job = null;
+      for (let i = 0; i < 120; i++) {
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        job = await (await fetch(`${API_BASE}/slack-jobs/${result.job_id}`)).json();
+        if (job.finished) break;
+      }
+      
+      if (job && job.state === 'sent') {
         setSlackMessage('✅ Successfully sent to Slack!');
       } else {
-        setSlackMessage(`❌ Failed: ${result.message}`);
+        const errors = job ? Object.values(job.channels).map(c => c.error).filter(Boolean) : [];
+        setSlackMessage(`❌ Failed: ${errors[0] || 'Slack delivery did not finish'}`);
       }
     } catch (error) {
       console.error('Slack send error:', error);
@@ -802,7 +862,7 @@ export default function VoiceAssistant() {
         </div>
 
         {/* PDF and Slack Actions */}
-        {chartData && chartData.pdf_base64 && (
+        {chartData && chartData.report_id && (
           <div className="mt-6 p-4 bg-slate-50 rounded-xl border">
             <h4 className="font-semibold text-slate-800 mb-3">Export Options</h4>
             <div className="flex gap-3 items-center flex-wrap">